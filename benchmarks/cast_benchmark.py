@@ -0,0 +1,91 @@
+"""
+抛竿结算压测：比较逐个调用 CastResolver.resolve 与 resolve_batch 的吞吐量（次/秒）。
+
+只测纯计算部分，不涉及数据库。在插件根目录下运行：
+
+    python benchmarks/cast_benchmark.py [用户数 ...]
+
+默认依次测试 1000、10000、100000 名用户各抛竿一次。未安装 numpy 时 resolve_batch 退化为逐个计算。
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.domain.models import Fish, Rod, Accessory, Bait  # noqa: E402
+from core.domain.fish_catalog import FishCatalog  # noqa: E402
+from core.domain.zone_loot import ZoneLootTable  # noqa: E402
+from core.services.cast_resolver import CastResolver, CastModifiers, CastLoadout, np  # noqa: E402
+
+# 与迁移 006 写入的默认分布相同
+ZONE_WEIGHTS = {
+    1: [0.5, 0.35, 0.14, 0.01, 0, 0],
+    2: [0.5, 0.3, 0.16, 0.038, 0.001, 0.001],
+    3: [0.5, 0.3, 0.15, 0.044, 0.003, 0.003],
+}
+
+
+def build_catalog(rng: random.Random) -> FishCatalog:
+    fishes = []
+    for fish_id in range(1, 121):
+        rarity = fish_id % 6 + 1
+        min_weight = rng.randint(10, 1000) * rarity
+        fishes.append(Fish(
+            fish_id=fish_id, name=f"fish-{fish_id}", description="", rarity=rarity,
+            base_value=rng.randint(1, 40) * rarity ** 2,
+            min_weight=min_weight, max_weight=min_weight * rng.randint(2, 10),
+        ))
+    return FishCatalog(fishes)
+
+
+def build_loadouts(count: int, catalog: FishCatalog, rng: random.Random):
+    loot_tables = {zone_id: ZoneLootTable(zone_id, dict(enumerate(weights, start=1)))
+                   for zone_id, weights in ZONE_WEIGHTS.items()}
+    rods = [None] + [Rod(rod_id=i, name=f"rod-{i}", description="", rarity=i, source="shop",
+                         bonus_fish_quality_modifier=1 + i / 10, bonus_rare_fish_chance=i / 100)
+                     for i in range(1, 6)]
+    accessories = [None] + [Accessory(accessory_id=i, name=f"acc-{i}", description="", rarity=i,
+                                      slot_type="general", bonus_rare_fish_chance=i / 200,
+                                      bonus_coin_modifier=i / 10)
+                            for i in range(1, 4)]
+    baits = [None] + [Bait(bait_id=i, name=f"bait-{i}", rarity=i, success_rate_modifier=i / 20,
+                           garbage_reduction_modifier=i / 5, value_modifier=0.1)
+                      for i in range(1, 4)]
+    loadouts = []
+    for _ in range(count):
+        zone_id = rng.randint(1, 3)
+        loadouts.append(CastLoadout(
+            modifiers=CastModifiers.combine(rng.choice(rods), rng.choice(accessories), rng.choice(baits)),
+            loot_table=loot_tables[zone_id],
+            fish_catalog=catalog,
+            is_rare_fish_available=rng.random() < 0.9,
+        ))
+    return loadouts
+
+
+def measure(func, loadouts) -> float:
+    start = time.perf_counter()
+    func(loadouts)
+    return len(loadouts) / (time.perf_counter() - start)
+
+
+def main(sizes):
+    rng = random.Random(20240601)
+    catalog = build_catalog(rng)
+    resolver = CastResolver(random.Random(1))
+    # 预热：编译别名表与目录数组
+    resolver.resolve_batch(build_loadouts(1000, catalog, rng))
+
+    print(f"numpy: {np.__version__ if np is not None else '未安装'}")
+    print(f"{'用户数':>8} {'逐个 (次/秒)':>16} {'批量 (次/秒)':>16} {'加速比':>8}")
+    for size in sizes:
+        loadouts = build_loadouts(size, catalog, rng)
+        scalar = measure(lambda items: [resolver.resolve(loadout) for loadout in items], loadouts)
+        batch = measure(resolver.resolve_batch, loadouts)
+        print(f"{size:>8} {scalar:>16,.0f} {batch:>16,.0f} {batch / scalar:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000])
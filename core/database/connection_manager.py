@@ -0,0 +1,540 @@
+import contextvars
+import functools
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Iterator, Callable, ContextManager
+
+from astrbot.api import logger
+
+from ..repositories.abstract_repository import AbstractUnitOfWork
+from .identity_map import IdentityMap, session as identity_session
+
+# PRAGMA 无法使用参数绑定，这里对可配置项做白名单校验
+_SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+_TEMP_STORE_MODES = {"DEFAULT", "FILE", "MEMORY"}
+
+# 等待只读连接归还时检查连接池是否已被 close_all() 替换的间隔（秒）
+_READ_POOL_POLL_SECONDS = 0.5
+
+DEFAULT_PRAGMAS: Dict[str, Any] = {
+    "synchronous": "NORMAL",   # WAL 模式下 NORMAL 已足够安全，且避免每次提交都 fsync
+    "cache_size": -20000,      # 负数表示以 KiB 为单位，约 20MB 页缓存
+    "mmap_size": 268435456,    # 256MB 内存映射读取
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,      # 毫秒
+}
+
+
+def write_operation(method: Callable) -> Callable:
+    """
+    标记仓储中的写方法。
+
+    启用写线程模式时，不在事务中的写调用会被投递到专用写线程执行，
+    调用方阻塞等待该批次提交完成后再拿到返回值；
+    已处于工作单元事务中的调用直接在当前连接上执行，保证事务内读写一致。
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        manager: "DatabaseConnectionManager" = self._connection_manager
+        if manager.should_queue_write():
+            # 在调用方的上下文中执行，写方法才能维护调用方指令会话中的身份映射
+            context = contextvars.copy_context()
+            return manager.submit_write(context.run, method, self, *args, **kwargs).result()
+        with manager.write_scope():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def read_operation(method: Callable) -> Callable:
+    """
+    标记仓储中的只读方法。
+
+    事务和写方法之外的调用从只读连接池中借用一个 query_only 连接执行，
+    在 WAL 模式下不会与写操作互相等待；事务内的调用仍使用事务连接以读到未提交的写入。
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        manager: "DatabaseConnectionManager" = self._connection_manager
+        with manager.read_scope():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class _WriteJob:
+    __slots__ = ("func", "args", "kwargs", "future")
+
+    def __init__(self, func: Callable, args: tuple, kwargs: dict):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future: Future = Future()
+
+
+class _TransactionalConnection:
+    """
+    事务期间交给仓储使用的连接代理。
+    仓储方法中的 commit()/rollback() 以及 with 语句都变为空操作，
+    由外层的工作单元统一提交或回滚。
+    """
+
+    __slots__ = ("_conn",)
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+    def commit(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        pass
+
+
+class DatabaseConnectionManager(AbstractUnitOfWork):
+    """
+    所有仓储共享的 SQLite 连接管理器，同时充当工作单元。
+
+    每个线程持有一个连接，连接在首次使用时创建并应用统一的 PRAGMA 配置，
+    数据库以 WAL 模式运行，读操作不会再被写事务阻塞。
+    插件卸载时调用 close_all() 关闭所有线程创建的连接。
+    """
+
+    # 单个写批次最多合并的写操作数量
+    WRITER_MAX_BATCH = 256
+
+    def __init__(self, db_path: str, pragmas: Optional[Dict[str, Any]] = None,
+                 writer_mode: bool = False, writer_batch_window_ms: int = 5, read_pool_size: int = 4):
+        """
+        Args:
+            db_path: SQLite数据库文件路径。
+            pragmas: 可选的 PRAGMA 覆盖项（synchronous、cache_size、mmap_size、temp_store、busy_timeout）。
+            writer_mode: 是否启用单写线程模式。启用后所有事务外的写操作由一个专用线程批量提交。
+            writer_batch_window_ms: 写线程收到第一个写操作后继续等待合并的时间窗口（毫秒）。
+            read_pool_size: 只读连接池大小，设为 0 时读操作与写操作共用线程连接。
+        """
+        self.db_path = db_path
+        self.pragmas = self._normalize_pragmas(pragmas or {})
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+        # 每次 close_all() 后自增，旧线程持有的连接据此失效并重建
+        self._generation = 0
+
+        self._read_pool_size = max(0, int(read_pool_size))
+        self._read_pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._read_created = 0
+
+        # 工作单元事务与写线程批次共用这把锁，在 Python 层排队而不是在 SQLite 上忙等
+        self._write_lock = threading.RLock()
+
+        self._writer_window = max(0, int(writer_batch_window_ms)) / 1000
+        self._writer_queue: "queue.Queue[Optional[_WriteJob]]" = queue.Queue()
+        self._writer_thread: Optional[threading.Thread] = None
+        self._writer_running = False
+        self._writer_batches = 0
+        self._writer_jobs = 0
+
+        self._enable_wal()
+        if writer_mode:
+            self.start_writer()
+
+    @staticmethod
+    def _normalize_pragmas(overrides: Dict[str, Any]) -> Dict[str, Any]:
+        pragmas = dict(DEFAULT_PRAGMAS)
+        for key, value in overrides.items():
+            if key in pragmas and value is not None and value != "":
+                pragmas[key] = value
+
+        synchronous = str(pragmas["synchronous"]).upper()
+        if synchronous not in _SYNCHRONOUS_MODES:
+            logger.warning(f"无效的 synchronous 配置 {synchronous}，已回退为 NORMAL")
+            synchronous = "NORMAL"
+        temp_store = str(pragmas["temp_store"]).upper()
+        if temp_store not in _TEMP_STORE_MODES:
+            logger.warning(f"无效的 temp_store 配置 {temp_store}，已回退为 MEMORY")
+            temp_store = "MEMORY"
+
+        return {
+            "synchronous": synchronous,
+            "cache_size": int(pragmas["cache_size"]),
+            "mmap_size": max(0, int(pragmas["mmap_size"])),
+            "temp_store": temp_store,
+            "busy_timeout": max(0, int(pragmas["busy_timeout"])),
+        }
+
+    def _enable_wal(self) -> None:
+        """切换到 WAL 日志模式（该设置持久化在数据库文件中，只需执行一次）。"""
+        conn = sqlite3.connect(self.db_path, timeout=self.pragmas["busy_timeout"] / 1000)
+        try:
+            mode = conn.execute("PRAGMA journal_mode = WAL;").fetchone()[0]
+            if str(mode).lower() != "wal":
+                logger.warning(f"数据库未能切换到 WAL 模式，当前日志模式: {mode}")
+        finally:
+            conn.close()
+
+    def _create_connection(self, read_only: bool = False) -> sqlite3.Connection:
+        # check_same_thread=False 允许 close_all() 在其他线程关闭连接；
+        # 写连接只在创建它的线程中使用，只读连接同一时刻只借给一个线程
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.pragmas["busy_timeout"] / 1000,
+            detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON;")
+        conn.execute(f"PRAGMA synchronous = {self.pragmas['synchronous']};")
+        conn.execute(f"PRAGMA cache_size = {self.pragmas['cache_size']};")
+        conn.execute(f"PRAGMA mmap_size = {self.pragmas['mmap_size']};")
+        conn.execute(f"PRAGMA temp_store = {self.pragmas['temp_store']};")
+        conn.execute(f"PRAGMA busy_timeout = {self.pragmas['busy_timeout']};")
+        if read_only:
+            conn.execute("PRAGMA query_only = ON;")
+        return conn
+
+    def _get_raw_connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "connection", None)
+        if conn is None or getattr(self._local, "generation", None) != self._generation:
+            conn = self._create_connection()
+            with self._lock:
+                self._connections.append(conn)
+                self._local.generation = self._generation
+            self._local.connection = conn
+            self._local.tx_connection = _TransactionalConnection(conn)
+            self._local.tx_depth = 0
+        return conn
+
+    def get_connection(self) -> sqlite3.Connection:
+        """
+        获取当前线程的数据库连接，不存在时创建。
+        处于事务中时返回事务代理，仓储自身的提交操作会被推迟到事务结束；
+        在只读方法中返回借用的只读连接。
+        """
+        conn = self._get_raw_connection()
+        if self._local.tx_depth:
+            return self._local.tx_connection
+        read_conn = getattr(self._local, "read_connection", None)
+        if read_conn is not None and not getattr(self._local, "write_depth", 0):
+            return read_conn
+        return conn
+
+    def in_transaction(self) -> bool:
+        """当前线程是否处于工作单元事务中。"""
+        return bool(getattr(self._local, "tx_depth", 0))
+
+    def session(self) -> ContextManager[IdentityMap]:
+        """
+        开启一个指令会话。会话内同一个用户、鱼竿实例和饰品实例只加载一次，
+        各个服务共享同一个对象。
+        """
+        return identity_session()
+
+    # --- 读写分离 ---
+
+    @contextmanager
+    def write_scope(self) -> Iterator[None]:
+        """写方法执行期间，其内部调用的只读方法也使用写连接，以读到尚未提交的写入。"""
+        depth = getattr(self._local, "write_depth", 0)
+        self._local.write_depth = depth + 1
+        try:
+            yield
+        finally:
+            self._local.write_depth = depth
+
+    @contextmanager
+    def read_scope(self) -> Iterator[None]:
+        """只读方法执行期间从连接池借用一个只读连接，嵌套调用复用同一个连接。"""
+        if (
+            not self._read_pool_size
+            or self.in_transaction()
+            or getattr(self._local, "write_depth", 0)
+            or getattr(self._local, "read_connection", None) is not None
+        ):
+            yield
+            return
+        conn, generation = self._acquire_read_connection()
+        self._local.read_connection = conn
+        try:
+            yield
+        finally:
+            self._local.read_connection = None
+            self._release_read_connection(conn, generation)
+
+    def _acquire_read_connection(self):
+        while True:
+            with self._lock:
+                generation = self._generation
+                pool = self._read_pool
+                try:
+                    return pool.get_nowait(), generation
+                except queue.Empty:
+                    pass
+                if self._read_created < self._read_pool_size:
+                    self._read_created += 1
+                    conn = self._create_connection(read_only=True)
+                    self._connections.append(conn)
+                    return conn, generation
+            # 连接都被借出时等待归还；close_all() 替换连接池后旧池不会再有连接归还，改从新池借用
+            try:
+                conn = pool.get(timeout=_READ_POOL_POLL_SECONDS)
+            except queue.Empty:
+                continue
+            with self._lock:
+                if generation == self._generation:
+                    return conn, generation
+            # 等待期间连接池已关闭，拿到的是已关闭的旧连接
+
+    def _release_read_connection(self, conn: sqlite3.Connection, generation: int) -> None:
+        with self._lock:
+            # close_all() 之后归还的旧连接已被关闭，直接丢弃；持有锁期间连接不会被关闭
+            if generation == self._generation:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._read_pool.put(conn)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        开启一个工作单元。
+
+        上下文内同一线程的所有仓储调用共享同一个连接，退出时只提交一次；
+        出现异常则整体回滚。支持嵌套，内层使用 SAVEPOINT 实现。
+        """
+        conn = self._get_raw_connection()
+        depth = self._local.tx_depth
+        if depth > 0:
+            yield from self._savepoint(conn, depth)
+            return
+
+        with self._write_lock:
+            if conn.in_transaction:
+                # 不应出现遗留的隐式事务，保险起见先提交
+                conn.commit()
+            # IMMEDIATE 在事务开始时即获取写锁，避免读锁升级写锁时直接报 database is locked
+            conn.execute("BEGIN IMMEDIATE")
+            self._local.tx_depth = 1
+            self._local.after_commit = [[]]
+            self._local.on_rollback = [[]]
+            try:
+                yield
+            except BaseException:
+                self._local.tx_depth = 0
+                self._local.after_commit = []
+                rollback_callbacks = self._local.on_rollback.pop()
+                self._local.on_rollback = []
+                conn.rollback()
+                with self._inline_writes():
+                    self._run_callbacks(rollback_callbacks)
+                raise
+            else:
+                self._local.tx_depth = 0
+                callbacks = self._local.after_commit.pop()
+                self._local.after_commit = []
+                self._local.on_rollback = []
+                conn.commit()
+                # 仍持有写锁时执行回调，保证回调的执行顺序与提交顺序一致；
+                # 回调中的写操作直接执行，投递给写线程会因其等待这把锁而死锁
+                with self._inline_writes():
+                    for callback in callbacks:
+                        try:
+                            callback()
+                        except Exception as e:
+                            logger.error(f"执行事务提交回调时出错: {e}")
+
+    def _savepoint(self, conn: sqlite3.Connection, depth: int) -> Iterator[None]:
+        savepoint = f"uow_{depth}"
+        conn.execute(f"SAVEPOINT {savepoint}")
+        self._local.tx_depth = depth + 1
+        self._local.after_commit.append([])
+        self._local.on_rollback.append([])
+        try:
+            yield
+        except BaseException:
+            self._local.tx_depth = depth
+            # 回滚到保存点时，其中登记的提交回调一并丢弃，回滚回调立即执行
+            self._local.after_commit.pop()
+            rollback_callbacks = self._local.on_rollback.pop()
+            conn.execute(f"ROLLBACK TO {savepoint}")
+            conn.execute(f"RELEASE {savepoint}")
+            self._run_callbacks(rollback_callbacks)
+            raise
+        else:
+            self._local.tx_depth = depth
+            callbacks = self._local.after_commit.pop()
+            self._local.after_commit[-1].extend(callbacks)
+            self._local.on_rollback[-1].extend(self._local.on_rollback.pop())
+            conn.execute(f"RELEASE {savepoint}")
+
+    @contextmanager
+    def _inline_writes(self) -> Iterator[None]:
+        """持有写锁执行事务回调期间，当前线程的写操作不投递给写线程。"""
+        depth = getattr(self._local, "inline_writes", 0)
+        self._local.inline_writes = depth + 1
+        try:
+            yield
+        finally:
+            self._local.inline_writes = depth
+
+    def after_commit(self, callback: Callable[[], None]) -> None:
+        """
+        登记一个在当前事务成功提交后执行的回调，事务回滚时回调被丢弃。
+        不在事务中时立即执行。
+        """
+        if not self.in_transaction():
+            callback()
+            return
+        self._local.after_commit[-1].append(callback)
+
+    def on_rollback(self, callback: Callable[[], None]) -> None:
+        """
+        登记一个在当前事务（或所在的保存点）回滚后执行的回调，用于撤销事务外的内存状态。
+        事务提交时回调被丢弃；不在事务中时不登记。
+        """
+        if self.in_transaction():
+            self._local.on_rollback[-1].append(callback)
+
+    @staticmethod
+    def _run_callbacks(callbacks: List[Callable[[], None]]) -> None:
+        for callback in reversed(callbacks):
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"执行事务回滚回调时出错: {e}")
+
+    # --- 单写线程模式 ---
+
+    def should_queue_write(self) -> bool:
+        """当前写操作是否应投递给写线程执行。"""
+        return (
+            self._writer_running
+            and threading.current_thread() is not self._writer_thread
+            and not self.in_transaction()
+            and not getattr(self._local, "inline_writes", 0)
+        )
+
+    def submit_write(self, func: Callable, *args, **kwargs) -> Future:
+        """
+        将一个写操作投递给写线程，返回在所在批次提交后完成的 Future。
+        写线程未运行时直接在当前线程执行。
+        """
+        job = _WriteJob(func, args, kwargs)
+        if not self._writer_running:
+            self._run_job_inline(job)
+            return job.future
+        self._writer_queue.put(job)
+        return job.future
+
+    def _run_job_inline(self, job: _WriteJob) -> None:
+        try:
+            job.future.set_result(job.func(*job.args, **job.kwargs))
+        except BaseException as e:
+            job.future.set_exception(e)
+
+    def start_writer(self) -> None:
+        """启动单写线程。"""
+        if self._writer_running:
+            return
+        self._writer_running = True
+        self._writer_thread = threading.Thread(target=self._writer_loop, name="fishing-db-writer", daemon=True)
+        self._writer_thread.start()
+        logger.info(f"数据库写线程已启动，合并窗口 {self._writer_window * 1000:.0f} ms。")
+
+    def stop_writer(self) -> None:
+        """停止写线程，已投递的写操作会全部提交后再退出。"""
+        if not self._writer_running:
+            return
+        self._writer_running = False
+        self._writer_queue.put(None)
+        if self._writer_thread:
+            self._writer_thread.join()
+            self._writer_thread = None
+        logger.info(f"数据库写线程已停止，共提交 {self._writer_batches} 个批次、{self._writer_jobs} 个写操作。")
+
+    def get_writer_stats(self) -> Dict[str, int]:
+        return {"batches": self._writer_batches, "jobs": self._writer_jobs}
+
+    def _writer_loop(self) -> None:
+        stopping = False
+        while not stopping:
+            job = self._writer_queue.get()
+            if job is None:
+                break
+            batch = [job]
+            deadline = time.monotonic() + self._writer_window
+            while len(batch) < self.WRITER_MAX_BATCH:
+                remaining = deadline - time.monotonic()
+                try:
+                    job = self._writer_queue.get(timeout=remaining) if remaining > 0 else self._writer_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    stopping = True
+                    break
+                batch.append(job)
+            self._commit_batch(batch)
+
+        # 停止信号之后仍可能有并发投递的写操作，逐个清空
+        leftovers = []
+        while True:
+            try:
+                job = self._writer_queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                leftovers.append(job)
+        if leftovers:
+            self._commit_batch(leftovers)
+
+    def _commit_batch(self, batch: List[_WriteJob]) -> None:
+        """在一个事务中执行一批写操作，每个操作各自使用保存点，失败只影响它自己。"""
+        results = []
+        try:
+            with self.transaction():
+                for job in batch:
+                    try:
+                        with self.transaction():
+                            results.append((job, job.func(*job.args, **job.kwargs), None))
+                    except Exception as e:
+                        results.append((job, None, e))
+        except Exception as e:
+            logger.error(f"数据库写线程提交批次失败: {e}")
+            for job in batch:
+                job.future.set_exception(e)
+            return
+
+        self._writer_batches += 1
+        self._writer_jobs += len(batch)
+        # 提交之后再通知调用方，保证调用方随后读取时能看到写入结果
+        for job, result, error in results:
+            if error is not None:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(result)
+
+    def close_all(self) -> None:
+        """停止写线程并关闭所有线程创建的连接。"""
+        self.stop_writer()
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._generation += 1
+            self._read_pool = queue.LifoQueue()
+            self._read_created = 0
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logger.warning(f"关闭数据库连接时出错: {e}")
+        logger.info(f"已关闭 {len(connections)} 个数据库连接。")
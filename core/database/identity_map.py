@@ -0,0 +1,68 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+# 表示身份映射中没有该条目（与“已加载但结果为 None”区分）
+MISSING = object()
+
+
+class IdentityMap:
+    """
+    单条指令范围内的身份映射。
+
+    同一条指令中，同一个用户、鱼竿实例或饰品实例只从数据库加载一次，
+    之后各个服务拿到的都是同一个对象，对它的修改彼此可见。
+    """
+
+    def __init__(self):
+        self._entries: Dict[Tuple[str, Any], Any] = {}
+
+    def get(self, kind: str, key: Any) -> Any:
+        """获取已加载的对象，未加载时返回 MISSING。"""
+        return self._entries.get((kind, key), MISSING)
+
+    def put(self, kind: str, key: Any, obj: Any) -> Any:
+        self._entries[(kind, key)] = obj
+        return obj
+
+    def discard_kinds(self, *kinds: str) -> None:
+        """丢弃指定类别的全部条目，供相关写操作之后使用。"""
+        for entry_key in [entry_key for entry_key in self._entries if entry_key[0] in kinds]:
+            del self._entries[entry_key]
+
+
+# 使用 ContextVar 而不是线程局部变量：事件循环中并发执行的指令各自拥有独立的映射
+_current_identity_map: ContextVar[Optional[IdentityMap]] = ContextVar("fishing_identity_map", default=None)
+
+
+def current_identity_map() -> Optional[IdentityMap]:
+    """返回当前指令的身份映射，不在会话中时返回 None。"""
+    return _current_identity_map.get()
+
+
+def load_through(kind: str, key: Any, loader: Callable[[], Any]) -> Any:
+    """在指令会话中复用已加载的对象；未命中或不在会话中时调用 loader 加载，结果为 None 时不登记。"""
+    identity_map = _current_identity_map.get()
+    if identity_map is not None:
+        obj = identity_map.get(kind, key)
+        if obj is not MISSING:
+            return obj
+    obj = loader()
+    if identity_map is not None and obj is not None:
+        identity_map.put(kind, key, obj)
+    return obj
+
+
+@contextmanager
+def session() -> Iterator[IdentityMap]:
+    """开启一个指令会话，嵌套调用复用外层会话。"""
+    existing = _current_identity_map.get()
+    if existing is not None:
+        yield existing
+        return
+    identity_map = IdentityMap()
+    token = _current_identity_map.set(identity_map)
+    try:
+        yield identity_map
+    finally:
+        _current_identity_map.reset(token)
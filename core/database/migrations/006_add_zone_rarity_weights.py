@@ -0,0 +1,37 @@
+import sqlite3
+from astrbot.api import logger
+
+def up(cursor: sqlite3.Cursor):
+    """
+    应用此迁移：新增 fishing_zone_rarity_weights 表，把原先写死在钓鱼逻辑中的各区域稀有度权重迁移到数据库。
+    """
+    logger.info("正在执行 006_add_zone_rarity_weights: 创建区域稀有度权重表...")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS fishing_zone_rarity_weights (
+            zone_id INTEGER NOT NULL,
+            rarity INTEGER NOT NULL CHECK (rarity BETWEEN 1 AND 6),
+            weight REAL NOT NULL DEFAULT 0 CHECK (weight >= 0),
+            PRIMARY KEY (zone_id, rarity),
+            FOREIGN KEY (zone_id) REFERENCES fishing_zones(id) ON DELETE CASCADE
+        )
+    """)
+
+    # 与旧版本 go_fish 中的默认分布一致，按 1~6 星排列
+    default_weights = {
+        1: [0.5, 0.35, 0.14, 0.01, 0, 0],  # 区域一：4星概率极低，5星为0
+        2: [0.5, 0.3, 0.16, 0.038, 0.001, 0.001],  # 区域二：提升4星，引入极低概率5星
+        3: [0.5, 0.3, 0.15, 0.044, 0.003, 0.003]  # 区域三：大幅提升4星和5星
+    }
+    cursor.execute("SELECT id FROM fishing_zones")
+    zone_ids = [row[0] for row in cursor.fetchall()]
+    rows = []
+    for zone_id in zone_ids:
+        # 其他区域沿用旧逻辑的回退值，即区域一的分布
+        weights = default_weights.get(zone_id, default_weights[1])
+        rows.extend((zone_id, rarity, weight) for rarity, weight in enumerate(weights, start=1))
+    cursor.executemany(
+        "INSERT OR IGNORE INTO fishing_zone_rarity_weights (zone_id, rarity, weight) VALUES (?, ?, ?)",
+        rows
+    )
+    logger.info(f"已为 {len(zone_ids)} 个钓鱼区域写入默认稀有度权重。")
@@ -0,0 +1,56 @@
+import sqlite3
+from astrbot.api import logger
+
+def up(cursor: sqlite3.Cursor):
+    """
+    应用此迁移：新增 user_fish_pond_counts 表保存每个用户鱼塘中鱼的总数，
+    由 user_fish_inventory 上的触发器在入库、出售、偷鱼、清空等所有写入路径中自动维护，
+    钓鱼时检查鱼塘容量不再需要汇总整个鱼塘。
+    """
+    logger.info("正在执行 007_add_fish_pond_counts: 创建鱼塘计数表与触发器...")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_fish_pond_counts (
+            user_id TEXT PRIMARY KEY,
+            fish_count INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+        )
+    """)
+
+    # 与 get_fish_inventory 一致，只统计数量大于 0 的记录
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_fish_inventory_count_insert
+        AFTER INSERT ON user_fish_inventory
+        BEGIN
+            INSERT INTO user_fish_pond_counts (user_id, fish_count)
+            VALUES (NEW.user_id, MAX(NEW.quantity, 0))
+            ON CONFLICT(user_id) DO UPDATE SET fish_count = fish_count + MAX(NEW.quantity, 0);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_fish_inventory_count_update
+        AFTER UPDATE OF quantity ON user_fish_inventory
+        BEGIN
+            UPDATE user_fish_pond_counts
+            SET fish_count = fish_count + MAX(NEW.quantity, 0) - MAX(OLD.quantity, 0)
+            WHERE user_id = NEW.user_id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_fish_inventory_count_delete
+        AFTER DELETE ON user_fish_inventory
+        BEGIN
+            UPDATE user_fish_pond_counts
+            SET fish_count = fish_count - MAX(OLD.quantity, 0)
+            WHERE user_id = OLD.user_id;
+        END
+    """)
+
+    # 按现有鱼塘初始化计数
+    cursor.execute("""
+        INSERT OR REPLACE INTO user_fish_pond_counts (user_id, fish_count)
+        SELECT user_id, SUM(quantity) FROM user_fish_inventory
+        WHERE quantity > 0
+        GROUP BY user_id
+    """)
+    logger.info(f"已为 {cursor.rowcount} 名用户初始化鱼塘计数。")
@@ -0,0 +1,31 @@
+import sqlite3
+from datetime import datetime
+from astrbot.api import logger
+
+def up(cursor: sqlite3.Cursor):
+    """
+    应用此迁移：为 users 表新增 bait_expires_at 列，保存当前限时鱼饵的过期时间（Unix 时间戳，秒），
+    在使用鱼饵时计算一次，钓鱼时只需比较一个整数。
+    """
+    logger.info("正在执行 008_add_bait_expiry: 为用户表添加鱼饵过期时间...")
+    cursor.execute("ALTER TABLE users ADD COLUMN bait_expires_at INTEGER")
+
+    # 为正在使用限时鱼饵的用户按开始时间补算过期时间
+    cursor.execute("""
+        SELECT u.user_id, u.bait_start_time, b.duration_minutes
+        FROM users u
+        JOIN baits b ON u.current_bait_id = b.bait_id
+        WHERE u.bait_start_time IS NOT NULL AND b.duration_minutes > 0
+    """)
+    rows = []
+    for user_id, start_time, duration_minutes in cursor.fetchall():
+        if isinstance(start_time, str):
+            try:
+                start_time = datetime.fromisoformat(start_time)
+            except ValueError:
+                continue
+        if not isinstance(start_time, datetime):
+            continue
+        rows.append((int(start_time.timestamp()) + duration_minutes * 60, user_id))
+    cursor.executemany("UPDATE users SET bait_expires_at = ? WHERE user_id = ?", rows)
+    logger.info(f"已为 {len(rows)} 名用户补算鱼饵过期时间。")
@@ -0,0 +1,15 @@
+import sqlite3
+import time
+from astrbot.api import logger
+
+def up(cursor: sqlite3.Cursor):
+    """
+    应用此迁移：为 users 表新增 auto_fishing_since 列，记录开启自动钓鱼的时间（Unix 时间戳，秒）。
+    离线结算模式按这个时间与上次抛竿时间补算错过的自动抛竿，不会把关闭期间的时间也算进去。
+    """
+    logger.info("正在执行 009_add_auto_fishing_since: 为用户表添加自动钓鱼开启时间...")
+    cursor.execute("ALTER TABLE users ADD COLUMN auto_fishing_since INTEGER")
+
+    # 已开启自动钓鱼的用户从现在开始计算
+    cursor.execute("UPDATE users SET auto_fishing_since = ? WHERE auto_fishing_enabled = 1", (int(time.time()),))
+    logger.info(f"已为 {cursor.rowcount} 名自动钓鱼用户记录开启时间。")
@@ -0,0 +1,49 @@
+import sqlite3
+from astrbot.api import logger
+
+def up(cursor: sqlite3.Cursor):
+    """
+    应用此迁移：新增自动钓鱼汇总表。
+    自动钓鱼不再为每次抛竿写一行 fishing_records，而是按用户、按小时累加到
+    auto_fishing_digest，钓到的鱼按种类累加到 auto_fishing_digest_fish。
+    手动 /钓鱼 仍然写入完整的钓鱼记录。
+    """
+    logger.info("正在执行 010_add_auto_fishing_digest: 创建自动钓鱼汇总表...")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS auto_fishing_digest (
+            user_id TEXT NOT NULL,
+            hour_start DATETIME NOT NULL,
+            casts INTEGER NOT NULL DEFAULT 0,
+            successes INTEGER NOT NULL DEFAULT 0,
+            total_weight INTEGER NOT NULL DEFAULT 0,
+            total_value INTEGER NOT NULL DEFAULT 0,
+            max_weight INTEGER NOT NULL DEFAULT 0,
+            best_fish_id INTEGER,
+            best_fish_weight INTEGER NOT NULL DEFAULT 0,
+            best_fish_value INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, hour_start),
+            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS auto_fishing_digest_fish (
+            user_id TEXT NOT NULL,
+            hour_start DATETIME NOT NULL,
+            fish_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL DEFAULT 0,
+            first_caught_at DATETIME NOT NULL,
+            PRIMARY KEY (user_id, hour_start, fish_id),
+            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
+            FOREIGN KEY (fish_id) REFERENCES fish(fish_id) ON DELETE RESTRICT
+        )
+    """)
+    # 图鉴按用户与鱼类汇总首次捕获时间
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_auto_fishing_digest_fish_user_fish "
+        "ON auto_fishing_digest_fish(user_id, fish_id)")
+    # 成就检查是否钓到过大鱼
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_auto_fishing_digest_user_weight "
+        "ON auto_fishing_digest(user_id, max_weight)")
+    logger.info("010_add_auto_fishing_digest: 自动钓鱼汇总表创建完成。")
@@ -0,0 +1,18 @@
+import sqlite3
+from astrbot.api import logger
+
+def up(cursor: sqlite3.Cursor):
+    """
+    应用此迁移：新增 scheduled_job_runs 表，记录每个后台定时任务最近一次开始执行的时间（Unix 时间戳，秒）、
+    耗时与结果。插件重启后按这里的时间补跑错过的任务，每日任务（零点重置、每日税收）每天最多执行一次。
+    """
+    logger.info("正在执行 011_add_scheduled_job_runs: 创建定时任务执行记录表...")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS scheduled_job_runs (
+            job_name TEXT PRIMARY KEY,
+            last_run_at INTEGER NOT NULL,
+            last_duration_ms INTEGER,
+            last_status TEXT NOT NULL DEFAULT 'running',
+            run_count INTEGER NOT NULL DEFAULT 0
+        )
+    """)
@@ -0,0 +1,14 @@
+import sqlite3
+from astrbot.api import logger
+
+def up(cursor: sqlite3.Cursor):
+    """
+    应用此迁移：为 fishing_zones 表新增 extra_fishing_cost 列，记录在该区域每次抛竿时在基础成本之外额外收取的金币。
+    此前额外成本按区域ID推算为 (区域ID - 1) * 50，后台新增的区域会因此得到与其定位无关的成本。
+    """
+    logger.info("正在执行 012_add_zone_fishing_cost: 为钓鱼区域添加额外抛竿成本...")
+    cursor.execute("ALTER TABLE fishing_zones ADD COLUMN extra_fishing_cost INTEGER NOT NULL DEFAULT 0")
+
+    # 已有区域沿用原来按ID推算的成本
+    cursor.execute("UPDATE fishing_zones SET extra_fishing_cost = (id - 1) * 50 WHERE id > 1")
+    logger.info(f"已为 {cursor.rowcount} 个区域设置额外抛竿成本。")
@@ -0,0 +1,145 @@
+import sqlite3
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from astrbot.api import logger
+
+from .connection_manager import DatabaseConnectionManager
+
+if TYPE_CHECKING:
+    from ..services.job_scheduler import JobScheduler
+
+# 定时刷新在后台任务调度器中的任务名
+FLUSH_JOB_NAME = "log_buffer_flush"
+
+
+class WriteBehindBuffer:
+    """
+    日志类数据的写后缓冲区。
+
+    钓鱼记录、抽卡记录等只追加、且不会在同一条指令中被读回的数据先放入内存，
+    攒满 max_rows 行或每隔 flush_interval_ms 毫秒，由后台任务在一个事务中用 executemany 批量写入。
+    待写入行数达到 max_pending 时，调用方会同步刷新一次，避免内存无限增长。
+    调用方处于工作单元事务中时，数据在事务提交后才入队，事务回滚则一并丢弃。
+    插件卸载时必须调用 close()，把剩余数据全部写入数据库。
+    未调用 register_jobs() 时每次 add() 都会立即写入，行为与不使用缓冲区相同。
+    """
+
+    def __init__(self, connection_manager: DatabaseConnectionManager, max_rows: int = 100,
+                 flush_interval_ms: int = 1000, max_pending: Optional[int] = None):
+        """
+        Args:
+            connection_manager: 共享的数据库连接管理器。
+            max_rows: 待写入行数达到该值时唤醒后台任务立即刷新。
+            flush_interval_ms: 后台任务的定时刷新间隔（毫秒）。
+            max_pending: 缓冲区上限，默认为 max_rows 的 10 倍。
+        """
+        self._connection_manager = connection_manager
+        self.max_rows = max(1, int(max_rows))
+        self.flush_interval = max(10, int(flush_interval_ms)) / 1000
+        self.max_pending = max(self.max_rows, int(max_pending or self.max_rows * 10))
+
+        # 按 SQL 语句分组，保证同一张表的行按入队顺序写入
+        self._pending: Dict[str, List[Tuple]] = {}
+        self._pending_count = 0
+        self._lock = threading.Lock()
+        # 保证同一时刻只有一个刷新在执行
+        self._flush_lock = threading.Lock()
+
+        self.queued_rows = 0
+        self.flushed_rows = 0
+        self.dropped_rows = 0
+
+        self._job_scheduler: Optional["JobScheduler"] = None
+        self._running = False
+
+    def register_jobs(self, job_scheduler: "JobScheduler") -> None:
+        """登记定时刷新的后台任务，之后 add() 只入队，不再立即写入。"""
+        if self._running:
+            return
+        self._job_scheduler = job_scheduler
+        job_scheduler.add_interval_job(FLUSH_JOB_NAME, self.flush, self.flush_interval)
+        self._running = True
+        logger.info(f"日志写缓冲已启动，每 {self.max_rows} 行或 {self.flush_interval * 1000:.0f} ms 刷新一次。")
+
+    def close(self) -> None:
+        """停止缓冲并写入所有剩余数据，在后台任务调度器停止后调用。"""
+        self._running = False
+        self.flush()
+        logger.info(f"日志写缓冲已关闭，累计入队 {self.queued_rows} 行，写入 {self.flushed_rows} 行。")
+
+    def add(self, sql: str, params: Tuple) -> None:
+        """追加一行待写入的数据。"""
+        self.add_many(sql, [params])
+
+    def add_many(self, sql: str, rows: List[Tuple]) -> None:
+        """追加同一条语句的多行数据，这些行一起入队。"""
+        if not rows:
+            return
+        rows = list(rows)
+        if self._connection_manager.in_transaction():
+            # 入队后可能被后台任务先于调用方的事务写入，回滚时无法撤销，因此等提交后再入队
+            self._connection_manager.after_commit(lambda: self._enqueue(sql, rows))
+            return
+        self._enqueue(sql, rows)
+
+    def _enqueue(self, sql: str, rows: List[Tuple]) -> None:
+        with self._lock:
+            self._pending.setdefault(sql, []).extend(rows)
+            self._pending_count += len(rows)
+            self.queued_rows += len(rows)
+            pending = self._pending_count
+        if not self._running:
+            self.flush()
+        elif pending >= self.max_pending:
+            # 缓冲区已满时由调用方同步写入
+            self.flush()
+        elif pending >= self.max_rows:
+            self._job_scheduler.trigger(FLUSH_JOB_NAME)
+
+    def flush(self) -> int:
+        """立即把缓冲区中的数据写入数据库，返回写入的行数。"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending_count:
+                    return 0
+                batches, self._pending = self._pending, {}
+                self._pending_count = 0
+
+            written = 0
+            for sql, rows in batches.items():
+                written += self._write_rows(sql, rows)
+            with self._lock:
+                self.flushed_rows += written
+            return written
+
+    def _write_rows(self, sql: str, rows: List[Tuple]) -> int:
+        try:
+            with self._connection_manager.transaction():
+                self._connection_manager.get_connection().executemany(sql, rows)
+            return len(rows)
+        except sqlite3.Error as e:
+            logger.warning(f"批量写入日志失败，改为逐行写入: {e}")
+
+        # 批量失败时逐行重试，只丢弃真正写不进去的行
+        written = 0
+        for row in rows:
+            try:
+                with self._connection_manager.transaction():
+                    self._connection_manager.get_connection().execute(sql, row)
+                written += 1
+            except sqlite3.Error as e:
+                logger.error(f"日志写入失败，已丢弃该行: {e} {row}")
+                with self._lock:
+                    self.dropped_rows += 1
+        return written
+
+    def get_stats(self) -> Dict[str, int]:
+        """返回入队、已写入、待写入和丢弃的行数。"""
+        with self._lock:
+            return {
+                "queued": self.queued_rows,
+                "flushed": self.flushed_rows,
+                "pending": self._pending_count,
+                "dropped": self.dropped_rows,
+            }
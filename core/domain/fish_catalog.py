@@ -0,0 +1,59 @@
+from typing import Dict, Iterable, Optional, Tuple
+import random
+
+from .models import Fish
+from ..utils import get_fish_template
+
+
+class FishCatalog:
+    """
+    按稀有度组织的鱼类目录。
+
+    每个稀有度下的鱼预先按基础价值从高到低排好序，并记录每条鱼在其中的价值排名，
+    抛竿时按稀有度取鱼只需要一次下标运算。目录是不可变的，鱼类模板变化时整体重建。
+    """
+
+    def __init__(self, fishes: Iterable[Fish]):
+        by_rarity: Dict[int, list] = {}
+        for fish in sorted(fishes, key=lambda f: f.fish_id):
+            by_rarity.setdefault(fish.rarity, []).append(fish)
+
+        # sorted 是稳定排序，同价值的鱼保持ID顺序，与逐次排序的结果一致
+        self._sorted_by_rarity: Dict[int, Tuple[Fish, ...]] = {
+            rarity: tuple(sorted(fish_list, key=lambda f: f.base_value, reverse=True))
+            for rarity, fish_list in by_rarity.items()
+        }
+        self._value_ranks: Dict[int, int] = {
+            fish.fish_id: rank
+            for sorted_fishes in self._sorted_by_rarity.values()
+            for rank, fish in enumerate(sorted_fishes)
+        }
+        self._all_fish: Tuple[Fish, ...] = tuple(
+            fish for rarity in sorted(by_rarity) for fish in by_rarity[rarity]
+        )
+
+    def __len__(self) -> int:
+        return len(self._all_fish)
+
+    def get_fishes(self, rarity: int) -> Tuple[Fish, ...]:
+        """返回指定稀有度的鱼，按基础价值从高到低排列。"""
+        return self._sorted_by_rarity.get(rarity, ())
+
+    def get_all_fishes(self) -> Tuple[Fish, ...]:
+        """返回目录中的全部鱼。"""
+        return self._all_fish
+
+    def get_value_rank(self, fish_id: int) -> Optional[int]:
+        """返回鱼在同稀有度中的价值排名（0 为最高），不存在时返回 None。"""
+        return self._value_ranks.get(fish_id)
+
+    def pick(self, rarity: int, coins_chance: float, rng: random.Random = random) -> Optional[Fish]:
+        """从指定稀有度中随机选一条鱼并应用金币加成，该稀有度没有鱼时返回 None。"""
+        sorted_fishes = self._sorted_by_rarity.get(rarity)
+        if not sorted_fishes:
+            return None
+        return get_fish_template(sorted_fishes, coins_chance, rng)
+
+    def random_fish(self, rng: random.Random = random) -> Optional[Fish]:
+        """从所有鱼中随机选一条。"""
+        return rng.choice(self._all_fish) if self._all_fish else None
@@ -1,5 +1,5 @@
 from dataclasses import dataclass, field
-from typing import Optional, List
+from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime
 
 # ---------------------------------
@@ -164,19 +164,63 @@ class User:
     current_title_id: Optional[int] = None
     current_bait_id: Optional[int] = None
     bait_start_time: Optional[datetime] = None
+    # 当前限时鱼饵的过期时间（Unix 时间戳，秒），None 表示不限时
+    bait_expires_at: Optional[int] = None
 
     # 状态信息
     auto_fishing_enabled: bool = False
+    # 开启自动钓鱼的时间（Unix 时间戳，秒），离线结算不会补算此前的时间
+    auto_fishing_since: Optional[int] = None
     last_fishing_time: Optional[datetime] = None
     last_wipe_bomb_time: Optional[datetime] = None
     last_steal_time: Optional[datetime] = None
     last_login_time: Optional[datetime] = None
     last_stolen_at: Optional[datetime] = None
 
+    # 最近一次与数据库同步时的字段快照，用于计算脏字段，不参与持久化
+    _snapshot: Optional[Dict[str, Any]] = field(default=None, init=False, repr=False, compare=False)
+
     def can_afford(self, cost: int) -> bool:
         """判断用户金币是否足够"""
         return self.coins >= cost
 
+    def mark_clean(self) -> None:
+        """将当前字段值记录为已持久化状态，由仓储在加载和写回后调用"""
+        self._snapshot = {name: getattr(self, name) for name in USER_PERSISTED_FIELDS}
+
+    def restore_snapshot(self, snapshot: Optional[Dict[str, Any]]) -> None:
+        """恢复之前的快照，写回所在的事务回滚后由仓储调用，回滚的字段重新计为变化"""
+        self._snapshot = snapshot
+
+    def get_changes(self) -> Optional[Dict[str, Tuple[Any, Any]]]:
+        """
+        返回自上次同步以来发生变化的字段，格式为 {字段名: (原值, 新值)}。
+        对象不是从仓储加载的（没有快照）时返回 None，表示无法判断哪些字段变化。
+        """
+        if self._snapshot is None:
+            return None
+        changes = {}
+        for name in USER_PERSISTED_FIELDS:
+            original = self._snapshot[name]
+            current = getattr(self, name)
+            if current != original:
+                changes[name] = (original, current)
+        return changes
+
+# users 表中可由 update 写回的字段（user_id 与 created_at 不会被修改）
+USER_PERSISTED_FIELDS = (
+    "nickname", "coins", "premium_currency",
+    "total_fishing_count", "total_weight_caught", "total_coins_earned",
+    "consecutive_login_days", "fish_pond_capacity",
+    "equipped_rod_instance_id", "equipped_accessory_instance_id",
+    "current_title_id", "current_bait_id", "bait_start_time", "bait_expires_at",
+    "auto_fishing_enabled", "auto_fishing_since", "last_fishing_time", "last_wipe_bomb_time",
+    "last_steal_time", "last_login_time", "last_stolen_at", "fishing_zone_id",
+)
+
+# 计数类字段，写回数据库时以增量方式累加
+USER_DELTA_FIELDS = frozenset({"coins", "total_fishing_count", "total_weight_caught", "total_coins_earned"})
+
 # ---------------------------------
 # 关联与日志实体 (Association & Log Entities)
 # ---------------------------------
@@ -203,6 +247,43 @@ class FishingRecord:
     location_id: Optional[int] = None
     is_king_size: bool = False
 
+@dataclass
+class AutoFishingDigest:
+    """自动钓鱼按用户、按小时汇总的记录"""
+    user_id: str
+    hour_start: datetime
+    casts: int = 0
+    successes: int = 0
+    total_weight: int = 0
+    total_value: int = 0
+    max_weight: int = 0
+    # 本小时价值最高的渔获
+    best_fish_id: Optional[int] = None
+    best_fish_weight: int = 0
+    best_fish_value: int = 0
+    # fish_id -> 数量
+    fish_counts: Dict[int, int] = field(default_factory=dict)
+    # fish_id -> 本小时首次钓到的时间
+    first_caught_at: Dict[int, datetime] = field(default_factory=dict)
+
+    def add_cast(self, fish_id: Optional[int] = None, weight: int = 0, value: int = 0,
+                 caught_at: Optional[datetime] = None) -> None:
+        """累加一次抛竿，fish_id 为 None 表示什么都没钓到"""
+        self.casts += 1
+        if fish_id is None:
+            return
+        self.successes += 1
+        self.total_weight += weight
+        self.total_value += value
+        self.max_weight = max(self.max_weight, weight)
+        if self.best_fish_id is None or value > self.best_fish_value:
+            self.best_fish_id = fish_id
+            self.best_fish_weight = weight
+            self.best_fish_value = value
+        self.fish_counts[fish_id] = self.fish_counts.get(fish_id, 0) + 1
+        if fish_id not in self.first_caught_at:
+            self.first_caught_at[fish_id] = caught_at or self.hour_start
+
 @dataclass
 class GachaRecord:
     """一条抽卡记录"""
@@ -270,6 +351,8 @@ class FishingZone:
     daily_rare_fish_quota: int
     # 今天已被钓走的稀有鱼数量
     rare_fish_caught_today: int = 0
+    # 在该区域每次抛竿时在基础成本之外额外收取的金币
+    extra_fishing_cost: int = 0
 
     def __getitem__(self, item):
         """允许通过属性名访问字段"""
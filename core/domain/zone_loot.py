@@ -0,0 +1,55 @@
+from typing import Dict, Tuple
+
+from ..sampling import AliasTable, AliasTableCache
+
+# 钓鱼可以产出的稀有度
+RARITY_LEVELS: Tuple[int, ...] = (1, 2, 3, 4, 5, 6)
+# 受区域每日稀有鱼配额限制的稀有度，配额用尽后这些稀有度的权重视为 0
+QUOTA_LIMITED_RARITIES: Tuple[int, ...] = (5, 6)
+
+
+class ZoneLootTable:
+    """
+    一个钓鱼区域编译后的稀有度掉落表。
+
+    基础分布在构建时归一化，稀有度加成为 0 时的两种变体（配额可用 / 配额用尽）预先编译好，
+    其他稀有度加成的变体在第一次使用时编译并缓存。抛竿时只需取出对应的别名表抽样。
+    """
+
+    def __init__(self, zone_id: int, weights: Dict[int, float]):
+        self.zone_id = zone_id
+        base = [max(0.0, float(weights.get(rarity, 0.0))) for rarity in RARITY_LEVELS]
+        total = sum(base)
+        if sum(w for rarity, w in zip(RARITY_LEVELS, base) if rarity not in QUOTA_LIMITED_RARITIES) <= 0:
+            # 否则配额用尽后没有任何可钓的稀有度
+            raise ValueError(f"钓鱼区域 {zone_id} 至少需要为一个不受配额限制的稀有度设置正权重")
+        self.distribution: Tuple[float, ...] = tuple(x / total for x in base)
+
+        self._samplers = AliasTableCache(max_size=64)
+        self.get_sampler(0.0, True)
+        self.get_sampler(0.0, False)
+
+    def get_distribution(self, rare_chance: float, is_rare_fish_available: bool) -> Tuple[float, ...]:
+        """返回指定稀有度加成与配额状态下归一化后的 1~6 星概率分布。"""
+        rarity_distribution = self._build_distribution(rare_chance, is_rare_fish_available)
+        total = sum(rarity_distribution)
+        return tuple(x / total for x in rarity_distribution)
+
+    def get_sampler(self, rare_chance: float, is_rare_fish_available: bool) -> AliasTable:
+        """返回指定稀有度加成与配额状态下的稀有度抽样表。"""
+        return self._samplers.get(
+            (rare_chance, is_rare_fish_available),
+            lambda: (RARITY_LEVELS, self._build_distribution(rare_chance, is_rare_fish_available))
+        )
+
+    def _build_distribution(self, rare_chance: float, is_rare_fish_available: bool) -> list:
+        rarity_distribution = list(self.distribution)
+        # 应用稀有度加成：增加稀有鱼出现的几率
+        if rare_chance > 0.0:
+            rarity_distribution = [x + rare_chance for x in rarity_distribution]
+        if not is_rare_fish_available:
+            # 如果稀有鱼已达上限，则将受配额限制的稀有度权重设为0
+            for rarity in QUOTA_LIMITED_RARITIES:
+                rarity_distribution[RARITY_LEVELS.index(rarity)] = 0.0
+        # 别名表构建时会自行归一化
+        return rarity_distribution
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Callable, ContextManager, Tuple
 from datetime import date, datetime
 
 # 从领域模型导入所有需要的实体
@@ -7,12 +7,29 @@ from ..domain.models import (
     User, Fish, Rod, Bait, Accessory, Title, Achievement,
     UserRodInstance, UserAccessoryInstance, UserFishInventoryItem,
     FishingRecord, GachaRecord, WipeBombLog, MarketListing, TaxRecord,
-    GachaPool, GachaPoolItem, FishingZone
+    GachaPool, GachaPoolItem, FishingZone, AutoFishingDigest
 )
+from ..domain.fish_catalog import FishCatalog
+from ..domain.zone_loot import ZoneLootTable
 
 # 定义用户成就进度的数据结构
 UserAchievementProgress = Dict[int, Dict[str, Any]] # {achievement_id: {progress: X, completed_at: Y}}
 
+class AbstractUnitOfWork(ABC):
+    """工作单元接口"""
+    # 开启一个事务上下文，上下文内的所有仓储调用共享同一个连接，退出时统一提交
+    @abstractmethod
+    def transaction(self) -> ContextManager[None]: pass
+    # 开启一个指令会话，会话内同一实体只加载一次并在各服务间共享（身份映射）
+    @abstractmethod
+    def session(self) -> ContextManager[Any]: pass
+    # 登记一个在当前事务提交后执行的回调，不在事务中时立即执行
+    @abstractmethod
+    def after_commit(self, callback: Callable[[], None]) -> None: pass
+    # 登记一个在当前事务回滚后执行的回调，用于撤销事务外的内存状态
+    @abstractmethod
+    def on_rollback(self, callback: Callable[[], None]) -> None: pass
+
 class AbstractUserRepository(ABC):
     """用户数据仓储接口"""
     # 根据ID获取用户
@@ -24,7 +41,7 @@ class AbstractUserRepository(ABC):
     # 新增一个用户
     @abstractmethod
     def add(self, user: User) -> None: pass
-    # 更新用户信息
+    # 更新用户信息（只写回发生变化的字段）
     @abstractmethod
     def update(self, user: User) -> None: pass
     # 获取所有用户ID
@@ -72,6 +89,24 @@ class AbstractItemTemplateRepository(ABC):
     # 获取所有称号模板
     @abstractmethod
     def get_all_titles(self) -> List[Title]: pass
+    # 批量获取鱼类模板，返回以ID为键的字典
+    @abstractmethod
+    def get_fishes_by_ids(self, fish_ids: List[int]) -> Dict[int, Fish]: pass
+    # 批量获取鱼竿模板
+    @abstractmethod
+    def get_rods_by_ids(self, rod_ids: List[int]) -> Dict[int, Rod]: pass
+    # 批量获取鱼饵模板
+    @abstractmethod
+    def get_baits_by_ids(self, bait_ids: List[int]) -> Dict[int, Bait]: pass
+    # 批量获取饰品模板
+    @abstractmethod
+    def get_accessories_by_ids(self, accessory_ids: List[int]) -> Dict[int, Accessory]: pass
+    # 批量获取称号模板
+    @abstractmethod
+    def get_titles_by_ids(self, title_ids: List[int]) -> Dict[int, Title]: pass
+    # 获取按稀有度预先排序的鱼类目录
+    @abstractmethod
+    def get_fish_catalog(self) -> FishCatalog: pass
     # 随机获取一条鱼的模板
     @abstractmethod
     def get_random_fish(self, rarity: Optional[int] = None) -> Optional[Fish]: pass
@@ -111,9 +146,21 @@ class AbstractItemTemplateRepository(ABC):
     # 删除饰品模板
     @abstractmethod
     def delete_accessory_template(self, accessory_id: int) -> None: pass
+    # 统计引用某个模板（fish/rod/bait/accessory）的玩家数据条数，删除模板前检查
+    @abstractmethod
+    def count_template_references(self, item_type: str, item_id: int) -> int: pass
     # 添加称号模板
     @abstractmethod
     def add_title_template(self, title_data: Dict[str, Any]) -> Title: pass
+    # 获取所有区域的稀有度权重 {zone_id: {rarity: weight}}
+    @abstractmethod
+    def get_zone_rarity_weights(self) -> Dict[int, Dict[int, float]]: pass
+    # 获取区域编译后的稀有度掉落表，未配置时返回 None
+    @abstractmethod
+    def get_zone_loot_table(self, zone_id: int) -> Optional[ZoneLootTable]: pass
+    # 整体替换区域的稀有度权重
+    @abstractmethod
+    def update_zone_rarity_weights(self, zone_id: int, weights: Dict[int, float]) -> None: pass
 
 class AbstractInventoryRepository(ABC):
     """用户库存仓储接口"""
@@ -126,6 +173,18 @@ class AbstractInventoryRepository(ABC):
     # 向用户鱼类库存添加鱼
     @abstractmethod
     def add_fish_to_inventory(self, user_id: str, fish_id: int, quantity: int = 1) -> None: pass
+    # 批量向用户鱼塘添加鱼，items 为 (user_id, fish_id, quantity)
+    @abstractmethod
+    def add_fish_to_inventory_bulk(self, items: List[Tuple[str, int, int]]) -> None: pass
+    # 获取用户鱼塘中鱼的总数
+    @abstractmethod
+    def get_fish_pond_count(self, user_id: str) -> int: pass
+    # 批量获取用户鱼塘中鱼的总数
+    @abstractmethod
+    def get_fish_pond_counts(self, user_ids: List[str]) -> Dict[str, int]: pass
+    # 按数量加权随机移除用户鱼塘中的一条鱼，返回被移除的鱼ID，鱼塘为空时返回 None
+    @abstractmethod
+    def remove_random_fish(self, user_id: str) -> Optional[int]: pass
     # 清空用户鱼类库存
     @abstractmethod
     def clear_fish_inventory(self, user_id: str, rarity: Optional[int] = None) -> None: pass
@@ -141,6 +200,9 @@ class AbstractInventoryRepository(ABC):
     # 更新用户的鱼饵数量
     @abstractmethod
     def update_bait_quantity(self, user_id: str, bait_id: int, delta: int) -> None: pass
+    # 消耗一个指定的鱼饵，返回剩余数量；用户没有该鱼饵时返回 None
+    @abstractmethod
+    def consume_bait(self, user_id: str, bait_id: int) -> Optional[int]: pass
     # 获取用户的所有鱼竿实例
     @abstractmethod
     def get_user_rod_instances(self, user_id: str) -> List[UserRodInstance]: pass
@@ -195,9 +257,21 @@ class AbstractInventoryRepository(ABC):
     # 更新钓鱼区域信息
     @abstractmethod
     def update_fishing_zone(self, zone: FishingZone) -> None: pass
+    # 批量写回各区域今日已钓走的稀有鱼数量，counts 为 {zone_id: count}
+    @abstractmethod
+    def update_rare_fish_counts(self, counts: Dict[int, int]) -> None: pass
+    # 在各区域今日已钓走的稀有鱼数量上累加增量（结果不小于 0），deltas 为 {zone_id: delta}
+    @abstractmethod
+    def add_rare_fish_counts(self, deltas: Dict[int, int]) -> None: pass
+    # 稀有鱼计数未达配额时加一并返回新计数，已达配额时返回 None
+    @abstractmethod
+    def try_increment_rare_fish_count(self, zone_id: int) -> Optional[int]: pass
     # 获取所有钓鱼区域
     @abstractmethod
     def get_all_fishing_zones(self) -> List[FishingZone]: pass
+    # 添加钓鱼区域
+    @abstractmethod
+    def add_fishing_zone(self, zone: FishingZone) -> None: pass
 
 class AbstractGachaRepository(ABC):
     """抽卡仓储接口"""
@@ -249,12 +323,21 @@ class AbstractLogRepository(ABC):
     # 记录一条钓鱼日志
     @abstractmethod
     def add_fishing_record(self, record: FishingRecord) -> bool: pass
+    # 批量添加钓鱼记录
+    @abstractmethod
+    def add_fishing_records(self, records: List[FishingRecord]) -> None: pass
     # 获取用户已经解锁的鱼类
     @abstractmethod
     def get_unlocked_fish_ids(self, user_id: str) -> Dict[int, datetime]: pass
     # 获取用户钓鱼日志
     @abstractmethod
     def get_fishing_records(self, user_id: str, limit: int) -> List[FishingRecord]: pass
+    # 累加自动钓鱼的每小时汇总
+    @abstractmethod
+    def add_auto_fishing_digests(self, digests: List[AutoFishingDigest]) -> None: pass
+    # 获取用户最近的自动钓鱼汇总
+    @abstractmethod
+    def get_auto_fishing_digests(self, user_id: str, limit: int) -> List[AutoFishingDigest]: pass
     # 记录一条抽卡日志
     @abstractmethod
     def add_gacha_record(self, record: GachaRecord) -> None: pass
@@ -315,3 +398,15 @@ class AbstractAchievementRepository(ABC):
     # 检查用户是否拥有特定稀有度的物品
     @abstractmethod
     def has_item_of_rarity(self, user_id: str, item_type: str, rarity: int) -> bool: pass
+
+class AbstractJobRunRepository(ABC):
+    """后台定时任务执行记录仓储接口"""
+    # 获取所有任务最近一次成功执行的开始时间（Unix 时间戳，秒），从未成功执行的任务不返回
+    @abstractmethod
+    def get_last_runs(self) -> Dict[str, int]: pass
+    # 记录任务开始执行
+    @abstractmethod
+    def mark_started(self, job_name: str) -> None: pass
+    # 记录任务执行结束的耗时与结果，结果为 ok 或 skipped 时把 started_at 记为最近一次成功执行的时间
+    @abstractmethod
+    def mark_finished(self, job_name: str, started_at: int, duration_ms: int, status: str) -> None: pass
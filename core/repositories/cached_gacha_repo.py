@@ -0,0 +1,81 @@
+import threading
+from typing import Optional, List, Dict, Any
+
+from .abstract_repository import AbstractGachaRepository
+from ..domain.models import GachaPool, GachaPoolItem
+
+
+class CachedGachaRepository(AbstractGachaRepository):
+    """
+    抽卡池配置的内存目录。
+
+    所有抽卡池及其奖品在首次读取时一次性加载，每次抽卡不再查询数据库。
+    后台管理对奖池或奖品的任何修改都会使缓存失效，下一次读取时重新加载。
+    """
+
+    def __init__(self, repo: AbstractGachaRepository):
+        """
+        Args:
+            repo: 实际读写数据库的抽卡仓储。
+        """
+        self._repo = repo
+        self._pools: Optional[Dict[int, GachaPool]] = None
+        # 每次失效自增，防止失效前开始的加载把旧数据写回缓存
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def _get_pools(self) -> Dict[int, GachaPool]:
+        pools = self._pools
+        if pools is not None:
+            return pools
+        with self._lock:
+            if self._pools is not None:
+                return self._pools
+            version = self._version
+        pools = {pool.gacha_pool_id: pool for pool in self._repo.get_all_pools()}
+        with self._lock:
+            if version == self._version:
+                self._pools = pools
+        return pools
+
+    def invalidate(self) -> None:
+        """使抽卡池缓存失效，下一次读取时重新加载。"""
+        with self._lock:
+            self._version += 1
+            self._pools = None
+
+    # --- Gacha Read Methods ---
+    def get_pool_by_id(self, pool_id: int) -> Optional[GachaPool]:
+        return self._get_pools().get(pool_id)
+
+    def get_pool_items(self, pool_id: int) -> List[GachaPoolItem]:
+        pool = self._get_pools().get(pool_id)
+        return list(pool.items) if pool else []
+
+    def get_all_pools(self) -> List[GachaPool]:
+        return list(self._get_pools().values())
+
+    # --- Admin Panel CRUD Methods ---
+    def add_pool_template(self, data: Dict[str, Any]) -> None:
+        self._repo.add_pool_template(data)
+        self.invalidate()
+
+    def update_pool_template(self, pool_id: int, data: Dict[str, Any]) -> None:
+        self._repo.update_pool_template(pool_id, data)
+        self.invalidate()
+
+    def delete_pool_template(self, pool_id: int) -> None:
+        self._repo.delete_pool_template(pool_id)
+        self.invalidate()
+
+    def add_item_to_pool(self, pool_id: int, data: Dict[str, Any]) -> None:
+        self._repo.add_item_to_pool(pool_id, data)
+        self.invalidate()
+
+    def update_pool_item(self, item_pool_id: int, data: Dict[str, Any]) -> None:
+        self._repo.update_pool_item(item_pool_id, data)
+        self.invalidate()
+
+    def delete_pool_item(self, item_pool_id: int) -> None:
+        self._repo.delete_pool_item(item_pool_id)
+        self.invalidate()
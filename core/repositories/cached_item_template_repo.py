@@ -0,0 +1,242 @@
+import random
+import threading
+from typing import Optional, List, Dict, Any
+
+from .abstract_repository import AbstractItemTemplateRepository
+from ..domain.models import Fish, Rod, Bait, Accessory, Title
+from ..domain.fish_catalog import FishCatalog
+from ..domain.zone_loot import ZoneLootTable
+
+
+def _pick(templates: Dict[int, Any], ids: List[int]) -> Dict[int, Any]:
+    """从ID到模板的字典中取出指定的模板，不存在的ID被忽略。"""
+    return {template_id: templates[template_id] for template_id in ids if template_id in templates}
+
+
+class _TemplateSnapshot:
+    """某一时刻全部物品模板的只读快照。"""
+
+    def __init__(self, repo: AbstractItemTemplateRepository):
+        # 列表的顺序与 SQLite 实现中对应查询的 ORDER BY 保持一致
+        self.all_fish: List[Fish] = repo.get_all_fish()
+        self.all_rods: List[Rod] = repo.get_all_rods()
+        self.all_baits: List[Bait] = repo.get_all_baits()
+        self.all_accessories: List[Accessory] = repo.get_all_accessories()
+        self.all_titles: List[Title] = repo.get_all_titles()
+
+        self.fish = {fish.fish_id: fish for fish in self.all_fish}
+        self.rods = {rod.rod_id: rod for rod in self.all_rods}
+        self.baits = {bait.bait_id: bait for bait in self.all_baits}
+        self.accessories = {accessory.accessory_id: accessory for accessory in self.all_accessories}
+        self.titles = {title.title_id: title for title in self.all_titles}
+
+        self.fish_by_rarity: Dict[int, List[Fish]] = {}
+        for fish in sorted(self.all_fish, key=lambda f: f.fish_id):
+            self.fish_by_rarity.setdefault(fish.rarity, []).append(fish)
+
+
+class CachedItemTemplateRepository(AbstractItemTemplateRepository):
+    """
+    物品模板的内存目录。
+
+    模板数据只会在后台管理中修改，这里在首次读取时把所有模板一次性加载到内存，
+    之后的查询都是字典读取。任何写操作都会先写入底层仓储，再使整个快照失效，
+    下一次读取时重新加载，读者始终看到一个完整一致的快照。
+    """
+
+    def __init__(self, repo: AbstractItemTemplateRepository):
+        """
+        Args:
+            repo: 实际读写数据库的物品模板仓储。
+        """
+        self._repo = repo
+        self._snapshot: Optional[_TemplateSnapshot] = None
+        # 鱼类目录只依赖鱼类模板，其他模板变化时保留
+        self._fish_catalog: Optional[FishCatalog] = None
+        self._fish_version = 0
+        # 各区域编译后的稀有度掉落表，只在区域权重修改时失效
+        self._loot_tables: Optional[Dict[int, ZoneLootTable]] = None
+        self._loot_version = 0
+        # 每次失效自增，防止失效前开始的加载把旧数据写回缓存
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def _get_snapshot(self) -> _TemplateSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        with self._lock:
+            if self._snapshot is not None:
+                return self._snapshot
+            version = self._version
+        snapshot = _TemplateSnapshot(self._repo)
+        with self._lock:
+            if version == self._version:
+                self._snapshot = snapshot
+        return snapshot
+
+    def invalidate(self) -> None:
+        """使模板快照失效，下一次读取时重新加载。"""
+        with self._lock:
+            self._version += 1
+            self._snapshot = None
+
+    def _invalidate_fish(self) -> None:
+        """鱼类模板变化时，连同鱼类目录一起失效。"""
+        with self._lock:
+            self._fish_version += 1
+            self._fish_catalog = None
+        self.invalidate()
+
+    # --- Fish Read Methods ---
+    def get_fish_by_id(self, fish_id: int) -> Optional[Fish]:
+        return self._get_snapshot().fish.get(fish_id)
+
+    def get_all_fish(self) -> List[Fish]:
+        return list(self._get_snapshot().all_fish)
+
+    def get_random_fish(self, rarity: Optional[int] = None) -> Optional[Fish]:
+        snapshot = self._get_snapshot()
+        candidates = snapshot.all_fish if rarity is None else snapshot.fish_by_rarity.get(rarity, [])
+        return random.choice(candidates) if candidates else None
+
+    def get_fishes_by_rarity(self, rarity: int) -> List[Fish]:
+        return list(self._get_snapshot().fish_by_rarity.get(rarity, []))
+
+    def get_fishes_by_ids(self, fish_ids: List[int]) -> Dict[int, Fish]:
+        return _pick(self._get_snapshot().fish, fish_ids)
+
+    def get_fish_catalog(self) -> FishCatalog:
+        catalog = self._fish_catalog
+        if catalog is not None:
+            return catalog
+        with self._lock:
+            version = self._fish_version
+        catalog = FishCatalog(self._get_snapshot().all_fish)
+        with self._lock:
+            if version == self._fish_version:
+                self._fish_catalog = catalog
+        return catalog
+
+    # --- Rod Read Methods ---
+    def get_rod_by_id(self, rod_id: int) -> Optional[Rod]:
+        return self._get_snapshot().rods.get(rod_id)
+
+    def get_all_rods(self) -> List[Rod]:
+        return list(self._get_snapshot().all_rods)
+
+    def get_rods_by_ids(self, rod_ids: List[int]) -> Dict[int, Rod]:
+        return _pick(self._get_snapshot().rods, rod_ids)
+
+    # --- Bait Read Methods ---
+    def get_bait_by_id(self, bait_id: int) -> Optional[Bait]:
+        return self._get_snapshot().baits.get(bait_id)
+
+    def get_all_baits(self) -> List[Bait]:
+        return list(self._get_snapshot().all_baits)
+
+    def get_baits_by_ids(self, bait_ids: List[int]) -> Dict[int, Bait]:
+        return _pick(self._get_snapshot().baits, bait_ids)
+
+    # --- Accessory Read Methods ---
+    def get_accessory_by_id(self, accessory_id: int) -> Optional[Accessory]:
+        return self._get_snapshot().accessories.get(accessory_id)
+
+    def get_all_accessories(self) -> List[Accessory]:
+        return list(self._get_snapshot().all_accessories)
+
+    def get_accessories_by_ids(self, accessory_ids: List[int]) -> Dict[int, Accessory]:
+        return _pick(self._get_snapshot().accessories, accessory_ids)
+
+    # --- Title Read Methods ---
+    def get_title_by_id(self, title_id: int) -> Optional[Title]:
+        return self._get_snapshot().titles.get(title_id)
+
+    def get_all_titles(self) -> List[Title]:
+        return list(self._get_snapshot().all_titles)
+
+    def get_titles_by_ids(self, title_ids: List[int]) -> Dict[int, Title]:
+        return _pick(self._get_snapshot().titles, title_ids)
+
+    # ==========================================================
+    # Admin Panel CRUD Methods
+    # ==========================================================
+
+    def add_fish_template(self, data: Dict[str, Any]) -> None:
+        self._repo.add_fish_template(data)
+        self._invalidate_fish()
+
+    def update_fish_template(self, fish_id: int, data: Dict[str, Any]) -> None:
+        self._repo.update_fish_template(fish_id, data)
+        self._invalidate_fish()
+
+    def delete_fish_template(self, fish_id: int) -> None:
+        self._repo.delete_fish_template(fish_id)
+        self._invalidate_fish()
+
+    def add_rod_template(self, data: Dict[str, Any]) -> None:
+        self._repo.add_rod_template(data)
+        self.invalidate()
+
+    def update_rod_template(self, rod_id: int, data: Dict[str, Any]) -> None:
+        self._repo.update_rod_template(rod_id, data)
+        self.invalidate()
+
+    def delete_rod_template(self, rod_id: int) -> None:
+        self._repo.delete_rod_template(rod_id)
+        self.invalidate()
+
+    def add_bait_template(self, data: Dict[str, Any]) -> None:
+        self._repo.add_bait_template(data)
+        self.invalidate()
+
+    def update_bait_template(self, bait_id: int, data: Dict[str, Any]) -> None:
+        self._repo.update_bait_template(bait_id, data)
+        self.invalidate()
+
+    def delete_bait_template(self, bait_id: int) -> None:
+        self._repo.delete_bait_template(bait_id)
+        self.invalidate()
+
+    def add_accessory_template(self, data: Dict[str, Any]) -> None:
+        self._repo.add_accessory_template(data)
+        self.invalidate()
+
+    def update_accessory_template(self, accessory_id: int, data: Dict[str, Any]) -> None:
+        self._repo.update_accessory_template(accessory_id, data)
+        self.invalidate()
+
+    def delete_accessory_template(self, accessory_id: int) -> None:
+        self._repo.delete_accessory_template(accessory_id)
+        self.invalidate()
+
+    def count_template_references(self, item_type: str, item_id: int) -> int:
+        return self._repo.count_template_references(item_type, item_id)
+
+    def add_title_template(self, data: Dict[str, Any]) -> None:
+        self._repo.add_title_template(data)
+        self.invalidate()
+
+    # --- Zone Loot Table Methods ---
+    def get_zone_rarity_weights(self) -> Dict[int, Dict[int, float]]:
+        return self._repo.get_zone_rarity_weights()
+
+    def get_zone_loot_table(self, zone_id: int) -> Optional[ZoneLootTable]:
+        loot_tables = self._loot_tables
+        if loot_tables is None:
+            with self._lock:
+                version = self._loot_version
+            loot_tables = {
+                table_zone_id: ZoneLootTable(table_zone_id, weights)
+                for table_zone_id, weights in self._repo.get_zone_rarity_weights().items()
+            }
+            with self._lock:
+                if version == self._loot_version:
+                    self._loot_tables = loot_tables
+        return loot_tables.get(zone_id)
+
+    def update_zone_rarity_weights(self, zone_id: int, weights: Dict[int, float]) -> None:
+        self._repo.update_zone_rarity_weights(zone_id, weights)
+        with self._lock:
+            self._loot_version += 1
+            self._loot_tables = None
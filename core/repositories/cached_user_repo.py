@@ -0,0 +1,163 @@
+import dataclasses
+import threading
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any
+
+from .abstract_repository import AbstractUserRepository
+from ..domain.models import User, USER_DELTA_FIELDS
+from ..database.connection_manager import DatabaseConnectionManager, write_operation
+from ..database.identity_map import load_through
+
+
+def _clone(user: User) -> User:
+    """复制一个用户对象，并以复制时的字段值作为脏字段判断的基准。"""
+    copied = dataclasses.replace(user)
+    copied.mark_clean()
+    return copied
+
+
+class CachedUserRepository(AbstractUserRepository):
+    """
+    用户数据的写穿透 LRU 缓存。
+
+    缓存中只保存已提交的用户状态，get_by_id 每次返回一个副本，各线程修改自己的副本互不影响。
+    update 先写入数据库，在事务提交后把同样的变更（计数字段按增量）应用到缓存条目上；
+    事务回滚时缓存保持不变。事务内的读取直接访问数据库，以读到本事务尚未提交的修改。
+    """
+
+    def __init__(self, repo: AbstractUserRepository, connection_manager: DatabaseConnectionManager,
+                 max_size: int = 1000):
+        """
+        Args:
+            repo: 实际读写数据库的用户仓储。
+            connection_manager: 共享的数据库连接管理器，用于在事务提交后更新缓存。
+            max_size: 最多缓存的用户数量，超出时淘汰最久未使用的用户。
+        """
+        self._repo = repo
+        self._connection_manager = connection_manager
+        self.max_size = max(1, int(max_size))
+
+        self._entries: "OrderedDict[str, User]" = OrderedDict()
+        # 正在从数据库加载的用户及进行中的加载数
+        self._loading: Dict[str, int] = {}
+        # 加载期间用户被写入的次数，若发生写入则放弃回填，避免缓存旧数据；只记录正在加载的用户
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_stats(self) -> Dict[str, int]:
+        """返回命中、未命中、淘汰次数与当前缓存数量。"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+            }
+
+    def invalidate(self, user_id: str) -> None:
+        """丢弃用户的缓存条目，其他进程修改了该用户后调用。"""
+        self._bump_version(user_id)
+
+    def get_by_id(self, user_id: str) -> Optional[User]:
+        # 指令会话内同一个用户只加载一次
+        return load_through("user", user_id, lambda: self._get_cached(user_id))
+
+    def _get_cached(self, user_id: str) -> Optional[User]:
+        if self._connection_manager.in_transaction():
+            return self._repo.get_by_id(user_id)
+
+        with self._lock:
+            cached = self._entries.get(user_id)
+            if cached is not None:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return _clone(cached)
+            self.misses += 1
+            self._loading[user_id] = self._loading.get(user_id, 0) + 1
+            version = self._versions.get(user_id, 0)
+
+        user = None
+        try:
+            user = self._repo.get_by_id(user_id)
+        finally:
+            with self._lock:
+                if user is not None and self._versions.get(user_id, 0) == version:
+                    self._put(user_id, _clone(user))
+                self._finish_load(user_id)
+        return user
+
+    def _finish_load(self, user_id: str) -> None:
+        """结束一次加载，没有其他进行中的加载时不再记录该用户的写入次数。需在持有 _lock 时调用。"""
+        remaining = self._loading.pop(user_id) - 1
+        if remaining:
+            self._loading[user_id] = remaining
+        else:
+            self._versions.pop(user_id, None)
+
+    def _record_write(self, user_id: str) -> None:
+        """记录一次写入，使进行中的加载放弃回填。需在持有 _lock 时调用。"""
+        if user_id in self._loading:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def _put(self, user_id: str, user: User) -> None:
+        self._entries[user_id] = user
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def check_exists(self, user_id: str) -> bool:
+        with self._lock:
+            if user_id in self._entries:
+                return True
+        return self._repo.check_exists(user_id)
+
+    def add(self, user: User) -> None:
+        self._repo.add(user)
+        self._connection_manager.after_commit(lambda: self._bump_version(user.user_id))
+
+    @write_operation
+    def update(self, user: User) -> None:
+        changes = user.get_changes()
+        if changes == {}:
+            return
+        # 没有快照的对象会整行写回，缓存同样整体替换
+        replacement = _clone(user) if changes is None else None
+        with self._connection_manager.transaction():
+            self._repo.update(user)
+            self._connection_manager.after_commit(lambda: self._apply(user.user_id, changes, replacement))
+
+    def _bump_version(self, user_id: str) -> None:
+        with self._lock:
+            self._record_write(user_id)
+            self._entries.pop(user_id, None)
+
+    def _apply(self, user_id: str, changes: Optional[Dict[str, Any]], replacement: Optional[User]) -> None:
+        """把已提交的变更应用到缓存条目。"""
+        with self._lock:
+            self._record_write(user_id)
+            if replacement is not None:
+                if user_id in self._entries:
+                    self._entries[user_id] = replacement
+                return
+            cached = self._entries.get(user_id)
+            if cached is None:
+                return
+            for name, (original, current) in changes.items():
+                if name in USER_DELTA_FIELDS and original is not None and current is not None:
+                    setattr(cached, name, getattr(cached, name) + (current - original))
+                else:
+                    setattr(cached, name, current)
+
+    def get_all_user_ids(self, auto_fishing_only: bool = False) -> List[str]:
+        return self._repo.get_all_user_ids(auto_fishing_only)
+
+    def get_leaderboard_data(self, limit: int) -> List[Dict[str, Any]]:
+        return self._repo.get_leaderboard_data(limit)
+
+    def get_high_value_users(self, threshold: int) -> List[User]:
+        return self._repo.get_high_value_users(threshold)
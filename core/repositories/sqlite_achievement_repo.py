@@ -1,27 +1,21 @@
 import sqlite3
-import threading
 from typing import Optional, List
 from datetime import datetime
 
 # 导入抽象基类和领域模型
 from .abstract_repository import AbstractAchievementRepository, UserAchievementProgress
 from ..domain.models import Achievement
+from ..database.connection_manager import DatabaseConnectionManager, read_operation, write_operation
 
 class SqliteAchievementRepository(AbstractAchievementRepository):
     """成就数据仓储的SQLite实现"""
 
-    def __init__(self, db_path: str):
-        self.db_path = db_path
-        self._local = threading.local()
+    def __init__(self, connection_manager: DatabaseConnectionManager):
+        self._connection_manager = connection_manager
 
     def _get_connection(self) -> sqlite3.Connection:
-        conn = getattr(self._local, "connection", None)
-        if conn is None:
-            conn = sqlite3.connect(self.db_path, detect_types=sqlite3.PARSE_DECLTYPES)
-            conn.row_factory = sqlite3.Row
-            conn.execute("PRAGMA foreign_keys = ON;")
-            self._local.connection = conn
-        return conn
+        """获取当前线程共享的数据库连接。"""
+        return self._connection_manager.get_connection()
 
     def _row_to_achievement(self, row: sqlite3.Row) -> Optional[Achievement]:
         if not row:
@@ -30,12 +24,14 @@ class SqliteAchievementRepository(AbstractAchievementRepository):
         data["is_repeatable"] = bool(data.get("is_repeatable", 0))
         return Achievement(**data)
 
+    @read_operation
     def get_all_achievements(self) -> List[Achievement]:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM achievements ORDER BY achievement_id")
             return [self._row_to_achievement(row) for row in cursor.fetchall()]
 
+    @read_operation
     def get_user_progress(self, user_id: str) -> UserAchievementProgress:
         """获取指定用户的所有成就进度"""
         with self._get_connection() as conn:
@@ -55,6 +51,7 @@ class SqliteAchievementRepository(AbstractAchievementRepository):
                 }
             return progress
 
+    @write_operation
     def update_user_progress(self, user_id: str, achievement_id: int, progress: int,
                              completed_at: Optional[datetime]) -> None:
         with self._get_connection() as conn:
@@ -86,6 +83,7 @@ class SqliteAchievementRepository(AbstractAchievementRepository):
 
             conn.commit()
 
+    @write_operation
     def grant_title_to_user(self, user_id: str, title_id: int) -> None:
         with self._get_connection() as conn:
             cursor = conn.cursor()
@@ -94,6 +92,7 @@ class SqliteAchievementRepository(AbstractAchievementRepository):
 
     # --- 新增的成就检查方法实现 ---
 
+    @read_operation
     def get_user_unique_fish_count(self, user_id: str) -> int:
         with self._get_connection() as conn:
             cursor = conn.cursor()
@@ -101,6 +100,7 @@ class SqliteAchievementRepository(AbstractAchievementRepository):
             result = cursor.fetchone()
             return result[0] if result else 0
 
+    @read_operation
     def get_user_garbage_count(self, user_id: str) -> int:
         with self._get_connection() as conn:
             cursor = conn.cursor()
@@ -113,18 +113,26 @@ class SqliteAchievementRepository(AbstractAchievementRepository):
             result = cursor.fetchone()
             return result[0] if result and result[0] is not None else 0
 
+    @read_operation
     def has_caught_heavy_fish(self, user_id: str, weight: int) -> bool:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT 1 FROM fishing_records WHERE user_id = ? AND weight >= ? LIMIT 1", (user_id, weight))
+            if cursor.fetchone() is not None:
+                return True
+            # 自动钓鱼只保留每小时汇总，汇总中记录了最大重量
+            cursor.execute("SELECT 1 FROM auto_fishing_digest WHERE user_id = ? AND max_weight >= ? LIMIT 1",
+                           (user_id, weight))
             return cursor.fetchone() is not None
 
+    @read_operation
     def has_wipe_bomb_multiplier(self, user_id: str, multiplier: float) -> bool:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT 1 FROM wipe_bomb_log WHERE user_id = ? AND reward_multiplier >= ? LIMIT 1", (user_id, multiplier))
             return cursor.fetchone() is not None
 
+    @read_operation
     def has_item_of_rarity(self, user_id: str, item_type: str, rarity: int) -> bool:
         query = ""
         if item_type == "rod":
@@ -1,28 +1,20 @@
 import sqlite3
-import threading
 from typing import Optional, List, Dict, Any
 
 # 导入抽象基类和领域模型
 from .abstract_repository import AbstractGachaRepository
 from ..domain.models import GachaPool, GachaPoolItem
+from ..database.connection_manager import DatabaseConnectionManager, read_operation, write_operation
 
 class SqliteGachaRepository(AbstractGachaRepository):
     """抽卡仓储的SQLite实现"""
 
-    def __init__(self, db_path: str):
-        self.db_path = db_path
-        self._local = threading.local()
+    def __init__(self, connection_manager: DatabaseConnectionManager):
+        self._connection_manager = connection_manager
 
     def _get_connection(self) -> sqlite3.Connection:
-        """获取一个线程安全的数据库连接。"""
-        conn = getattr(self._local, "connection", None)
-        if conn is None:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            # 开启外键约束，确保奖池删除时，其下的物品也被删除
-            conn.execute("PRAGMA foreign_keys = ON;")
-            self._local.connection = conn
-        return conn
+        """获取当前线程共享的数据库连接。"""
+        return self._connection_manager.get_connection()
 
     # --- 私有映射辅助方法 ---
     def _row_to_gacha_pool(self, row: sqlite3.Row) -> Optional[GachaPool]:
@@ -36,6 +28,7 @@ class SqliteGachaRepository(AbstractGachaRepository):
         return GachaPoolItem(**row)
 
     # --- Gacha Read Methods ---
+    @read_operation
     def get_pool_by_id(self, pool_id: int) -> Optional[GachaPool]:
         with self._get_connection() as conn:
             cursor = conn.cursor()
@@ -48,6 +41,7 @@ class SqliteGachaRepository(AbstractGachaRepository):
             pool.items = self.get_pool_items(pool_id) # 填充奖池物品
             return pool
 
+    @read_operation
     def get_pool_items(self, pool_id: int) -> List[GachaPoolItem]:
         with self._get_connection() as conn:
             cursor = conn.cursor()
@@ -82,6 +76,7 @@ class SqliteGachaRepository(AbstractGachaRepository):
 
             return items
 
+    @read_operation
     def get_all_pools(self) -> List[GachaPool]:
         with self._get_connection() as conn:
             cursor = conn.cursor()
@@ -101,6 +96,7 @@ class SqliteGachaRepository(AbstractGachaRepository):
     # --- Admin Panel CRUD Methods ---
 
     # Pool CRUD
+    @write_operation
     def add_pool_template(self, data: Dict[str, Any]) -> None:
         """后台添加一个新抽卡池"""
         with self._get_connection() as conn:
@@ -116,6 +112,7 @@ class SqliteGachaRepository(AbstractGachaRepository):
             })
             conn.commit()
 
+    @write_operation
     def update_pool_template(self, pool_id: int, data: Dict[str, Any]) -> None:
         """后台更新一个抽卡池的信息"""
         data["gacha_pool_id"] = pool_id
@@ -137,6 +134,7 @@ class SqliteGachaRepository(AbstractGachaRepository):
             })
             conn.commit()
 
+    @write_operation
     def delete_pool_template(self, pool_id: int) -> None:
         """后台删除一个抽卡池（其下的物品也会被级联删除）"""
         with self._get_connection() as conn:
@@ -145,6 +143,7 @@ class SqliteGachaRepository(AbstractGachaRepository):
             conn.commit()
 
     # Pool Item CRUD
+    @write_operation
     def add_item_to_pool(self, pool_id: int, data: Dict[str, Any]) -> None:
         """后台向抽卡池添加一个物品"""
         item_full_id = data.get("item_full_id", "").split("-")
@@ -166,6 +165,7 @@ class SqliteGachaRepository(AbstractGachaRepository):
             ))
             conn.commit()
 
+    @write_operation
     def update_pool_item(self, item_pool_id: int, data: Dict[str, Any]) -> None:
         """后台更新一个抽卡池物品的信息"""
         item_full_id = data.get("item_full_id", "").split("-")
@@ -188,6 +188,7 @@ class SqliteGachaRepository(AbstractGachaRepository):
             ))
             conn.commit()
 
+    @write_operation
     def delete_pool_item(self, item_pool_id: int) -> None:
         """后台删除一个抽卡池物品"""
         with self._get_connection() as conn:
@@ -1,29 +1,54 @@
 import sqlite3
-import threading
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
 from datetime import datetime
 
 # 导入抽象基类和领域模型
 from .abstract_repository import AbstractInventoryRepository
 from ..domain.models import UserFishInventoryItem, UserRodInstance, UserAccessoryInstance, FishingZone
+from ..database.connection_manager import DatabaseConnectionManager, read_operation, write_operation
+from ..database.identity_map import current_identity_map, MISSING
 
 
 class SqliteInventoryRepository(AbstractInventoryRepository):
     """用户库存仓储的SQLite实现"""
 
-    def __init__(self, db_path: str):
-        self.db_path = db_path
-        self._local = threading.local()
+    def __init__(self, connection_manager: DatabaseConnectionManager):
+        self._connection_manager = connection_manager
 
     def _get_connection(self) -> sqlite3.Connection:
-        """获取一个线程安全的数据库连接。"""
-        conn = getattr(self._local, "connection", None)
-        if conn is None:
-            conn = sqlite3.connect(self.db_path, detect_types=sqlite3.PARSE_DECLTYPES)
-            conn.row_factory = sqlite3.Row
-            conn.execute("PRAGMA foreign_keys = ON;")
-            self._local.connection = conn
-        return conn
+        """获取当前线程共享的数据库连接。"""
+        return self._connection_manager.get_connection()
+
+    # --- 指令会话身份映射辅助方法 ---
+    def _get_cached_instance(self, kind: str, user_id: str, loader, *args):
+        """
+        在指令会话中复用已加载的鱼竿/饰品实例。
+        kind 以 "equipped_" 开头时按用户ID登记，否则按 (用户ID, 实例ID) 登记。
+        """
+        identity_map = current_identity_map()
+        key = user_id if kind.startswith("equipped_") else (user_id, *args)
+        if identity_map is not None:
+            instance = identity_map.get(kind, key)
+            if instance is not MISSING:
+                return instance
+        instance = loader(user_id, *args)
+        if identity_map is not None:
+            identity_map.put(kind, key, instance)
+            # 装备中的实例同时按实例ID登记，后续按ID查询时直接命中
+            if kind == "equipped_rod" and instance is not None:
+                identity_map.put("rod", (user_id, instance.rod_instance_id), instance)
+            elif kind == "equipped_accessory" and instance is not None:
+                identity_map.put("accessory", (user_id, instance.accessory_instance_id), instance)
+        return instance
+
+    # 单条 IN (...) 查询的最大参数个数，低于 SQLite 的默认上限
+    _MAX_IN_PARAMS = 500
+
+    def _forget_instances(self) -> None:
+        """鱼竿或饰品实例发生变化后，丢弃当前会话中缓存的实例。"""
+        identity_map = current_identity_map()
+        if identity_map is not None:
+            identity_map.discard_kinds("rod", "equipped_rod", "accessory", "equipped_accessory")
 
     # --- 私有映射辅助方法 ---
     def _row_to_fish_item(self, row: sqlite3.Row) -> Optional[UserFishInventoryItem]:
@@ -42,12 +67,14 @@ class SqliteInventoryRepository(AbstractInventoryRepository):
         return UserAccessoryInstance(**row)
 
     # --- Fish Inventory Methods ---
+    @read_operation
     def get_fish_inventory(self, user_id: str) -> List[UserFishInventoryItem]:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT user_id, fish_id, quantity FROM user_fish_inventory WHERE user_id = ? AND quantity > 0", (user_id,))
             return [self._row_to_fish_item(row) for row in cursor.fetchall()]
 
+    @read_operation
     def get_fish_inventory_value(self, user_id: str, rarity: Optional[int] = None) -> int:
         query = """
             SELECT SUM(f.base_value * ufi.quantity)
@@ -66,6 +93,7 @@ class SqliteInventoryRepository(AbstractInventoryRepository):
             result = cursor.fetchone()
             return result[0] if result and result[0] is not None else 0
 
+    @write_operation
     def add_fish_to_inventory(self, user_id: str, fish_id: int, quantity: int = 1) -> None:
         with self._get_connection() as conn:
             cursor = conn.cursor()
@@ -76,6 +104,81 @@ class SqliteInventoryRepository(AbstractInventoryRepository):
             """, (user_id, fish_id, quantity))
             conn.commit()
 
+    @write_operation
+    def add_fish_to_inventory_bulk(self, items: List[Tuple[str, int, int]]) -> None:
+        if not items:
+            return
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT INTO user_fish_inventory (user_id, fish_id, quantity)
+                VALUES (?, ?, ?)
+                ON CONFLICT(user_id, fish_id) DO UPDATE SET quantity = quantity + excluded.quantity
+            """, items)
+            conn.commit()
+
+    @read_operation
+    def get_fish_pond_count(self, user_id: str) -> int:
+        # 计数由 user_fish_inventory 上的触发器维护
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT fish_count FROM user_fish_pond_counts WHERE user_id = ?", (user_id,))
+            row = cursor.fetchone()
+            return row["fish_count"] if row else 0
+
+    @read_operation
+    def get_fish_pond_counts(self, user_ids: List[str]) -> Dict[str, int]:
+        unique_ids = list(dict.fromkeys(user_ids))
+        counts = {user_id: 0 for user_id in unique_ids}
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            for start in range(0, len(unique_ids), self._MAX_IN_PARAMS):
+                chunk = unique_ids[start:start + self._MAX_IN_PARAMS]
+                placeholders = ", ".join("?" for _ in chunk)
+                cursor.execute(f"""
+                    SELECT user_id, fish_count FROM user_fish_pond_counts
+                    WHERE user_id IN ({placeholders})
+                """, chunk)
+                for row in cursor.fetchall():
+                    counts[row["user_id"]] = row["fish_count"]
+        return counts
+
+    @write_operation
+    def remove_random_fish(self, user_id: str) -> Optional[int]:
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            # 在 [0, 鱼的总数) 中取一个随机位置，找到累计数量首次超过该位置的鱼，
+            # 每种鱼被选中的概率与其数量成正比
+            cursor.execute("""
+                SELECT fish_id FROM (
+                    SELECT fish_id, SUM(quantity) OVER (ORDER BY fish_id) AS running_total
+                    FROM user_fish_inventory
+                    WHERE user_id = ? AND quantity > 0
+                )
+                WHERE running_total > (
+                    SELECT (RANDOM() & 9223372036854775807) % fish_count
+                    FROM user_fish_pond_counts
+                    WHERE user_id = ? AND fish_count > 0
+                )
+                ORDER BY running_total
+                LIMIT 1
+            """, (user_id, user_id))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            fish_id = row["fish_id"]
+            cursor.execute("""
+                UPDATE user_fish_inventory SET quantity = quantity - 1
+                WHERE user_id = ? AND fish_id = ?
+            """, (user_id, fish_id))
+            cursor.execute("""
+                DELETE FROM user_fish_inventory
+                WHERE user_id = ? AND fish_id = ? AND quantity <= 0
+            """, (user_id, fish_id))
+            conn.commit()
+            return fish_id
+
+    @write_operation
     def clear_fish_inventory(self, user_id: str, rarity: Optional[int] = None) -> None:
         with self._get_connection() as conn:
             cursor = conn.cursor()
@@ -90,6 +193,7 @@ class SqliteInventoryRepository(AbstractInventoryRepository):
                 """, (user_id, rarity))
             conn.commit()
 
+    @write_operation
     def sell_fish_keep_one(self, user_id: str) -> int:
         """
         执行“保留一条”的卖出数据库操作。
@@ -97,43 +201,39 @@ class SqliteInventoryRepository(AbstractInventoryRepository):
         注意：此操作应在一个事务中完成，以保证数据一致性。
         """
         sold_value = 0
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("BEGIN TRANSACTION")
-            try:
-                # 查询所有数量大于1的鱼及其价值
-                cursor.execute("""
-                    SELECT ufi.fish_id, ufi.quantity, f.base_value, f.name
-                    FROM user_fish_inventory ufi
-                    JOIN fish f ON ufi.fish_id = f.fish_id
-                    WHERE ufi.user_id = ? AND ufi.quantity > 1
-                """, (user_id,))
-
-                items_to_sell = cursor.fetchall()
+        with self._connection_manager.transaction():
+            cursor = self._get_connection().cursor()
+            # 查询所有数量大于1的鱼及其价值
+            cursor.execute("""
+                SELECT ufi.fish_id, ufi.quantity, f.base_value, f.name
+                FROM user_fish_inventory ufi
+                JOIN fish f ON ufi.fish_id = f.fish_id
+                WHERE ufi.user_id = ? AND ufi.quantity > 1
+            """, (user_id,))
 
-                if not items_to_sell:
-                    conn.rollback()
-                    return 0
+            items_to_sell = cursor.fetchall()
 
-                for item in items_to_sell:
-                    sell_qty = item["quantity"] - 1
-                    sold_value += sell_qty * item["base_value"]
+            if not items_to_sell:
+                return 0
 
-                # 将所有数量大于1的鱼更新为1
-                cursor.execute("""
-                    UPDATE user_fish_inventory
-                    SET quantity = 1
-                    WHERE user_id = ? AND quantity > 1
-                """, (user_id,))
+            for item in items_to_sell:
+                sell_qty = item["quantity"] - 1
+                sold_value += sell_qty * item["base_value"]
 
-                conn.commit()
-            except sqlite3.Error:
-                conn.rollback()
-                raise # 向上抛出异常，让服务层处理
+            # 将所有数量大于1的鱼更新为1
+            cursor.execute("""
+                UPDATE user_fish_inventory
+                SET quantity = 1
+                WHERE user_id = ? AND quantity > 1
+            """, (user_id,))
         return sold_value
 
     def get_user_equipped_rod(self, user_id: str) -> Optional[UserRodInstance]:
         """获取用户当前装备的钓竿实例"""
+        return self._get_cached_instance("equipped_rod", user_id, self._load_equipped_rod)
+
+    @read_operation
+    def _load_equipped_rod(self, user_id: str) -> Optional[UserRodInstance]:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
@@ -145,6 +245,10 @@ class SqliteInventoryRepository(AbstractInventoryRepository):
 
     def get_user_rod_instance_by_id(self, user_id: str, rod_instance_id: int) -> Optional[UserRodInstance]:
         """根据用户ID和钓竿实例ID获取特定的钓竿实例"""
+        return self._get_cached_instance("rod", user_id, self._load_rod_instance, rod_instance_id)
+
+    @read_operation
+    def _load_rod_instance(self, user_id: str, rod_instance_id: int) -> Optional[UserRodInstance]:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
@@ -154,8 +258,10 @@ class SqliteInventoryRepository(AbstractInventoryRepository):
             row = cursor.fetchone()
             return self._row_to_rod_instance(row) if row else None
 
+    @write_operation
     def clear_user_rod_instances(self, user_id: str) -> None:
         """清空用户的所有未装备的钓竿实例"""
+        self._forget_instances()
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
@@ -164,8 +270,10 @@ class SqliteInventoryRepository(AbstractInventoryRepository):
             """, (user_id,))
             conn.commit()
 
+    @write_operation
     def clear_user_accessory_instances(self, user_id: str) -> None:
         """清空用户的所有未装备的配件实例"""
+        self._forget_instances()
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
@@ -176,6 +284,10 @@ class SqliteInventoryRepository(AbstractInventoryRepository):
 
     def get_user_accessory_instance_by_id(self, user_id: str, accessory_instance_id: int) -> Optional[UserAccessoryInstance]:
         """根据用户ID和配件实例ID获取特定的配件实例"""
+        return self._get_cached_instance("accessory", user_id, self._load_accessory_instance, accessory_instance_id)
+
+    @read_operation
+    def _load_accessory_instance(self, user_id: str, accessory_instance_id: int) -> Optional[UserAccessoryInstance]:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
@@ -187,6 +299,10 @@ class SqliteInventoryRepository(AbstractInventoryRepository):
 
     def get_user_equipped_accessory(self, user_id: str) -> Optional[UserAccessoryInstance]:
         """获取用户当前装备的配件实例"""
+        return self._get_cached_instance("equipped_accessory", user_id, self._load_equipped_accessory)
+
+    @read_operation
+    def _load_equipped_accessory(self, user_id: str) -> Optional[UserAccessoryInstance]:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
@@ -196,10 +312,12 @@ class SqliteInventoryRepository(AbstractInventoryRepository):
             row = cursor.fetchone()
             return self._row_to_accessory_instance(row) if row else None
 
+    @write_operation
     def set_equipment_status(self, user_id: str, rod_instance_id: Optional[int] = None, accessory_instance_id: Optional[int] = None) -> None:
         """
         设置用户的装备状态。
         """
+        self._forget_instances()
         with self._get_connection() as conn:
             cursor = conn.cursor()
             # 重置所有装备状态
@@ -223,6 +341,7 @@ class SqliteInventoryRepository(AbstractInventoryRepository):
             conn.commit()
 
 
+    @read_operation
     def get_user_disposable_baits(self, user_id: str) -> List[int]:
         """
         获取用户的可用诱饵列表。
@@ -236,6 +355,7 @@ class SqliteInventoryRepository(AbstractInventoryRepository):
             """, (user_id,))
             return [row["bait_id"] for row in cursor.fetchall()]
 
+    @read_operation
     def get_user_titles(self, user_id: str) -> List[int]:
         """
         获取用户拥有的称号列表。
@@ -249,6 +369,7 @@ class SqliteInventoryRepository(AbstractInventoryRepository):
             """, (user_id,))
             return [row["title_id"] for row in cursor.fetchall()]
 
+    @read_operation
     def get_random_bait(self, user_id: str) -> Optional[int]:
         """
         从用户的诱饵库存中随机获取一个可用的诱饵ID。
@@ -265,12 +386,14 @@ class SqliteInventoryRepository(AbstractInventoryRepository):
             return row["bait_id"] if row else None
 
     # --- Bait Inventory Methods ---
+    @read_operation
     def get_user_bait_inventory(self, user_id: str) -> Dict[int, int]:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT bait_id, quantity FROM user_bait_inventory WHERE user_id = ?", (user_id,))
             return {row["bait_id"]: row["quantity"] for row in cursor.fetchall()}
 
+    @write_operation
     def update_bait_quantity(self, user_id: str, bait_id: int, delta: int) -> None:
         """更新用户诱饵库存中特定诱饵的数量（可增可减），并确保数量不小于0。"""
         with self._get_connection() as conn:
@@ -284,14 +407,36 @@ class SqliteInventoryRepository(AbstractInventoryRepository):
             cursor.execute("DELETE FROM user_bait_inventory WHERE user_id = ? AND quantity <= 0", (user_id,))
             conn.commit()
 
+    @write_operation
+    def consume_bait(self, user_id: str, bait_id: int) -> Optional[int]:
+        """按主键扣减一个鱼饵，只在用完时删除这一行。"""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE user_bait_inventory SET quantity = quantity - 1
+                WHERE user_id = ? AND bait_id = ? AND quantity > 0
+            """, (user_id, bait_id))
+            if cursor.rowcount == 0:
+                return None
+            cursor.execute(
+                "SELECT quantity FROM user_bait_inventory WHERE user_id = ? AND bait_id = ?", (user_id, bait_id)
+            )
+            remaining = cursor.fetchone()["quantity"]
+            if remaining <= 0:
+                cursor.execute("DELETE FROM user_bait_inventory WHERE user_id = ? AND bait_id = ?", (user_id, bait_id))
+            conn.commit()
+            return remaining
+
 
     # --- Rod Inventory Methods ---
+    @read_operation
     def get_user_rod_instances(self, user_id: str) -> List[UserRodInstance]:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM user_rods WHERE user_id = ?", (user_id,))
             return [self._row_to_rod_instance(row) for row in cursor.fetchall()]
 
+    @write_operation
     def add_rod_instance(self, user_id: str, rod_id: int, durability: Optional[int]) -> UserRodInstance:
         with self._get_connection() as conn:
             cursor = conn.cursor()
@@ -307,19 +452,23 @@ class SqliteInventoryRepository(AbstractInventoryRepository):
                 is_equipped=False, obtained_at=now, current_durability=durability
             )
 
+    @write_operation
     def delete_rod_instance(self, rod_instance_id: int) -> None:
+        self._forget_instances()
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM user_rods WHERE rod_instance_id = ?", (rod_instance_id,))
             conn.commit()
 
     # --- Accessory Inventory Methods ---
+    @read_operation
     def get_user_accessory_instances(self, user_id: str) -> List[UserAccessoryInstance]:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM user_accessories WHERE user_id = ?", (user_id,))
             return [self._row_to_accessory_instance(row) for row in cursor.fetchall()]
 
+    @write_operation
     def add_accessory_instance(self, user_id: str, accessory_id: int) -> UserAccessoryInstance:
         with self._get_connection() as conn:
             cursor = conn.cursor()
@@ -335,12 +484,15 @@ class SqliteInventoryRepository(AbstractInventoryRepository):
                 is_equipped=False, obtained_at=now
             )
 
+    @write_operation
     def delete_accessory_instance(self, accessory_instance_id: int) -> None:
+        self._forget_instances()
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM user_accessories WHERE accessory_instance_id = ?", (accessory_instance_id,))
             conn.commit()
 
+    @write_operation
     def update_fish_quantity(self, user_id: str, fish_id: int, delta: int) -> None:
         """更新用户鱼类库存中特定鱼的数量（可增可减），并确保数量不小于0。"""
         with self._get_connection() as conn:
@@ -353,6 +505,7 @@ class SqliteInventoryRepository(AbstractInventoryRepository):
             # 删除数量为0的行，保持数据整洁
             cursor.execute("DELETE FROM user_fish_inventory WHERE user_id = ? AND quantity <= 0", (user_id,))
             conn.commit()
+    @read_operation
     def get_zone_by_id(self, zone_id: int) -> FishingZone:
         """根据ID获取钓鱼区域信息"""
         with self._get_connection() as conn:
@@ -363,20 +516,82 @@ class SqliteInventoryRepository(AbstractInventoryRepository):
                 return FishingZone(**row)
             else:
                 raise ValueError(f"钓鱼区域ID {zone_id} 不存在。")
+    @write_operation
     def update_fishing_zone(self, zone: FishingZone) -> None:
         """更新钓鱼区域信息"""
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 UPDATE fishing_zones
-                SET name = ?, description = ?, daily_rare_fish_quota = ?, rare_fish_caught_today = ?
+                SET name = ?, description = ?, daily_rare_fish_quota = ?, rare_fish_caught_today = ?,
+                    extra_fishing_cost = ?
                 WHERE id = ?
-            """, (zone.name, zone.description, zone.daily_rare_fish_quota, zone.rare_fish_caught_today, zone.id))
+            """, (zone.name, zone.description, zone.daily_rare_fish_quota, zone.rare_fish_caught_today,
+                  zone.extra_fishing_cost, zone.id))
             conn.commit()
 
+    @write_operation
+    def update_rare_fish_counts(self, counts: Dict[int, int]) -> None:
+        """只写回稀有鱼计数，不覆盖区域的其他字段"""
+        if not counts:
+            return
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                "UPDATE fishing_zones SET rare_fish_caught_today = ? WHERE id = ?",
+                [(count, zone_id) for zone_id, count in counts.items()]
+            )
+            conn.commit()
+
+    @write_operation
+    def add_rare_fish_counts(self, deltas: Dict[int, int]) -> None:
+        """在数据库当前计数上累加，不覆盖期间被后台修改的计数"""
+        if not deltas:
+            return
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                "UPDATE fishing_zones SET rare_fish_caught_today = MAX(0, rare_fish_caught_today + ?) WHERE id = ?",
+                [(delta, zone_id) for zone_id, delta in deltas.items()]
+            )
+            conn.commit()
+
+    @write_operation
+    def try_increment_rare_fish_count(self, zone_id: int) -> Optional[int]:
+        """在数据库中原子地占用一个稀有鱼名额，多个进程共享配额时使用"""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE fishing_zones SET rare_fish_caught_today = rare_fish_caught_today + 1
+                WHERE id = ? AND rare_fish_caught_today < daily_rare_fish_quota
+            """, (zone_id,))
+            if cursor.rowcount == 0:
+                return None
+            cursor.execute("SELECT rare_fish_caught_today FROM fishing_zones WHERE id = ?", (zone_id,))
+            row = cursor.fetchone()
+            conn.commit()
+            return row[0] if row else None
+
+    @read_operation
     def get_all_fishing_zones(self) -> List[FishingZone]:
         """获取所有钓鱼区域信息"""
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM fishing_zones")
             return [FishingZone(**row) for row in cursor.fetchall()]
+
+    @write_operation
+    def add_fishing_zone(self, zone: FishingZone) -> None:
+        """添加钓鱼区域"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    INSERT INTO fishing_zones (id, name, description, daily_rare_fish_quota, rare_fish_caught_today,
+                                               extra_fishing_cost)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (zone.id, zone.name, zone.description, zone.daily_rare_fish_quota, zone.rare_fish_caught_today,
+                      zone.extra_fishing_cost))
+                conn.commit()
+        except sqlite3.IntegrityError as e:
+            raise ValueError(f"钓鱼区域ID {zone.id} 已存在。") from e
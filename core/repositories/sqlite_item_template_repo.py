@@ -1,26 +1,34 @@
 import sqlite3
-import threading
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterable, Callable
 
 # 导入抽象基类和领域模型
 from .abstract_repository import AbstractItemTemplateRepository
 from ..domain.models import Fish, Rod, Bait, Accessory, Title
+from ..domain.fish_catalog import FishCatalog
+from ..domain.zone_loot import ZoneLootTable
+from ..database.connection_manager import DatabaseConnectionManager, read_operation, write_operation
+
+# 引用各类模板的玩家数据；外键启用后删除模板会级联删除这些数据（钓鱼记录则拒绝删除）
+_TEMPLATE_REFERENCE_QUERIES: Dict[str, List[str]] = {
+    "fish": [
+        "SELECT COUNT(*) FROM user_fish_inventory WHERE fish_id = ? AND quantity > 0",
+        "SELECT COUNT(*) FROM fishing_records WHERE fish_id = ?",
+        "SELECT COUNT(*) FROM auto_fishing_digest_fish WHERE fish_id = ?",
+    ],
+    "rod": ["SELECT COUNT(*) FROM user_rods WHERE rod_id = ?"],
+    "bait": ["SELECT COUNT(*) FROM user_bait_inventory WHERE bait_id = ? AND quantity > 0"],
+    "accessory": ["SELECT COUNT(*) FROM user_accessories WHERE accessory_id = ?"],
+}
 
 class SqliteItemTemplateRepository(AbstractItemTemplateRepository):
     """物品模板仓储的SQLite实现"""
 
-    def __init__(self, db_path: str):
-        self.db_path = db_path
-        self._local = threading.local()
+    def __init__(self, connection_manager: DatabaseConnectionManager):
+        self._connection_manager = connection_manager
 
     def _get_connection(self) -> sqlite3.Connection:
-        """获取一个线程安全的数据库连接。"""
-        conn = getattr(self._local, "connection", None)
-        if conn is None:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            self._local.connection = conn
-        return conn
+        """获取当前线程共享的数据库连接。"""
+        return self._connection_manager.get_connection()
 
     # --- 私有映射辅助方法 ---
     def _row_to_fish(self, row: sqlite3.Row) -> Optional[Fish]:
@@ -48,19 +56,42 @@ class SqliteItemTemplateRepository(AbstractItemTemplateRepository):
             return None
         return Title(**row)
 
+    # SQLite 单条语句的参数个数有上限，批量查询按此大小分段
+    _MAX_IN_PARAMS = 500
+
+    def _get_by_ids(self, table: str, id_column: str, ids: Iterable[int],
+                    mapper: Callable[[sqlite3.Row], Any]) -> Dict[int, Any]:
+        """用 IN (...) 查询批量获取模板，返回以ID为键的字典。"""
+        unique_ids = list(dict.fromkeys(ids))
+        result = {}
+        if not unique_ids:
+            return result
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            for start in range(0, len(unique_ids), self._MAX_IN_PARAMS):
+                chunk = unique_ids[start:start + self._MAX_IN_PARAMS]
+                placeholders = ", ".join("?" for _ in chunk)
+                cursor.execute(f"SELECT * FROM {table} WHERE {id_column} IN ({placeholders})", chunk)
+                for row in cursor.fetchall():
+                    result[row[id_column]] = mapper(row)
+        return result
+
     # --- Fish Read Methods ---
+    @read_operation
     def get_fish_by_id(self, fish_id: int) -> Optional[Fish]:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM fish WHERE fish_id = ?", (fish_id,))
             return self._row_to_fish(cursor.fetchone())
 
+    @read_operation
     def get_all_fish(self) -> List[Fish]:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM fish ORDER BY rarity DESC, base_value DESC")
             return [self._row_to_fish(row) for row in cursor.fetchall()]
 
+    @read_operation
     def get_random_fish(self) -> Optional[Fish]:
         with self._get_connection() as conn:
             cursor = conn.cursor()
@@ -68,69 +99,103 @@ class SqliteItemTemplateRepository(AbstractItemTemplateRepository):
             row = cursor.fetchone()
             return self._row_to_fish(row) if row else None
 
+    @read_operation
     def get_fishes_by_rarity(self, rarity: int) -> List[Fish]:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM fish WHERE rarity = ?", (rarity,))
             return [self._row_to_fish(row) for row in cursor.fetchall()]
 
+    @read_operation
+    def get_fishes_by_ids(self, fish_ids: List[int]) -> Dict[int, Fish]:
+        return self._get_by_ids("fish", "fish_id", fish_ids, self._row_to_fish)
+
+    def get_fish_catalog(self) -> FishCatalog:
+        # 未经缓存时每次都重新构建
+        return FishCatalog(self.get_all_fish())
+
     # --- Rod Read Methods ---
+    @read_operation
     def get_rod_by_id(self, rod_id: int) -> Optional[Rod]:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM rods WHERE rod_id = ?", (rod_id,))
             return self._row_to_rod(cursor.fetchone())
 
+    @read_operation
     def get_all_rods(self) -> List[Rod]:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM rods ORDER BY rarity DESC")
             return [self._row_to_rod(row) for row in cursor.fetchall()]
 
+    @read_operation
+    def get_rods_by_ids(self, rod_ids: List[int]) -> Dict[int, Rod]:
+        return self._get_by_ids("rods", "rod_id", rod_ids, self._row_to_rod)
+
     # --- Bait Read Methods ---
+    @read_operation
     def get_bait_by_id(self, bait_id: int) -> Optional[Bait]:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM baits WHERE bait_id = ?", (bait_id,))
             return self._row_to_bait(cursor.fetchone())
 
+    @read_operation
     def get_all_baits(self) -> List[Bait]:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM baits ORDER BY rarity DESC")
             return [self._row_to_bait(row) for row in cursor.fetchall()]
 
+    @read_operation
+    def get_baits_by_ids(self, bait_ids: List[int]) -> Dict[int, Bait]:
+        return self._get_by_ids("baits", "bait_id", bait_ids, self._row_to_bait)
+
     # --- Accessory Read Methods ---
+    @read_operation
     def get_accessory_by_id(self, accessory_id: int) -> Optional[Accessory]:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM accessories WHERE accessory_id = ?", (accessory_id,))
             return self._row_to_accessory(cursor.fetchone())
 
+    @read_operation
     def get_all_accessories(self) -> List[Accessory]:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM accessories ORDER BY rarity DESC")
             return [self._row_to_accessory(row) for row in cursor.fetchall()]
 
+    @read_operation
+    def get_accessories_by_ids(self, accessory_ids: List[int]) -> Dict[int, Accessory]:
+        return self._get_by_ids("accessories", "accessory_id", accessory_ids, self._row_to_accessory)
+
     # --- Title Read Methods ---
+    @read_operation
     def get_title_by_id(self, title_id: int) -> Optional[Title]:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM titles WHERE title_id = ?", (title_id,))
             return self._row_to_title(cursor.fetchone())
 
+    @read_operation
     def get_all_titles(self) -> List[Title]:
         with self._get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT * FROM titles ORDER BY rarity DESC")
+            cursor.execute("SELECT * FROM titles ORDER BY title_id")
             return [self._row_to_title(row) for row in cursor.fetchall()]
 
+    @read_operation
+    def get_titles_by_ids(self, title_ids: List[int]) -> Dict[int, Title]:
+        return self._get_by_ids("titles", "title_id", title_ids, self._row_to_title)
+
     # ==========================================================
     # Admin Panel CRUD Methods
     # ==========================================================
 
     # --- Fish Admin CRUD ---
+    @write_operation
     def add_fish_template(self, data: Dict[str, Any]) -> None:
         with self._get_connection() as conn:
             cursor = conn.cursor()
@@ -140,6 +205,7 @@ class SqliteItemTemplateRepository(AbstractItemTemplateRepository):
             """, {**data, "icon_url": data.get("icon_url")})
             conn.commit()
 
+    @write_operation
     def update_fish_template(self, fish_id: int, data: Dict[str, Any]) -> None:
         data["fish_id"] = fish_id
         with self._get_connection() as conn:
@@ -153,13 +219,19 @@ class SqliteItemTemplateRepository(AbstractItemTemplateRepository):
             """, {**data, "icon_url": data.get("icon_url")})
             conn.commit()
 
+    @write_operation
     def delete_fish_template(self, fish_id: int) -> None:
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM fish WHERE fish_id = ?", (fish_id,))
-            conn.commit()
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM fish WHERE fish_id = ?", (fish_id,))
+                conn.commit()
+        except sqlite3.IntegrityError as e:
+            # fishing_records 等表对鱼类的外键为 RESTRICT
+            raise ValueError(f"鱼类ID {fish_id} 仍被钓鱼记录引用，无法删除。") from e
 
     # --- Rod Admin CRUD ---
+    @write_operation
     def add_rod_template(self, data: Dict[str, Any]) -> None:
         with self._get_connection() as conn:
             cursor = conn.cursor()
@@ -173,6 +245,7 @@ class SqliteItemTemplateRepository(AbstractItemTemplateRepository):
             """, {**data, "purchase_cost": data.get("purchase_cost") or None, "durability": data.get("durability") or None, "icon_url": data.get("icon_url")})
             conn.commit()
 
+    @write_operation
     def update_rod_template(self, rod_id: int, data: Dict[str, Any]) -> None:
         data["rod_id"] = rod_id
         with self._get_connection() as conn:
@@ -188,6 +261,7 @@ class SqliteItemTemplateRepository(AbstractItemTemplateRepository):
             """, {**data, "purchase_cost": data.get("purchase_cost") or None, "durability": data.get("durability") or None, "icon_url": data.get("icon_url")})
             conn.commit()
 
+    @write_operation
     def delete_rod_template(self, rod_id: int) -> None:
         with self._get_connection() as conn:
             cursor = conn.cursor()
@@ -195,6 +269,7 @@ class SqliteItemTemplateRepository(AbstractItemTemplateRepository):
             conn.commit()
 
     # --- Bait Admin CRUD ---
+    @write_operation
     def add_bait_template(self, data: Dict[str, Any]) -> None:
         """后台添加一个新鱼饵，包含所有结构化效果字段"""
         with self._get_connection() as conn:
@@ -228,6 +303,7 @@ class SqliteItemTemplateRepository(AbstractItemTemplateRepository):
             """, params)
             conn.commit()
 
+    @write_operation
     def update_bait_template(self, bait_id: int, data: Dict[str, Any]) -> None:
         """后台更新一个鱼饵的信息，包含所有结构化效果字段"""
         with self._get_connection() as conn:
@@ -260,6 +336,7 @@ class SqliteItemTemplateRepository(AbstractItemTemplateRepository):
             """, params)
             conn.commit()
 
+    @write_operation
     def delete_bait_template(self, bait_id: int) -> None:
         with self._get_connection() as conn:
             cursor = conn.cursor()
@@ -267,6 +344,7 @@ class SqliteItemTemplateRepository(AbstractItemTemplateRepository):
             conn.commit()
 
     # --- Accessory Admin CRUD ---
+    @write_operation
     def add_accessory_template(self, data: Dict[str, Any]) -> None:
         with self._get_connection() as conn:
             cursor = conn.cursor()
@@ -280,6 +358,7 @@ class SqliteItemTemplateRepository(AbstractItemTemplateRepository):
             """, {**data, "icon_url": data.get("icon_url")})
             conn.commit()
 
+    @write_operation
     def update_accessory_template(self, accessory_id: int, data: Dict[str, Any]) -> None:
         data["accessory_id"] = accessory_id
         with self._get_connection() as conn:
@@ -296,12 +375,27 @@ class SqliteItemTemplateRepository(AbstractItemTemplateRepository):
             """, {**data, "icon_url": data.get("icon_url")})
             conn.commit()
 
+    @write_operation
     def delete_accessory_template(self, accessory_id: int) -> None:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM accessories WHERE accessory_id = ?", (accessory_id,))
             conn.commit()
 
+    @read_operation
+    def count_template_references(self, item_type: str, item_id: int) -> int:
+        queries = _TEMPLATE_REFERENCE_QUERIES.get(item_type)
+        if queries is None:
+            raise ValueError(f"未知的模板类型: {item_type}")
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            total = 0
+            for sql in queries:
+                cursor.execute(sql, (item_id,))
+                total += cursor.fetchone()[0]
+            return total
+
+    @write_operation
     def add_title_template(self, data: Dict[str, Any]) -> None:
         with self._get_connection() as conn:
             cursor = conn.cursor()
@@ -310,3 +404,30 @@ class SqliteItemTemplateRepository(AbstractItemTemplateRepository):
                 VALUES (:title_id, :name, :description, :display_format)
             """, data)
             conn.commit()
+
+    # --- Zone Loot Table Methods ---
+    @read_operation
+    def get_zone_rarity_weights(self) -> Dict[int, Dict[int, float]]:
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT zone_id, rarity, weight FROM fishing_zone_rarity_weights ORDER BY zone_id, rarity")
+            weights: Dict[int, Dict[int, float]] = {}
+            for row in cursor.fetchall():
+                weights.setdefault(row["zone_id"], {})[row["rarity"]] = row["weight"]
+            return weights
+
+    def get_zone_loot_table(self, zone_id: int) -> Optional[ZoneLootTable]:
+        # 未经缓存时每次都重新编译
+        weights = self.get_zone_rarity_weights().get(zone_id)
+        return ZoneLootTable(zone_id, weights) if weights else None
+
+    @write_operation
+    def update_zone_rarity_weights(self, zone_id: int, weights: Dict[int, float]) -> None:
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM fishing_zone_rarity_weights WHERE zone_id = ?", (zone_id,))
+            cursor.executemany(
+                "INSERT INTO fishing_zone_rarity_weights (zone_id, rarity, weight) VALUES (?, ?, ?)",
+                [(zone_id, rarity, weight) for rarity, weight in sorted(weights.items())]
+            )
+            conn.commit()
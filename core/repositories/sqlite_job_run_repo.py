@@ -0,0 +1,50 @@
+import sqlite3
+from typing import Dict
+
+from .abstract_repository import AbstractJobRunRepository
+from ..database.connection_manager import DatabaseConnectionManager, read_operation, write_operation
+
+
+class SqliteJobRunRepository(AbstractJobRunRepository):
+    """后台定时任务执行记录仓储的SQLite实现"""
+
+    def __init__(self, connection_manager: DatabaseConnectionManager):
+        self._connection_manager = connection_manager
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """获取当前线程共享的数据库连接。"""
+        return self._connection_manager.get_connection()
+
+    @read_operation
+    def get_last_runs(self) -> Dict[str, int]:
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            # last_run_at 为 0 表示该任务还没有成功执行过
+            cursor.execute("SELECT job_name, last_run_at FROM scheduled_job_runs WHERE last_run_at > 0")
+            return {row["job_name"]: row["last_run_at"] for row in cursor.fetchall()}
+
+    @write_operation
+    def mark_started(self, job_name: str) -> None:
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO scheduled_job_runs (job_name, last_run_at, last_status, run_count)
+                VALUES (?, 0, 'running', 1)
+                ON CONFLICT(job_name) DO UPDATE SET
+                    last_status = 'running',
+                    run_count = run_count + 1
+            """, (job_name,))
+            conn.commit()
+
+    @write_operation
+    def mark_finished(self, job_name: str, started_at: int, duration_ms: int, status: str) -> None:
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            # 只有成功（或首次登记时跳过）的执行才更新执行时间，失败的执行在重启后会被补跑
+            cursor.execute("""
+                UPDATE scheduled_job_runs SET
+                    last_run_at = CASE WHEN ? IN ('ok', 'skipped') THEN ? ELSE last_run_at END,
+                    last_duration_ms = ?, last_status = ?
+                WHERE job_name = ?
+            """, (status, started_at, duration_ms, status, job_name))
+            conn.commit()
@@ -1,29 +1,110 @@
 import sqlite3
-import threading
 from typing import Optional, List, Dict
 from datetime import date, datetime, timedelta, timezone
 # 导入抽象基类和领域模型
 from .abstract_repository import AbstractLogRepository
-from ..domain.models import FishingRecord, GachaRecord, WipeBombLog, TaxRecord
+from ..domain.models import FishingRecord, GachaRecord, WipeBombLog, TaxRecord, AutoFishingDigest
+from ..database.connection_manager import DatabaseConnectionManager, read_operation, write_operation
+from ..database.write_buffer import WriteBehindBuffer
+
+_INSERT_FISHING_RECORD = """
+    INSERT INTO fishing_records (
+        user_id, fish_id, weight, value, rod_instance_id,
+        accessory_instance_id, bait_id, timestamp, is_king_size
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+# 汇总按 (用户, 小时) 累加，写入顺序不影响结果，可以同样经过写后缓冲区
+_UPSERT_AUTO_FISHING_DIGEST = """
+    INSERT INTO auto_fishing_digest (
+        user_id, hour_start, casts, successes, total_weight, total_value,
+        max_weight, best_fish_id, best_fish_weight, best_fish_value
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(user_id, hour_start) DO UPDATE SET
+        casts = casts + excluded.casts,
+        successes = successes + excluded.successes,
+        total_weight = total_weight + excluded.total_weight,
+        total_value = total_value + excluded.total_value,
+        max_weight = MAX(max_weight, excluded.max_weight),
+        best_fish_id = CASE WHEN excluded.best_fish_id IS NOT NULL
+            AND (best_fish_id IS NULL OR excluded.best_fish_value > best_fish_value)
+            THEN excluded.best_fish_id ELSE best_fish_id END,
+        best_fish_weight = CASE WHEN excluded.best_fish_id IS NOT NULL
+            AND (best_fish_id IS NULL OR excluded.best_fish_value > best_fish_value)
+            THEN excluded.best_fish_weight ELSE best_fish_weight END,
+        best_fish_value = CASE WHEN excluded.best_fish_id IS NOT NULL
+            AND (best_fish_id IS NULL OR excluded.best_fish_value > best_fish_value)
+            THEN excluded.best_fish_value ELSE best_fish_value END
+"""
+_UPSERT_AUTO_FISHING_DIGEST_FISH = """
+    INSERT INTO auto_fishing_digest_fish (user_id, hour_start, fish_id, quantity, first_caught_at)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(user_id, hour_start, fish_id) DO UPDATE SET
+        quantity = quantity + excluded.quantity,
+        first_caught_at = MIN(first_caught_at, excluded.first_caught_at)
+"""
+_INSERT_GACHA_RECORD = """
+    INSERT INTO gacha_records (
+        user_id, gacha_pool_id, item_type, item_id,
+        item_name, quantity, rarity, timestamp
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+_INSERT_WIPE_BOMB_LOG = """
+    INSERT INTO wipe_bomb_log
+        (user_id, contribution_amount, reward_multiplier, reward_amount, timestamp)
+    VALUES (?, ?, ?, ?, ?)
+"""
+_INSERT_TAX_RECORD = """
+    INSERT INTO taxes
+        (user_id, tax_amount, tax_rate, original_amount, balance_after, tax_type, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
 
 class SqliteLogRepository(AbstractLogRepository):
     """日志类数据仓储的SQLite实现"""
 
-    def __init__(self, db_path: str):
-        self.db_path = db_path
-        self._local = threading.local()
+    def __init__(self, connection_manager: DatabaseConnectionManager,
+                 write_buffer: Optional[WriteBehindBuffer] = None):
+        """
+        初始化仓储。
+
+        Args:
+            connection_manager: 共享的数据库连接管理器。
+            write_buffer: 可选的写后缓冲区。提供时钓鱼、抽卡、擦弹和税收日志先进入缓冲区再批量写入。
+        """
+        self._connection_manager = connection_manager
+        self._write_buffer = write_buffer
         # 定义UTC+8时区
         self.UTC8 = timezone(timedelta(hours=8))
 
     def _get_connection(self) -> sqlite3.Connection:
-        """获取一个线程安全的数据库连接。"""
-        conn = getattr(self._local, "connection", None)
-        if conn is None:
-            conn = sqlite3.connect(self.db_path, detect_types=sqlite3.PARSE_DECLTYPES)
-            conn.row_factory = sqlite3.Row
-            conn.execute("PRAGMA foreign_keys = ON;")
-            self._local.connection = conn
-        return conn
+        """获取当前线程共享的数据库连接。"""
+        return self._connection_manager.get_connection()
+
+    def _append_log(self, sql: str, params: tuple) -> bool:
+        """写入一行日志，配置了写后缓冲区时只入队。"""
+        if self._write_buffer is not None:
+            self._write_buffer.add(sql, params)
+            return True
+        return self._insert_log(sql, params)
+
+    @write_operation
+    def _insert_log(self, sql: str, params: tuple) -> bool:
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            conn.commit()
+            return cursor.rowcount > 0
+
+    @write_operation
+    def _insert_logs(self, sql: str, rows: List[tuple]) -> None:
+        with self._get_connection() as conn:
+            conn.executemany(sql, rows)
+            conn.commit()
+
+    def _flush_pending_logs(self) -> None:
+        """查询缓冲表之前先写入缓冲区中的数据，保证读到最新记录。事务中不代写，以免随事务回滚。"""
+        if self._write_buffer is not None and not self._connection_manager.in_transaction():
+            self._write_buffer.flush()
 
     # --- 私有映射辅助方法 ---
     def _row_to_fishing_record(self, row: sqlite3.Row) -> Optional[FishingRecord]:
@@ -49,25 +130,26 @@ class SqliteLogRepository(AbstractLogRepository):
             return None
         return TaxRecord(**row)
 
+    def _fishing_record_params(self, record: FishingRecord) -> tuple:
+        return (
+            record.user_id, record.fish_id, record.weight, record.value,
+            record.rod_instance_id, record.accessory_instance_id,
+            record.bait_id, record.timestamp or datetime.now(self.UTC8),
+            1 if record.is_king_size else 0
+        )
+
     # --- Fishing Log Methods ---
     def add_fishing_record(self, record: FishingRecord) -> bool:
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO fishing_records (
-                    user_id, fish_id, weight, value, rod_instance_id,
-                    accessory_instance_id, bait_id, timestamp, is_king_size
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                record.user_id, record.fish_id, record.weight, record.value,
-                record.rod_instance_id, record.accessory_instance_id,
-                record.bait_id, record.timestamp or datetime.now(self.UTC8),
-                1 if record.is_king_size else 0
-            ))
-            conn.commit()
-            return cursor.rowcount > 0
+        return self._append_log(_INSERT_FISHING_RECORD, self._fishing_record_params(record))
 
+    def add_fishing_records(self, records: List[FishingRecord]) -> None:
+        rows = [self._fishing_record_params(record) for record in records]
+        if self._write_buffer is not None:
+            self._write_buffer.add_many(_INSERT_FISHING_RECORD, rows)
+        elif rows:
+            self._insert_logs(_INSERT_FISHING_RECORD, rows)
 
+    @read_operation
     def get_unlocked_fish_ids(self, user_id: str) -> Dict[int, datetime]:
         """
         获取指定用户所有钓到过的鱼类ID集合，以及对应的首次捕获时间。
@@ -75,17 +157,25 @@ class SqliteLogRepository(AbstractLogRepository):
         返回:
             Dict[int, datetime]: 键为鱼类ID，值为首次捕获时间
         """
+        self._flush_pending_logs()
         with self._get_connection() as conn:
             cursor = conn.cursor()
+            # 自动钓鱼只保留汇总，首次捕获时间同样从汇总中取
             cursor.execute("""
-                SELECT fish_id, MIN(timestamp) as first_caught_time
-                FROM fishing_records
-                WHERE user_id = ?
+                SELECT fish_id, MIN(caught_at) as first_caught_time FROM (
+                    SELECT fish_id, timestamp AS caught_at
+                    FROM fishing_records WHERE user_id = ?
+                    UNION ALL
+                    SELECT fish_id, first_caught_at AS caught_at
+                    FROM auto_fishing_digest_fish WHERE user_id = ?
+                )
                 GROUP BY fish_id
-            """, (user_id,))
+            """, (user_id, user_id))
             rows = cursor.fetchall()
             return {row["fish_id"]: row["first_caught_time"] for row in rows}
+    @read_operation
     def get_fishing_records(self, user_id: str, limit: int) -> List[FishingRecord]:
+        self._flush_pending_logs()
         with self._get_connection() as conn:
             # 为了简化返回，这里不连接获取名称，表现层可以按需从ItemTemplateRepository获取
             cursor = conn.cursor()
@@ -95,23 +185,63 @@ class SqliteLogRepository(AbstractLogRepository):
             """, (user_id, limit))
             return [self._row_to_fishing_record(row) for row in cursor.fetchall()]
 
-    # --- Gacha Log Methods ---
-    def add_gacha_record(self, record: GachaRecord) -> None:
+    def add_auto_fishing_digests(self, digests: List[AutoFishingDigest]) -> None:
+        digest_rows = []
+        fish_rows = []
+        for digest in digests:
+            digest_rows.append((
+                digest.user_id, digest.hour_start, digest.casts, digest.successes,
+                digest.total_weight, digest.total_value, digest.max_weight,
+                digest.best_fish_id, digest.best_fish_weight, digest.best_fish_value
+            ))
+            for fish_id, quantity in digest.fish_counts.items():
+                fish_rows.append((digest.user_id, digest.hour_start, fish_id, quantity,
+                                  digest.first_caught_at.get(fish_id, digest.hour_start)))
+        if self._write_buffer is not None:
+            # 事务中调用时在提交后才入队，回滚的抛竿不会留下汇总（进而解锁图鉴或成就）
+            self._write_buffer.add_many(_UPSERT_AUTO_FISHING_DIGEST, digest_rows)
+            self._write_buffer.add_many(_UPSERT_AUTO_FISHING_DIGEST_FISH, fish_rows)
+            return
+        if digest_rows:
+            self._insert_logs(_UPSERT_AUTO_FISHING_DIGEST, digest_rows)
+        if fish_rows:
+            self._insert_logs(_UPSERT_AUTO_FISHING_DIGEST_FISH, fish_rows)
+
+    @read_operation
+    def get_auto_fishing_digests(self, user_id: str, limit: int) -> List[AutoFishingDigest]:
+        self._flush_pending_logs()
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                INSERT INTO gacha_records (
-                    user_id, gacha_pool_id, item_type, item_id,
-                    item_name, quantity, rarity, timestamp
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                record.user_id, record.gacha_pool_id, record.item_type,
-                record.item_id, record.item_name, record.quantity,
-                record.rarity, record.timestamp or datetime.now(self.UTC8)
-            ))
-            conn.commit()
+                SELECT * FROM auto_fishing_digest
+                WHERE user_id = ? ORDER BY hour_start DESC LIMIT ?
+            """, (user_id, limit))
+            digests = [AutoFishingDigest(**dict(row)) for row in cursor.fetchall()]
+            if not digests:
+                return []
+            by_hour = {digest.hour_start: digest for digest in digests}
+            placeholders = ", ".join("?" for _ in by_hour)
+            cursor.execute(f"""
+                SELECT hour_start, fish_id, quantity, first_caught_at FROM auto_fishing_digest_fish
+                WHERE user_id = ? AND hour_start IN ({placeholders})
+            """, (user_id, *by_hour))
+            for row in cursor.fetchall():
+                digest = by_hour[row["hour_start"]]
+                digest.fish_counts[row["fish_id"]] = row["quantity"]
+                digest.first_caught_at[row["fish_id"]] = row["first_caught_at"]
+            return digests
+
+    # --- Gacha Log Methods ---
+    def add_gacha_record(self, record: GachaRecord) -> None:
+        self._append_log(_INSERT_GACHA_RECORD, (
+            record.user_id, record.gacha_pool_id, record.item_type,
+            record.item_id, record.item_name, record.quantity,
+            record.rarity, record.timestamp or datetime.now(self.UTC8)
+        ))
 
+    @read_operation
     def get_gacha_records(self, user_id: str, limit: int) -> List[GachaRecord]:
+        self._flush_pending_logs()
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
@@ -130,16 +260,13 @@ class SqliteLogRepository(AbstractLogRepository):
         # 确保存储为 UTC 时间字符串
         utc_timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
 
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""INSERT INTO wipe_bomb_log
-                (user_id, contribution_amount, reward_multiplier, reward_amount, timestamp)
-                VALUES (?, ?, ?, ?, ?)
-            """, (log.user_id, log.contribution_amount, log.reward_multiplier,
-                  log.reward_amount, utc_timestamp))
-            conn.commit()
+        self._append_log(_INSERT_WIPE_BOMB_LOG, (
+            log.user_id, log.contribution_amount, log.reward_multiplier,
+            log.reward_amount, utc_timestamp
+        ))
 
     # 查询时考虑时区
+    @read_operation
     def get_wipe_bomb_log_count_today(self, user_id: str) -> int:
         # 获取 UTC+8 的今天的开始和结束时间点（转为 UTC）
         today_start = datetime.now(self.UTC8).replace(hour=0, minute=0, second=0, microsecond=0)
@@ -149,6 +276,7 @@ class SqliteLogRepository(AbstractLogRepository):
         utc_start = today_start.astimezone(timezone.utc).replace(tzinfo=None)
         utc_end = today_end.astimezone(timezone.utc).replace(tzinfo=None)
 
+        self._flush_pending_logs()
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
@@ -159,6 +287,7 @@ class SqliteLogRepository(AbstractLogRepository):
             return result[0] if result else 0
 
     # --- Check-in Log Methods ---
+    @write_operation
     def add_check_in(self, user_id: str, check_in_date: date) -> None:
         with self._get_connection() as conn:
             cursor = conn.cursor()
@@ -168,6 +297,7 @@ class SqliteLogRepository(AbstractLogRepository):
             )
             conn.commit()
 
+    @read_operation
     def has_checked_in(self, user_id: str, check_in_date: date) -> bool:
         with self._get_connection() as conn:
             cursor = conn.cursor()
@@ -179,20 +309,15 @@ class SqliteLogRepository(AbstractLogRepository):
 
     # --- Tax Log Methods ---
     def add_tax_record(self, record: TaxRecord) -> None:
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO taxes
-                    (user_id, tax_amount, tax_rate, original_amount, balance_after, tax_type, timestamp)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                record.user_id, record.tax_amount, record.tax_rate,
-                record.original_amount, record.balance_after,
-                record.tax_type, record.timestamp or datetime.now(self.UTC8)
-            ))
-            conn.commit()
+        self._append_log(_INSERT_TAX_RECORD, (
+            record.user_id, record.tax_amount, record.tax_rate,
+            record.original_amount, record.balance_after,
+            record.tax_type, record.timestamp or datetime.now(self.UTC8)
+        ))
 
+    @read_operation
     def get_wipe_bomb_logs(self, user_id: str, limit: int = 10) -> List[WipeBombLog]:
+        self._flush_pending_logs()
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
@@ -201,7 +326,9 @@ class SqliteLogRepository(AbstractLogRepository):
             """, (user_id, limit))
             return [self._row_to_wipe_bomb_log(row) for row in cursor.fetchall()]
 
+    @read_operation
     def get_tax_records(self, user_id: str, limit: int = 10) -> List[TaxRecord]:
+        self._flush_pending_logs()
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
@@ -210,7 +337,9 @@ class SqliteLogRepository(AbstractLogRepository):
             """, (user_id, limit))
             return [self._row_to_tax_record(row) for row in cursor.fetchall()]
 
+    @read_operation
     def get_max_wipe_bomb_multiplier(self, user_id: str) -> float:
+        self._flush_pending_logs()
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
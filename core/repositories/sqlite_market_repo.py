@@ -1,28 +1,21 @@
 import sqlite3
-import threading
 from typing import Optional, List
 from datetime import datetime
 
 # 导入抽象基类和领域模型
 from .abstract_repository import AbstractMarketRepository
 from ..domain.models import MarketListing
+from ..database.connection_manager import DatabaseConnectionManager, read_operation, write_operation
 
 class SqliteMarketRepository(AbstractMarketRepository):
     """市场仓储的SQLite实现"""
 
-    def __init__(self, db_path: str):
-        self.db_path = db_path
-        self._local = threading.local()
+    def __init__(self, connection_manager: DatabaseConnectionManager):
+        self._connection_manager = connection_manager
 
     def _get_connection(self) -> sqlite3.Connection:
-        """获取一个线程安全的数据库连接。"""
-        conn = getattr(self._local, "connection", None)
-        if conn is None:
-            conn = sqlite3.connect(self.db_path, detect_types=sqlite3.PARSE_DECLTYPES)
-            conn.row_factory = sqlite3.Row
-            conn.execute("PRAGMA foreign_keys = ON;")
-            self._local.connection = conn
-        return conn
+        """获取当前线程共享的数据库连接。"""
+        return self._connection_manager.get_connection()
 
     def _row_to_market_listing(self, row: sqlite3.Row) -> Optional[MarketListing]:
         """将数据库行对象映射到 MarketListing 领域模型。"""
@@ -31,6 +24,7 @@ class SqliteMarketRepository(AbstractMarketRepository):
         return MarketListing(**row)
 
 
+    @read_operation
     def get_listing_by_id(self, market_id: int) -> Optional[MarketListing]:
         """获取单个市场商品"""
         with self._get_connection() as conn:
@@ -67,6 +61,7 @@ class SqliteMarketRepository(AbstractMarketRepository):
             row = cursor.fetchone()
             return self._row_to_market_listing(row)
 
+    @read_operation
     def get_all_listings(self) -> List[MarketListing]:
         """
         获取所有市场商品，并连接（JOIN）其他表以获取商品名称和卖家昵称。
@@ -106,6 +101,7 @@ class SqliteMarketRepository(AbstractMarketRepository):
             rows = cursor.fetchall()
             return [self._row_to_market_listing(row) for row in rows]
 
+    @write_operation
     def add_listing(self, listing: MarketListing) -> None:
         """添加一个市场商品"""
         with self._get_connection() as conn:
@@ -123,6 +119,7 @@ class SqliteMarketRepository(AbstractMarketRepository):
             ))
             conn.commit()
 
+    @write_operation
     def remove_listing(self, market_id: int) -> None:
         """移除一个市场商品（通常在购买成功或下架后调用）"""
         with self._get_connection() as conn:
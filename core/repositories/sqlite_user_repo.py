@@ -1,33 +1,27 @@
 import sqlite3
-import threading
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 
-from ..domain.models import User, TaxRecord
+from ..domain.models import User, TaxRecord, USER_PERSISTED_FIELDS, USER_DELTA_FIELDS
 from .abstract_repository import AbstractUserRepository
+from ..database.connection_manager import DatabaseConnectionManager, read_operation, write_operation
+from ..database.identity_map import load_through
 
 class SqliteUserRepository(AbstractUserRepository):
     """用户数据仓储的SQLite实现"""
 
-    def __init__(self, db_path: str):
+    def __init__(self, connection_manager: DatabaseConnectionManager):
         """
         初始化仓储。
 
         Args:
-            db_path: SQLite数据库文件路径。
+            connection_manager: 共享的数据库连接管理器。
         """
-        self.db_path = db_path
-        self._local = threading.local()
+        self._connection_manager = connection_manager
 
     def _get_connection(self) -> sqlite3.Connection:
-        """获取一个线程安全的数据库连接。"""
-        conn = getattr(self._local, "connection", None)
-        if conn is None:
-            conn = sqlite3.connect(self.db_path, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
-            conn.row_factory = sqlite3.Row  # 返回字典形式的行
-            conn.execute("PRAGMA foreign_keys = ON;")
-            self._local.connection = conn
-        return conn
+        """获取当前线程共享的数据库连接。"""
+        return self._connection_manager.get_connection()
 
     def _row_to_user(self, row: sqlite3.Row) -> Optional[User]:
         """将数据库行对象映射到User领域模型。"""
@@ -46,7 +40,7 @@ class SqliteUserRepository(AbstractUserRepository):
                     return datetime.strptime(dt_val, "%Y-%m-%d %H:%M:%S")
             return None
 
-        return User(
+        user = User(
             user_id=row["user_id"],
             nickname=row["nickname"],
             coins=row["coins"],
@@ -62,27 +56,39 @@ class SqliteUserRepository(AbstractUserRepository):
             current_title_id=row["current_title_id"],
             current_bait_id=row["current_bait_id"],
             bait_start_time=parse_datetime(row["bait_start_time"]),
+            bait_expires_at=row["bait_expires_at"],
             auto_fishing_enabled=bool(row["auto_fishing_enabled"]),
+            auto_fishing_since=row["auto_fishing_since"],
             last_fishing_time=parse_datetime(row["last_fishing_time"]),
             last_wipe_bomb_time=parse_datetime(row["last_wipe_bomb_time"]),
             last_steal_time=parse_datetime(row["last_steal_time"]),
             last_login_time=parse_datetime(row["last_login_time"]),
+            last_stolen_at=parse_datetime(row["last_stolen_at"]),
             fishing_zone_id=row["fishing_zone_id"],
         )
+        user.mark_clean()
+        return user
 
     def get_by_id(self, user_id: str) -> Optional[User]:
+        # 指令会话内同一个用户只加载一次
+        return load_through("user", user_id, lambda: self._load_by_id(user_id))
+
+    @read_operation
+    def _load_by_id(self, user_id: str) -> Optional[User]:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
             row = cursor.fetchone()
             return self._row_to_user(row)
 
+    @read_operation
     def check_exists(self, user_id: str) -> bool:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT 1 FROM users WHERE user_id = ?", (user_id,))
             return cursor.fetchone() is not None
 
+    @write_operation
     def add(self, user: User) -> None:
         with self._get_connection() as conn:
             cursor = conn.cursor()
@@ -92,33 +98,41 @@ class SqliteUserRepository(AbstractUserRepository):
             )
             conn.commit()
 
+    @write_operation
     def update(self, user: User) -> None:
+        """只写回自上次加载或写回以来发生变化的字段。"""
+        changes = user.get_changes()
+        if changes is None:
+            # 不是从仓储加载的对象无法判断变化，按绝对值写回整行
+            assignments = [f"{name} = ?" for name in USER_PERSISTED_FIELDS]
+            params = [getattr(user, name) for name in USER_PERSISTED_FIELDS]
+        else:
+            if not changes:
+                return
+            assignments, params = [], []
+            for name, (original, current) in changes.items():
+                # 计数类字段以增量方式写回，避免自动钓鱼任务与指令处理同时写入时互相覆盖
+                if name in USER_DELTA_FIELDS and original is not None and current is not None:
+                    assignments.append(f"{name} = {name} + ?")
+                    params.append(current - original)
+                else:
+                    assignments.append(f"{name} = ?")
+                    params.append(current)
+
         with self._get_connection() as conn:
             cursor = conn.cursor()
-            # 服务层负责在更新前获取最新的用户状态
-            cursor.execute("""
-                UPDATE users SET
-                    nickname = ?, coins = ?, premium_currency = ?,
-                    total_fishing_count = ?, total_weight_caught = ?, total_coins_earned = ?,
-                    consecutive_login_days = ?, fish_pond_capacity = ?,
-                    equipped_rod_instance_id = ?, equipped_accessory_instance_id = ?,
-                    current_title_id = ?, current_bait_id = ?, bait_start_time = ?,
-                    auto_fishing_enabled = ?, last_fishing_time = ?, last_wipe_bomb_time = ?,
-                    last_steal_time = ?, last_login_time = ?, last_stolen_at = ?, fishing_zone_id = ?
-                WHERE user_id = ?
-            """, (
-                user.nickname, user.coins, user.premium_currency,
-                user.total_fishing_count, user.total_weight_caught, user.total_coins_earned,
-                user.consecutive_login_days, user.fish_pond_capacity,
-                user.equipped_rod_instance_id, user.equipped_accessory_instance_id,
-                user.current_title_id, user.current_bait_id, user.bait_start_time,
-                user.auto_fishing_enabled, user.last_fishing_time, user.last_wipe_bomb_time,
-                user.last_steal_time, user.last_login_time, user.last_stolen_at,
-                user.fishing_zone_id,
-                user.user_id
-            ))
+            cursor.execute(
+                f"UPDATE users SET {', '.join(assignments)} WHERE user_id = ?",
+                (*params, user.user_id)
+            )
             conn.commit()
+        # 立即更新快照，同一事务内的后续写回只包含新的变化，计数增量不会重复写入；
+        # 事务回滚时恢复写回前的快照，这些字段仍计为未写回
+        previous = user._snapshot
+        user.mark_clean()
+        self._connection_manager.on_rollback(lambda: user.restore_snapshot(previous))
 
+    @read_operation
     def get_all_user_ids(self, auto_fishing_only: bool = False) -> List[str]:
         query = "SELECT user_id FROM users"
         params = []
@@ -131,6 +145,7 @@ class SqliteUserRepository(AbstractUserRepository):
             cursor.execute(query, params)
             return [row["user_id"] for row in cursor.fetchall()]
 
+    @read_operation
     def get_leaderboard_data(self, limit: int) -> List[Dict[str, Any]]:
         # 此方法返回一个DTO（数据传输对象），而不是领域模型，因为它需要多表连接
         with self._get_connection() as conn:
@@ -150,6 +165,7 @@ class SqliteUserRepository(AbstractUserRepository):
             """, (limit,))
             return [dict(row) for row in cursor.fetchall()]
 
+    @read_operation
     def get_high_value_users(self, threshold: int) -> List[User]:
         with self._get_connection() as conn:
             cursor = conn.cursor()
@@ -0,0 +1,98 @@
+import random
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Sequence, Tuple
+
+
+class AliasTable:
+    """
+    Vose 别名法加权随机抽样表。
+
+    构建时间 O(n)，之后每次抽取只需要两个随机数和一次下标运算，与候选项数量无关。
+    权重为 0 的候选项永远不会被抽中。
+    """
+
+    def __init__(self, outcomes: Sequence[Any], weights: Sequence[float]):
+        if len(outcomes) != len(weights):
+            raise ValueError("候选项与权重的数量不一致")
+        if any(weight < 0 for weight in weights):
+            raise ValueError("权重不能为负数")
+        total = float(sum(weights))
+        if not outcomes or total <= 0:
+            raise ValueError("权重总和必须大于 0")
+
+        n = len(outcomes)
+        self._outcomes: Tuple[Any, ...] = tuple(outcomes)
+        self._n = n
+        self._prob: List[float] = [0.0] * n
+        self._alias: List[int] = list(range(n))
+
+        scaled = [weight * n / total for weight in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            self._prob[less] = scaled[less]
+            self._alias[less] = more
+            scaled[more] = (scaled[more] + scaled[less]) - 1.0
+            if scaled[more] < 1.0:
+                small.append(more)
+            else:
+                large.append(more)
+        # 剩余的列只可能因浮点误差偏离 1，直接视为满列；权重为 0 的列仍然指向最大权重项
+        heaviest = max(range(n), key=lambda i: weights[i])
+        for i in large + small:
+            if weights[i] > 0:
+                self._prob[i] = 1.0
+            else:
+                self._alias[i] = heaviest
+
+    def __len__(self) -> int:
+        return self._n
+
+    def draw(self, rng: random.Random = random) -> Any:
+        """抽取一个候选项。"""
+        column = int(rng.random() * self._n)
+        if rng.random() < self._prob[column]:
+            return self._outcomes[column]
+        return self._outcomes[self._alias[column]]
+
+    def sample(self, k: int, rng: random.Random = random) -> List[Any]:
+        """有放回地抽取 k 个候选项。"""
+        return [self.draw(rng) for _ in range(k)]
+
+
+class AliasTableCache:
+    """
+    按键缓存已编译的别名表。
+
+    键由调用方决定，应包含会影响权重的全部信息（奖池ID与奖品权重、配置内容、区域与加成等），
+    权重变化后自然落到新的键上。超过 max_size 时淘汰最久未使用的表。
+    """
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max(1, int(max_size))
+        self._tables: "OrderedDict[Hashable, AliasTable]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable,
+            builder: Callable[[], Tuple[Sequence[Any], Sequence[float]]]) -> AliasTable:
+        """获取键对应的别名表，未命中时调用 builder 得到 (候选项, 权重) 并编译。"""
+        with self._lock:
+            table = self._tables.get(key)
+            if table is not None:
+                self._tables.move_to_end(key)
+                return table
+        outcomes, weights = builder()
+        table = AliasTable(outcomes, weights)
+        with self._lock:
+            self._tables[key] = table
+            self._tables.move_to_end(key)
+            while len(self._tables) > self.max_size:
+                self._tables.popitem(last=False)
+        return table
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tables.clear()
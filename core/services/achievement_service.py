@@ -1,5 +1,3 @@
-import threading
-import time
 import pkgutil
 import inspect
 from typing import Dict, Any, List, Optional, Set
@@ -16,6 +14,10 @@ from ..repositories.abstract_repository import (
 )
 from ..domain.models import User
 from ..achievements.base import BaseAchievement, UserContext
+from .job_scheduler import JobScheduler
+
+# 成就检查的执行间隔（秒）
+ACHIEVEMENT_CHECK_INTERVAL_SECONDS = 600
 
 class AchievementService:
     """实现可插拔的成就系统"""
@@ -36,9 +38,6 @@ class AchievementService:
 
         self.achievements: List[BaseAchievement] = self._load_achievements()
 
-        self.achievement_check_thread: Optional[threading.Thread] = None
-        self.achievement_check_running = False
-
     def _load_achievements(self) -> List[BaseAchievement]:
         """动态扫描并加载所有成就类。"""
         loaded_achievements = []
@@ -59,17 +58,15 @@ class AchievementService:
         if not user:
             return None
 
-        owned_rod_rarities: Set[int] = set()
-        for rod_instance in self.inventory_repo.get_user_rod_instances(user_id):
-            rod_template = self.item_template_repo.get_rod_by_id(rod_instance.rod_id)
-            if rod_template:
-                owned_rod_rarities.add(rod_template.rarity)
+        rod_ids = [rod_instance.rod_id for rod_instance in self.inventory_repo.get_user_rod_instances(user_id)]
+        owned_rod_rarities: Set[int] = {
+            rod_template.rarity for rod_template in self.item_template_repo.get_rods_by_ids(rod_ids).values()
+        }
 
-        owned_accessory_rarities: Set[int] = set()
-        for acc_instance in self.inventory_repo.get_user_accessory_instances(user_id):
-            acc_template = self.item_template_repo.get_accessory_by_id(acc_instance.accessory_id)
-            if acc_template:
-                owned_accessory_rarities.add(acc_template.rarity)
+        accessory_ids = [acc_instance.accessory_id for acc_instance in self.inventory_repo.get_user_accessory_instances(user_id)]
+        owned_accessory_rarities: Set[int] = {
+            acc_template.rarity for acc_template in self.item_template_repo.get_accessories_by_ids(accessory_ids).values()
+        }
 
         return UserContext(
             user=user,
@@ -103,32 +100,18 @@ class AchievementService:
 
     # --- 后台任务与核心逻辑 ---
 
-    def start_achievement_check_task(self):
-        """启动成就检查的后台线程。"""
-        if self.achievement_check_thread and self.achievement_check_thread.is_alive():
-            return
-        self.achievement_check_running = True
-        self.achievement_check_thread = threading.Thread(target=self._achievement_check_loop, daemon=True)
-        self.achievement_check_thread.start()
-
-    def stop_achievement_check_task(self):
-        """停止成就检查的后台线程。"""
-        self.achievement_check_running = False
-        if self.achievement_check_thread:
-            self.achievement_check_thread.join(timeout=1.0)
-
-    def _achievement_check_loop(self):
-        """成就检查循环任务。"""
-        while self.achievement_check_running:
+    def register_jobs(self, job_scheduler: JobScheduler) -> None:
+        """登记成就检查的后台任务，每 10 分钟为所有用户检查一次。"""
+        job_scheduler.add_interval_job("achievement_check", self._check_all_achievements,
+                                       ACHIEVEMENT_CHECK_INTERVAL_SECONDS, jitter=30, persist=True)
+
+    def _check_all_achievements(self):
+        """为所有用户检查并发放成就，单个用户出错不影响其他用户。"""
+        for user_id in self.user_repo.get_all_user_ids():
             try:
-                all_user_ids = self.user_repo.get_all_user_ids()
-                for user_id in all_user_ids:
-                    self._process_user_achievements(user_id)
-                time.sleep(600) # 10分钟检查一次
+                self._process_user_achievements(user_id)
             except Exception as e:
-                logger.error(f"成就检查任务出错: {e}")
-                logger.error("堆栈信息:", exc_info=True)
-                time.sleep(60)
+                logger.error(f"检查用户 {user_id} 的成就时出错: {e}")
 
     def _process_user_achievements(self, user_id: str):
         """处理单个用户的成就检查和发放流程。"""
@@ -0,0 +1,139 @@
+import heapq
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class AutoFishingScheduler:
+    """
+    自动钓鱼调度队列。
+
+    按 (下次可抛竿时间戳, 用户ID) 维护一个小顶堆，自动钓鱼任务只取出已到期的用户，
+    并在堆顶用户到期时再次执行（分片进程中由进程主循环 wait 到那时）。每个用户只保留最新一次登记的时间，
+    被覆盖或移除的旧堆元素在出堆时丢弃。
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, str]] = []
+        # user_id -> 当前有效的到期时间
+        self._due: Dict[str, float] = {}
+        self._cond = threading.Condition()
+        # 登记的时间早于当前最早到期时间时调用，参数为新的最早到期时间
+        self._listener: Optional[Callable[[float], None]] = None
+
+        # 上次 take_lag_stats 以来出堆的用户数、出堆时刻晚于到期时间的总秒数与最大秒数
+        self._popped = 0
+        self._lag_total = 0.0
+        self._lag_max = 0.0
+
+    def get_stats(self) -> Dict[str, int]:
+        """返回登记的用户数与堆中元素数（含待丢弃的旧元素）。"""
+        with self._cond:
+            return {"scheduled": len(self._due), "heap": len(self._heap)}
+
+    def __contains__(self, user_id: str) -> bool:
+        with self._cond:
+            return user_id in self._due
+
+    def set_listener(self, callback: Optional[Callable[[float], None]]) -> None:
+        """登记最早到期时间提前时的回调，供后台任务调度器提前唤醒自动钓鱼任务。"""
+        self._listener = callback
+
+    def add(self, user_id: str, due: float) -> None:
+        """登记用户在 due 时刻（Unix 时间戳）抛竿，已登记的用户改为新的时间。"""
+        with self._cond:
+            earlier = self._push(user_id, due)
+        if earlier and self._listener:
+            self._listener(due)
+
+    def reschedule(self, user_id: str, due: float) -> None:
+        """仅当用户已登记时改为新的到期时间。"""
+        with self._cond:
+            if user_id not in self._due:
+                return
+            earlier = self._push(user_id, due)
+        if earlier and self._listener:
+            self._listener(due)
+
+    def next_due(self) -> Optional[float]:
+        """返回最早的到期时间，队列为空时返回 None。"""
+        with self._cond:
+            return self._peek()
+
+    def discard(self, user_id: str) -> None:
+        """移除用户，不存在时忽略。"""
+        with self._cond:
+            self._due.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._cond:
+            self._heap.clear()
+            self._due.clear()
+
+    def pop_due(self, now: float, limit: int) -> List[str]:
+        """取出最多 limit 个在 now 之前到期的用户，取出的用户不再登记。"""
+        due_user_ids = []
+        with self._cond:
+            while self._heap and len(due_user_ids) < limit:
+                due, user_id = self._heap[0]
+                if self._due.get(user_id) != due:
+                    heapq.heappop(self._heap)
+                    continue
+                if due > now:
+                    break
+                heapq.heappop(self._heap)
+                del self._due[user_id]
+                due_user_ids.append(user_id)
+                lag = now - due
+                self._popped += 1
+                self._lag_total += lag
+                self._lag_max = max(self._lag_max, lag)
+        return due_user_ids
+
+    def take_lag_stats(self) -> Tuple[int, float, float]:
+        """返回上次调用以来出堆的用户数、总延迟与最大延迟（秒），并重新计数。"""
+        with self._cond:
+            stats = (self._popped, self._lag_total, self._lag_max)
+            self._popped = 0
+            self._lag_total = 0.0
+            self._lag_max = 0.0
+        return stats
+
+    def wait(self, timeout: float) -> None:
+        """睡眠到堆顶用户到期，最长 timeout 秒；登记新用户或调用 wake 时提前返回。"""
+        with self._cond:
+            delay = timeout
+            next_due = self._peek()
+            if next_due is not None:
+                delay = min(delay, next_due - time.time())
+            if delay > 0:
+                self._cond.wait(delay)
+
+    def wake(self) -> None:
+        """唤醒正在 wait 的线程。"""
+        with self._cond:
+            self._cond.notify_all()
+
+    def _push(self, user_id: str, due: float) -> bool:
+        """登记到期时间并唤醒等待的线程，返回它是否早于原来的最早到期时间。需在持有锁时调用。"""
+        earliest = self._peek()
+        self._due[user_id] = due
+        heapq.heappush(self._heap, (due, user_id))
+        self._compact()
+        self._cond.notify_all()
+        return earliest is None or due < earliest
+
+    def _peek(self) -> Optional[float]:
+        """丢弃堆顶的旧元素，返回最早的有效到期时间。需在持有锁时调用。"""
+        while self._heap:
+            due, user_id = self._heap[0]
+            if self._due.get(user_id) == due:
+                return due
+            heapq.heappop(self._heap)
+        return None
+
+    def _compact(self) -> None:
+        """旧元素过多时重建堆，避免频繁改期的用户让堆无限增长。需在持有锁时调用。"""
+        if len(self._heap) > 2 * len(self._due) + 64:
+            self._heap = [(due, user_id) for user_id, due in self._due.items()]
+            heapq.heapify(self._heap)
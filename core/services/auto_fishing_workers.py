@@ -0,0 +1,284 @@
+import multiprocessing
+import threading
+import time
+import traceback
+import zlib
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from astrbot.api import logger
+
+# 分片进程向协调器汇报吞吐量与延迟的间隔（秒）
+STATS_INTERVAL_SECONDS = 300
+
+
+def shard_for(user_id: str, shard_count: int) -> int:
+    """按用户ID的 CRC32 分片，同一个用户总是由同一个进程处理。"""
+    return zlib.crc32(str(user_id).encode("utf-8")) % shard_count
+
+
+class AutoFishingCoordinator:
+    """
+    自动钓鱼分片进程的协调器，运行在插件主进程中。
+
+    开启自动钓鱼的用户按 shard_for 分到 worker_count 个子进程，每个子进程有自己的数据库连接、
+    服务实例与调度队列，独立抛竿，不与机器人的事件循环争抢 GIL。
+    协调器对 FishingService 提供与 AutoFishingScheduler 相同的 add / discard / reschedule 接口，
+    把开关自动钓鱼、手动抛竿与装备变化转发给用户所在的进程；子进程抛竿后回报用户ID，
+    由 add_listener 登记的回调让主进程中的用户与冷却缓存失效。
+    协调器记录交给子进程的用户，只为这些用户转发改期与装备变化，其他用户的手动抛竿不产生进程间通信。
+    """
+
+    def __init__(self, worker_count: int, db_path: str, pragmas: Dict[str, Any], game_config: Dict[str, Any],
+                 zone_quota_refresh_seconds: float = 30, cache_sizes: Optional[Dict[str, int]] = None):
+        """
+        Args:
+            worker_count: 子进程数量。
+            db_path: 数据库文件路径，子进程各自打开连接。
+            pragmas: 子进程连接使用的 PRAGMA 配置。
+            game_config: 游戏配置，子进程按同样的规则抛竿。
+            zone_quota_refresh_seconds: 子进程重新加载区域稀有鱼计数的间隔（秒）。
+            cache_sizes: 子进程中装备快照（loadout）与冷却（cooldown）缓存的最大用户数，未提供时使用默认值。
+        """
+        self.worker_count = max(1, int(worker_count))
+        self._settings = {
+            "db_path": db_path,
+            "pragmas": dict(pragmas),
+            "game_config": game_config,
+            "zone_quota_refresh_seconds": zone_quota_refresh_seconds,
+            "cache_sizes": dict(cache_sizes or {}),
+        }
+        # 插件运行在带有多个线程的事件循环进程中，使用 spawn 启动干净的子进程
+        self._context = multiprocessing.get_context("spawn")
+        self._commands: List[Any] = []
+        self._events: Optional[Any] = None
+        self._processes: List[Any] = []
+        self._listeners: List[Callable[[List[str]], None]] = []
+        # 已交给子进程调度的用户：启动时开启自动钓鱼的用户，加上之后 add 的，减去 discard 的
+        self._members: Set[str] = set()
+        self._members_lock = threading.Lock()
+
+        # 各进程最近一次汇报的统计
+        self._stats: Dict[int, Dict[str, float]] = {}
+        self._stats_lock = threading.Lock()
+
+        self._event_thread: Optional[threading.Thread] = None
+        self._running = False
+
+    def add_listener(self, callback: Callable[[List[str]], None]) -> None:
+        """登记子进程抛竿后调用的回调，参数为本批抛竿的用户ID。"""
+        self._listeners.append(callback)
+
+    def get_stats(self) -> Dict[int, Dict[str, float]]:
+        """返回各进程最近一次汇报的吞吐量（次/秒）、平均与最大延迟（秒）等统计。"""
+        with self._stats_lock:
+            return {index: dict(stats) for index, stats in self._stats.items()}
+
+    # --- 进程管理 ---
+
+    def start(self, user_ids: Iterable[str] = ()) -> None:
+        """
+        启动所有子进程与接收子进程事件的线程。
+        user_ids 为当前开启自动钓鱼的用户，子进程启动时从数据库登记的也是这些用户。
+        """
+        if self._running:
+            return
+        with self._members_lock:
+            self._members = set(user_ids)
+        self._running = True
+        self._events = self._context.Queue()
+        for index in range(self.worker_count):
+            commands = self._context.Queue()
+            process = self._context.Process(
+                target=_run_worker,
+                args=(index, self.worker_count, self._settings, commands, self._events),
+                name=f"fishing-auto-worker-{index}",
+                daemon=True,
+            )
+            process.start()
+            self._commands.append(commands)
+            self._processes.append(process)
+        self._event_thread = threading.Thread(target=self._read_events, name="fishing-auto-coordinator",
+                                              daemon=True)
+        self._event_thread.start()
+        logger.info(f"自动钓鱼分片进程已启动，共 {self.worker_count} 个进程。")
+
+    def close(self, timeout: float = 10.0) -> None:
+        """通知所有子进程结束当前批次后退出，超时未退出的进程强制终止。"""
+        if not self._running:
+            return
+        self._running = False
+        for commands in self._commands:
+            commands.put(("stop",))
+        deadline = time.monotonic() + timeout
+        for process in self._processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"自动钓鱼进程 {process.name} 未能按时退出，已强制终止")
+                process.terminate()
+                process.join(1.0)
+        self._events.put(None)
+        if self._event_thread:
+            self._event_thread.join(timeout=1.0)
+            self._event_thread = None
+        self._commands = []
+        self._processes = []
+        with self._members_lock:
+            self._members.clear()
+        logger.info("自动钓鱼分片进程已全部停止")
+
+    def _read_events(self) -> None:
+        while True:
+            try:
+                event = self._events.get()
+            except (EOFError, OSError):
+                return
+            if event is None:
+                return
+            kind, index, payload = event
+            if kind == "cast":
+                for callback in self._listeners:
+                    try:
+                        callback(payload)
+                    except Exception as e:
+                        logger.error(f"处理自动钓鱼进程 #{index} 的抛竿通知时出错: {e}")
+            elif kind == "stats":
+                with self._stats_lock:
+                    self._stats[index] = payload
+                logger.info(
+                    f"自动钓鱼进程 #{index}: 最近 {payload['interval']:.0f} 秒抛竿 {payload['casts']} 次"
+                    f"（{payload['casts_per_second']:.2f} 次/秒），平均延迟 {payload['avg_lag']:.1f} 秒，"
+                    f"最大延迟 {payload['max_lag']:.1f} 秒，忙碌 {payload['busy_ratio']:.0%}，"
+                    f"排队 {payload['scheduled']} 人"
+                )
+            elif kind == "error":
+                logger.error(f"自动钓鱼进程 #{index} 出错: {payload}")
+
+    # --- 与 AutoFishingScheduler 相同的接口，由 FishingService 调用 ---
+
+    def __contains__(self, user_id: str) -> bool:
+        # 用户是否已交给子进程调度；冷却中的用户在子进程里何时到期由子进程自己判断
+        if not self._running:
+            return False
+        with self._members_lock:
+            return user_id in self._members
+
+    def add(self, user_id: str, due: float) -> None:
+        if not self._running:
+            return
+        with self._members_lock:
+            self._members.add(user_id)
+        self._send(user_id, ("add", user_id, due))
+
+    def reschedule(self, user_id: str, due: float) -> None:
+        self._send(user_id, ("reschedule", user_id, due))
+
+    def discard(self, user_id: str) -> None:
+        with self._members_lock:
+            self._members.discard(user_id)
+        self._send(user_id, ("discard", user_id))
+
+    def forget(self, user_id: str) -> None:
+        """主进程中用户的装备快照作废时调用，所在进程随之丢弃该用户的冷却缓存。"""
+        if user_id in self:
+            self._send(user_id, ("forget", user_id))
+
+    def _send(self, user_id: str, command: tuple) -> None:
+        if not self._running:
+            return
+        self._commands[shard_for(user_id, self.worker_count)].put(command)
+
+
+def _run_worker(index: int, shard_count: int, settings: Dict[str, Any], commands, events) -> None:
+    """
+    分片进程入口：组装本进程的仓储与服务，只为属于本分片的用户抛竿。
+    用户数据不缓存（主进程中的指令同样会修改），区域稀有鱼配额通过数据库与其他进程共享。
+    """
+    # 在子进程中导入，避免与 fishing_service 循环导入
+    from ..database.connection_manager import DatabaseConnectionManager
+    from ..repositories.sqlite_user_repo import SqliteUserRepository
+    from ..repositories.sqlite_inventory_repo import SqliteInventoryRepository
+    from ..repositories.sqlite_item_template_repo import SqliteItemTemplateRepository
+    from ..repositories.cached_item_template_repo import CachedItemTemplateRepository
+    from ..repositories.sqlite_log_repo import SqliteLogRepository
+    from .loadout_service import LoadoutService
+    from .zone_quota_service import ZoneQuotaService
+    from .cooldown_service import CooldownService
+    from .fishing_service import FishingService
+
+    db_manager = DatabaseConnectionManager(settings["db_path"], pragmas=settings["pragmas"], read_pool_size=0)
+    user_repo = SqliteUserRepository(db_manager)
+    inventory_repo = SqliteInventoryRepository(db_manager)
+    item_template_repo = CachedItemTemplateRepository(SqliteItemTemplateRepository(db_manager))
+    log_repo = SqliteLogRepository(db_manager)
+    game_config = settings["game_config"]
+    cache_sizes = settings.get("cache_sizes", {})
+    loadout_service = LoadoutService(inventory_repo, item_template_repo, db_manager,
+                                     max_size=cache_sizes.get("loadout", 1000))
+    zone_quota_service = ZoneQuotaService(inventory_repo, db_manager, settings["zone_quota_refresh_seconds"],
+                                          shared=True)
+    cooldown_service = CooldownService(user_repo, loadout_service, db_manager, game_config,
+                                       max_size=cache_sizes.get("cooldown", 1000))
+    fishing_service = FishingService(user_repo, inventory_repo, item_template_repo, log_repo, game_config,
+                                     db_manager, loadout_service, zone_quota_service, cooldown_service)
+    scheduler = fishing_service.auto_fishing_scheduler
+    stop = threading.Event()
+
+    def read_commands() -> None:
+        while True:
+            command = commands.get()
+            action = command[0]
+            if action == "stop":
+                break
+            user_id = command[1]
+            if action == "discard":
+                scheduler.discard(user_id)
+                continue
+            # 主进程修改了该用户的抛竿时间、开关或装备，丢弃本进程的冷却缓存
+            cooldown_service.forget(user_id)
+            if action == "add":
+                scheduler.add(user_id, command[2])
+            elif action == "reschedule":
+                scheduler.reschedule(user_id, command[2])
+        stop.set()
+        scheduler.wake()
+
+    try:
+        seeded = fishing_service.seed_auto_fishing(lambda user_id: shard_for(user_id, shard_count) == index)
+        # 登记完成后再处理主进程的命令，免得被登记时的清空覆盖
+        threading.Thread(target=read_commands, name=f"fishing-auto-worker-{index}-commands", daemon=True).start()
+        logger.info(f"自动钓鱼进程 #{index} 已启动，负责 {seeded} 名用户。")
+
+        casts = 0
+        busy = 0.0
+        window_start = time.monotonic()
+        while not stop.is_set():
+            started = time.monotonic()
+            try:
+                cast_user_ids = fishing_service.run_due_auto_casts()
+            except Exception as e:
+                events.put(("error", index, f"{e}\n{traceback.format_exc()}"))
+                stop.wait(60)
+                continue
+            busy += time.monotonic() - started
+            if cast_user_ids:
+                casts += len(cast_user_ids)
+                events.put(("cast", index, cast_user_ids))
+
+            elapsed = time.monotonic() - window_start
+            if elapsed >= STATS_INTERVAL_SECONDS:
+                popped, lag_total, lag_max = scheduler.take_lag_stats()
+                events.put(("stats", index, {
+                    "interval": elapsed,
+                    "casts": casts,
+                    "casts_per_second": casts / elapsed,
+                    "avg_lag": lag_total / popped if popped else 0.0,
+                    "max_lag": lag_max,
+                    "busy_ratio": busy / elapsed,
+                    "scheduled": scheduler.get_stats()["scheduled"],
+                }))
+                casts = 0
+                busy = 0.0
+                window_start = time.monotonic()
+            scheduler.wait(STATS_INTERVAL_SECONDS - (time.monotonic() - window_start))
+    finally:
+        db_manager.close_all()
@@ -0,0 +1,281 @@
+import random
+import weakref
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖，未安装时批量结算逐个调用 resolve
+    np = None
+
+from ..domain.models import Fish, Rod, Accessory, Bait
+from ..domain.fish_catalog import FishCatalog
+from ..domain.zone_loot import ZoneLootTable, RARITY_LEVELS
+
+# 基础价值低于该值的鱼视为垃圾鱼
+GARBAGE_VALUE_THRESHOLD = 5
+# 达到该稀有度的鱼计入区域每日稀有鱼配额
+RARE_FISH_RARITY = 5
+
+
+@dataclass(frozen=True)
+class CastModifiers:
+    """装备与鱼饵合并后的抛竿修正值。"""
+    base_success_rate: float = 0.7  # 基础成功率70%
+    quality_modifier: float = 1.0  # 质量加成
+    quantity_modifier: float = 1.0  # 数量加成
+    rare_chance: float = 0.0  # 稀有鱼出现几率
+    coins_chance: float = 0.0  # 增加同稀有度高金币出现几率
+    garbage_reduction_modifier: Optional[float] = None  # 垃圾鱼重抽几率，None 表示没有鱼饵效果
+
+    @classmethod
+    def combine(cls, rod: Optional[Rod], accessory: Optional[Accessory],
+                bait: Optional[Bait]) -> "CastModifiers":
+        """按装备鱼竿、饰品、鱼饵的顺序合并各自的加成。"""
+        base_success_rate = 0.7
+        quality_modifier = 1.0
+        quantity_modifier = 1.0
+        rare_chance = 0.0
+        coins_chance = 0.0
+        garbage_reduction_modifier = None
+
+        if rod:
+            quality_modifier *= rod.bonus_fish_quality_modifier
+            quantity_modifier *= rod.bonus_fish_quantity_modifier
+            rare_chance += rod.bonus_rare_fish_chance
+        if accessory:
+            quality_modifier *= accessory.bonus_fish_quality_modifier
+            quantity_modifier *= accessory.bonus_fish_quantity_modifier
+            rare_chance += accessory.bonus_rare_fish_chance
+            coins_chance += accessory.bonus_coin_modifier
+        if bait:
+            quantity_modifier *= bait.quantity_modifier
+            rare_chance += bait.rare_chance_modifier
+            base_success_rate += bait.success_rate_modifier
+            garbage_reduction_modifier = bait.garbage_reduction_modifier
+            coins_chance += bait.value_modifier
+
+        return cls(
+            base_success_rate=base_success_rate,
+            quality_modifier=quality_modifier,
+            quantity_modifier=quantity_modifier,
+            rare_chance=rare_chance,
+            coins_chance=coins_chance,
+            garbage_reduction_modifier=garbage_reduction_modifier,
+        )
+
+
+@dataclass(frozen=True)
+class CastLoadout:
+    """一次抛竿所需的全部输入：修正值、区域掉落表、鱼类目录与区域配额状态。"""
+    modifiers: CastModifiers
+    loot_table: ZoneLootTable
+    fish_catalog: FishCatalog
+    is_rare_fish_available: bool
+
+
+@dataclass(frozen=True)
+class CastOutcome:
+    """一次抛竿的结果。success 为 False 且 error 为空表示什么都没钓到。"""
+    success: bool
+    fish: Optional[Fish] = None
+    weight: int = 0
+    value: int = 0
+    error: Optional[str] = None
+
+    @property
+    def is_rare(self) -> bool:
+        """是否计入区域每日稀有鱼配额。"""
+        return self.fish is not None and self.fish.rarity >= RARE_FISH_RARITY
+
+
+class _CatalogArrays:
+    """鱼类目录的数组形式：按稀有度分段、段内按基础价值降序排列，供向量化抽样使用。"""
+
+    def __init__(self, catalog: FishCatalog):
+        fishes: List[Fish] = []
+        offsets, counts = [], []
+        for rarity in RARITY_LEVELS:
+            group = catalog.get_fishes(rarity)
+            offsets.append(len(fishes))
+            counts.append(len(group))
+            fishes.extend(group)
+        # 不在 1~6 星范围内的鱼只会被兜底的随机抽取选中
+        fishes.extend(fish for fish in catalog.get_all_fishes() if fish.rarity not in RARITY_LEVELS)
+
+        self.fishes: Tuple[Fish, ...] = tuple(fishes)
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.counts = np.array(counts, dtype=np.int64)
+        self.base_values = np.array([fish.base_value for fish in fishes], dtype=np.float64)
+        self.min_weights = np.array([fish.min_weight for fish in fishes], dtype=np.int64)
+        self.max_weights = np.array([fish.max_weight for fish in fishes], dtype=np.int64)
+
+
+class CastResolver:
+    """
+    抛竿结果的纯计算部分。
+
+    只根据 CastLoadout 与随机数生成器计算钓到什么，不读写数据库，
+    可以在任何线程或进程中运行，也可以单独测试和压测。持久化由调用方负责。
+    """
+
+    def __init__(self, rng: Optional[random.Random] = None):
+        """
+        Args:
+            rng: 默认使用的随机数生成器，未指定时使用 random 模块的全局生成器。
+        """
+        self.rng = rng or random
+        self._np_rng = np.random.default_rng() if np is not None else None
+        # 鱼类目录重建后旧的数组随目录一起释放
+        self._catalog_arrays: "weakref.WeakKeyDictionary[FishCatalog, _CatalogArrays]" = weakref.WeakKeyDictionary()
+
+    def resolve(self, loadout: CastLoadout, rng: Optional[random.Random] = None) -> CastOutcome:
+        rng = rng or self.rng
+        modifiers = loadout.modifiers
+
+        # 判断是否成功钓到
+        if rng.random() >= modifiers.base_success_rate:
+            return CastOutcome(success=False)
+
+        rarity_sampler = loadout.loot_table.get_sampler(modifiers.rare_chance, loadout.is_rare_fish_available)
+        fish_catalog = loadout.fish_catalog
+        # 从指定稀有度的鱼类中随机选择一条，并同时应用金币加成 -> 优先选取金币值高的
+        fish_template = fish_catalog.pick(rarity_sampler.draw(rng), modifiers.coins_chance, rng)
+        if fish_template is None:
+            # 鱼列表为空的备选方案
+            fish_template = fish_catalog.random_fish(rng)
+        if fish_template is None:
+            return CastOutcome(success=False, error="错误：鱼类模板库为空！")
+
+        # 如果有垃圾鱼减少修正，则根据修正值决定是否重新选择一次
+        if (modifiers.garbage_reduction_modifier is not None
+                and fish_template.base_value < GARBAGE_VALUE_THRESHOLD
+                and rng.random() < modifiers.garbage_reduction_modifier):
+            new_fish_template = fish_catalog.pick(rarity_sampler.draw(rng), modifiers.coins_chance, rng)
+            if new_fish_template is not None:
+                fish_template = new_fish_template
+
+        # 计算最终属性
+        weight = rng.randint(fish_template.min_weight, fish_template.max_weight)
+        value = int(fish_template.base_value * modifiers.quality_modifier)
+        return CastOutcome(success=True, fish=fish_template, weight=weight, value=value)
+
+    def resolve_batch(self, loadouts: List[CastLoadout], rng: Optional["np.random.Generator"] = None) -> List[CastOutcome]:
+        """
+        一次计算多次抛竿的结果，结果与 loadouts 一一对应。
+
+        安装了 numpy 时按数组整体计算：成功判定、逆 CDF 稀有度抽样、按价值排名选鱼、垃圾鱼重抽与重量抽取
+        都是向量运算，各项概率分布与 resolve 完全一致（随机数序列不同）。未安装 numpy 时逐个调用 resolve。
+        """
+        if np is None:
+            return [self.resolve(loadout) for loadout in loadouts]
+        rng = rng or self._np_rng
+
+        # 同一批次通常共用一个鱼类目录，按目录分组计算
+        first_catalog = loadouts[0].fish_catalog if loadouts else None
+        if all(loadout.fish_catalog is first_catalog for loadout in loadouts):
+            return self._resolve_vectorized(loadouts, rng) if loadouts else []
+        groups: Dict[int, List[int]] = {}
+        for i, loadout in enumerate(loadouts):
+            groups.setdefault(id(loadout.fish_catalog), []).append(i)
+        outcomes: List[Optional[CastOutcome]] = [None] * len(loadouts)
+        for indices in groups.values():
+            group = [loadouts[i] for i in indices]
+            for i, outcome in zip(indices, self._resolve_vectorized(group, rng)):
+                outcomes[i] = outcome
+        return outcomes
+
+    def _get_catalog_arrays(self, catalog: FishCatalog) -> _CatalogArrays:
+        arrays = self._catalog_arrays.get(catalog)
+        if arrays is None:
+            arrays = self._catalog_arrays[catalog] = _CatalogArrays(catalog)
+        return arrays
+
+    def _resolve_vectorized(self, loadouts: List[CastLoadout], rng: "np.random.Generator") -> List[CastOutcome]:
+        n = len(loadouts)
+        arrays = self._get_catalog_arrays(loadouts[0].fish_catalog)
+        modifiers = [loadout.modifiers for loadout in loadouts]
+
+        # 1. 成功判定
+        success_rate = np.fromiter((m.base_success_rate for m in modifiers), dtype=np.float64, count=n)
+        caught = np.flatnonzero(rng.random(n) < success_rate).tolist()
+        outcomes = [CastOutcome(success=False)] * n
+        if not caught:
+            return outcomes
+        if not arrays.fishes:
+            for i in caught:
+                outcomes[i] = CastOutcome(success=False, error="错误：鱼类模板库为空！")
+            return outcomes
+        m = len(caught)
+
+        # 2. 每种 (掉落表, 稀有度加成, 配额状态) 组合只计算一次累积分布
+        cdf_rows, cdf_index = [], {}
+
+        def cdf_row(loadout: CastLoadout) -> int:
+            key = (id(loadout.loot_table), loadout.modifiers.rare_chance, loadout.is_rare_fish_available)
+            row = cdf_index.get(key)
+            if row is None:
+                distribution = np.array(
+                    loadout.loot_table.get_distribution(loadout.modifiers.rare_chance, loadout.is_rare_fish_available)
+                )
+                cdf = np.cumsum(distribution)
+                # 最后一个正权重之后的累积值置为 1，避免浮点误差抽中权重为 0 的稀有度
+                cdf[np.flatnonzero(distribution > 0)[-1]:] = 1.0
+                row = cdf_index[key] = len(cdf_rows)
+                cdf_rows.append(cdf)
+            return row
+
+        row_of = np.fromiter((cdf_row(loadouts[i]) for i in caught), dtype=np.int64, count=m)
+        cdf_table = np.array(cdf_rows)[row_of]
+
+        caught_modifiers = [modifiers[i] for i in caught]
+        coins_chance = np.fromiter((c.coins_chance for c in caught_modifiers), dtype=np.float64, count=m)
+        quality = np.fromiter((c.quality_modifier for c in caught_modifiers), dtype=np.float64, count=m)
+        garbage = np.fromiter(
+            (np.nan if c.garbage_reduction_modifier is None else c.garbage_reduction_modifier
+             for c in caught_modifiers),
+            dtype=np.float64, count=m
+        )
+
+        # 3. 选鱼，稀有度没有鱼时从全部鱼中随机兜底
+        fish_index = self._pick_fish(arrays, self._draw_rarity(cdf_table, rng), coins_chance, rng)
+        missing = fish_index < 0
+        if missing.any():
+            fish_index[missing] = rng.integers(0, len(arrays.fishes), size=int(missing.sum()))
+
+        # 4. 垃圾鱼重抽：只在新稀有度有鱼时替换
+        reroll = (~np.isnan(garbage)) & (arrays.base_values[fish_index] < GARBAGE_VALUE_THRESHOLD)
+        reroll_at = np.flatnonzero(reroll)
+        if reroll_at.size:
+            reroll_at = reroll_at[rng.random(reroll_at.size) < garbage[reroll_at]]
+        if reroll_at.size:
+            new_index = self._pick_fish(
+                arrays, self._draw_rarity(cdf_table[reroll_at], rng), coins_chance[reroll_at], rng
+            )
+            keep = new_index >= 0
+            fish_index[reroll_at[keep]] = new_index[keep]
+
+        # 5. 重量与价值
+        weights = rng.integers(arrays.min_weights[fish_index], arrays.max_weights[fish_index] + 1)
+        values = (arrays.base_values[fish_index] * quality).astype(np.int64)
+
+        fishes = arrays.fishes
+        for i, fish, weight, value in zip(caught, fish_index.tolist(), weights.tolist(), values.tolist()):
+            outcomes[i] = CastOutcome(success=True, fish=fishes[fish], weight=weight, value=value)
+        return outcomes
+
+    @staticmethod
+    def _draw_rarity(cdf_table: "np.ndarray", rng: "np.random.Generator") -> "np.ndarray":
+        """逆 CDF 抽样，返回稀有度在 RARITY_LEVELS 中的下标。"""
+        u = rng.random(cdf_table.shape[0])
+        return (cdf_table <= u[:, None]).sum(axis=1)
+
+    @staticmethod
+    def _pick_fish(arrays: _CatalogArrays, rarity_index: "np.ndarray", coins_chance: "np.ndarray",
+                   rng: "np.random.Generator") -> "np.ndarray":
+        """按价值排名选鱼并应用金币加成，与 FishCatalog.pick 相同；该稀有度没有鱼时为 -1。"""
+        counts = arrays.counts[rarity_index]
+        rank = (rng.random(rarity_index.size) * np.maximum(counts, 1)).astype(np.int64)
+        shifted = (coins_chance > 0) & (rng.random(rarity_index.size) <= coins_chance)
+        rank = np.where(shifted, np.minimum(rank + 1, counts - 1), rank)
+        return np.where(counts > 0, arrays.offsets[rarity_index] + rank, -1)
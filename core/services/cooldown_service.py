@@ -0,0 +1,138 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from ..repositories.abstract_repository import AbstractUserRepository, AbstractUnitOfWork
+from ..domain.models import User
+from .loadout_service import LoadoutService
+
+# last_fishing_time 由 get_now() 写入，旧数据中没有时区信息的时间同样按北京时间处理
+_BEIJING_TZ = timezone(timedelta(hours=8))
+
+
+def _to_epoch(dt: Optional[datetime]) -> float:
+    if dt is None:
+        return 0.0
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=_BEIJING_TZ)
+    return dt.timestamp()
+
+
+class CooldownService:
+    """
+    钓鱼冷却检查。
+
+    内存中按用户保存上次抛竿时间（Unix 时间戳）与生效的冷却时长，/钓鱼 指令与自动钓鱼共用。
+    冷却中的抛竿请求直接在内存中拒绝，不访问数据库。
+    抛竿写入 last_fishing_time 后调用 record_cast 同步；装备快照作废时（可能换下了海洋之心）
+    丢弃该用户的条目，下次检查时重新加载。最多保存 max_size 个用户，超出时淘汰最久未使用的用户。
+    """
+
+    def __init__(
+        self,
+        user_repo: AbstractUserRepository,
+        loadout_service: LoadoutService,
+        unit_of_work: AbstractUnitOfWork,
+        config: Dict[str, Any],
+        max_size: int = 1000
+    ):
+        self.user_repo = user_repo
+        self.loadout_service = loadout_service
+        self.unit_of_work = unit_of_work
+        self.base_cooldown = config.get("fishing", {}).get("cooldown_seconds", 180)
+        self.max_size = max(1, int(max_size))
+
+        # user_id -> (上次抛竿时间戳, 冷却秒数)
+        self._entries: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        # 正在加载条目的用户及进行中的加载数
+        self._loading: Dict[str, int] = {}
+        # 加载期间用户的条目被更新或丢弃的次数，若有变化则放弃回填；只记录正在加载的用户
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+        loadout_service.add_listener(self.forget)
+
+    def get_stats(self) -> Dict[str, int]:
+        """返回命中、未命中次数与当前缓存数量。"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+    def get_remaining(self, user_id: str, user: Optional[User] = None) -> Optional[float]:
+        """
+        返回用户还需等待的秒数，冷却已结束时为 0；用户不存在时返回 None。
+        调用方已加载用户时可传入 user，缓存未命中时不再重复读取。
+        """
+        entry = self.get_schedule(user_id, user)
+        if entry is None:
+            return None
+        last_cast, cooldown = entry
+        return max(0.0, last_cast + cooldown - time.time())
+
+    def get_schedule(self, user_id: str, user: Optional[User] = None) -> Optional[Tuple[float, float]]:
+        """返回 (上次抛竿时间戳, 生效的冷却秒数)；用户不存在时返回 None。"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            self._loading[user_id] = self._loading.get(user_id, 0) + 1
+            version = self._versions.get(user_id, 0)
+
+        try:
+            if user is None:
+                user = self.user_repo.get_by_id(user_id)
+            if user:
+                cooldown = self.base_cooldown * self.loadout_service.get_loadout(user).cooldown_multiplier
+                entry = (_to_epoch(user.last_fishing_time), cooldown)
+        finally:
+            with self._lock:
+                if entry is not None and self._versions.get(user_id, 0) == version:
+                    self._entries[user_id] = entry
+                    self._entries.move_to_end(user_id)
+                    while len(self._entries) > self.max_size:
+                        self._entries.popitem(last=False)
+                self._finish_load(user_id)
+        return entry
+
+    def get_next_eligible(self, user_id: str, user: Optional[User] = None) -> Optional[float]:
+        """返回用户冷却结束的时间戳；用户不存在时返回 None。"""
+        remaining = self.get_remaining(user_id, user)
+        return None if remaining is None else time.time() + remaining
+
+    def _finish_load(self, user_id: str) -> None:
+        """结束一次加载，没有其他进行中的加载时不再记录该用户的变化次数。需在持有 _lock 时调用。"""
+        remaining = self._loading.pop(user_id) - 1
+        if remaining:
+            self._loading[user_id] = remaining
+        else:
+            self._versions.pop(user_id, None)
+
+    def _record_change(self, user_id: str) -> None:
+        """记录一次更新或丢弃，使进行中的加载放弃回填。需在持有 _lock 时调用。"""
+        if user_id in self._loading:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def record_cast(self, user_id: str, cast_time: datetime) -> None:
+        """抛竿写入 last_fishing_time 后调用，在事务提交后（不在事务中则立即）更新内存中的时间。"""
+        epoch = _to_epoch(cast_time)
+        self.unit_of_work.after_commit(lambda: self._set_last_cast(user_id, epoch))
+
+    def _set_last_cast(self, user_id: str, epoch: float) -> None:
+        with self._lock:
+            self._record_change(user_id)
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries[user_id] = (epoch, entry[1])
+
+    def forget(self, user_id: str) -> None:
+        """丢弃用户的冷却条目，下次检查时重新加载。"""
+        with self._lock:
+            self._record_change(user_id)
+            self._entries.pop(user_id, None)
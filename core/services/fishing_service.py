@@ -1,8 +1,7 @@
-import random
-import threading
 import time
-from typing import Dict, Any, Optional
-from datetime import  timedelta
+from datetime import datetime, timedelta, timezone
+from dataclasses import dataclass, field, replace
+from typing import Callable, Dict, Any, Optional, List, Tuple, Union
 from astrbot.api import logger
 
 # 导入仓储接口和领域模型
@@ -10,10 +9,46 @@ from ..repositories.abstract_repository import (
     AbstractUserRepository,
     AbstractInventoryRepository,
     AbstractItemTemplateRepository,
-    AbstractLogRepository
+    AbstractLogRepository,
+    AbstractUnitOfWork
 )
-from ..domain.models import FishingRecord, TaxRecord
-from ..utils import get_now, get_fish_template, get_today
+from ..domain.models import FishingRecord, TaxRecord, User, AutoFishingDigest
+from ..utils import get_now
+from .cast_resolver import CastResolver, CastLoadout, CastOutcome
+from .loadout_service import LoadoutService
+from .cooldown_service import CooldownService
+from .auto_fishing_scheduler import AutoFishingScheduler
+from .auto_fishing_workers import AutoFishingCoordinator
+from .job_scheduler import JobScheduler
+from .zone_quota_service import ZoneQuotaService
+
+# 自动钓鱼每个事务中批量结算的最大抛竿数
+AUTO_FISHING_BATCH_SIZE = 500
+# 自动钓鱼抛竿未成功扣费（如金币不够区域费用）时，重试前等待的秒数
+AUTO_FISHING_RETRY_SECONDS = 40
+# 调度队列为空时，自动钓鱼任务最长的空闲间隔（秒）；登记了更早到期的用户时会被提前唤醒
+AUTO_FISHING_IDLE_SECONDS = 600
+
+_BEIJING_TZ = timezone(timedelta(hours=8))
+
+
+@dataclass
+class _CatchBatch:
+    """自动钓鱼批量结算时待写入的数据。自动钓鱼不写逐条钓鱼记录，只累加每小时汇总。"""
+    # 批次开始时各用户鱼塘中鱼的总数；为 None 时渔获逐条入库（同一用户在批次中多次抛竿）
+    pond_counts: Optional[Dict[str, int]]
+    # (user_id, fish_id, quantity)
+    fish_items: List[Tuple[str, int, int]] = field(default_factory=list)
+    # (user_id, 整点时间) -> 每小时汇总
+    digests: Dict[Tuple[str, datetime], AutoFishingDigest] = field(default_factory=dict)
+
+    def add_cast(self, user_id: str, cast_time: datetime, fish_id: Optional[int] = None,
+                 weight: int = 0, value: int = 0) -> None:
+        hour_start = cast_time.replace(minute=0, second=0, microsecond=0)
+        digest = self.digests.get((user_id, hour_start))
+        if digest is None:
+            digest = self.digests[(user_id, hour_start)] = AutoFishingDigest(user_id=user_id, hour_start=hour_start)
+        digest.add_cast(fish_id, weight, value, cast_time)
 
 
 class FishingService:
@@ -25,18 +60,33 @@ class FishingService:
         inventory_repo: AbstractInventoryRepository,
         item_template_repo: AbstractItemTemplateRepository,
         log_repo: AbstractLogRepository,
-        config: Dict[str, Any]
+        config: Dict[str, Any],
+        unit_of_work: AbstractUnitOfWork,
+        loadout_service: LoadoutService,
+        zone_quota_service: ZoneQuotaService,
+        cooldown_service: CooldownService,
+        auto_fishing_coordinator: Optional[AutoFishingCoordinator] = None
     ):
         self.user_repo = user_repo
         self.inventory_repo = inventory_repo
         self.item_template_repo = item_template_repo
         self.log_repo = log_repo
         self.config = config
-
-        self.today = get_today()
-        # 自动钓鱼线程相关属性
-        self.auto_fishing_thread: Optional[threading.Thread] = None
-        self.auto_fishing_running = False
+        self.unit_of_work = unit_of_work
+        self.loadout_service = loadout_service
+        self.zone_quota_service = zone_quota_service
+        self.cooldown_service = cooldown_service
+        self.cast_resolver = CastResolver()
+
+        # 离线结算模式：后台任务不逐次抛竿，用户互动或定期巡检时一次补算错过的自动抛竿
+        fishing_config = config.get("fishing", {})
+        self.accrual_mode = bool(fishing_config.get("accrual_mode", False))
+        self.accrual_sweep_interval = max(60, int(fishing_config.get("accrual_sweep_minutes", 30)) * 60)
+        # 开启自动钓鱼的用户按下次可抛竿时间排队；配置了分片进程时由协调器转发给对应进程
+        self.auto_fishing_sharded = auto_fishing_coordinator is not None
+        self.auto_fishing_scheduler: Union[AutoFishingScheduler, AutoFishingCoordinator] = (
+            auto_fishing_coordinator if auto_fishing_coordinator is not None else AutoFishingScheduler()
+        )
 
     def toggle_auto_fishing(self, user_id: str) -> Dict[str, Any]:
         """
@@ -48,13 +98,22 @@ class FishingService:
         Returns:
             一个包含操作结果的字典。
         """
+        # 关闭前先结算开启期间错过的自动抛竿
+        self.settle_accrued_casts(user_id)
+
         user = self.user_repo.get_by_id(user_id)
         if not user:
             return {"success": False, "message": "❌您还没有注册，请先使用 /注册 命令注册。"}
 
         user.auto_fishing_enabled = not user.auto_fishing_enabled
+        user.auto_fishing_since = int(time.time()) if user.auto_fishing_enabled else None
         self.user_repo.update(user)
 
+        if not user.auto_fishing_enabled:
+            self.auto_fishing_scheduler.discard(user_id)
+        elif not self.accrual_mode:
+            self.auto_fishing_scheduler.add(user_id, self.cooldown_service.get_next_eligible(user_id, user))
+
         if user.auto_fishing_enabled:
             return {"success": True, "message": "🎣 自动钓鱼已开启！"}
         else:
@@ -70,201 +129,190 @@ class FishingService:
         Returns:
             一个包含结果的字典。
         """
-        user = self.user_repo.get_by_id(user_id)
-        if not user:
-            return {"success": False, "message": "用户不存在，无法钓鱼。"}
+        # 一次抛竿的所有仓储调用共享同一个事务，只提交一次
+        with self.unit_of_work.transaction():
+            user = self.user_repo.get_by_id(user_id)
+            if not user:
+                return {"success": False, "message": "用户不存在，无法钓鱼。"}
+
+            loadout, error = self._prepare_cast(user)
+            if error:
+                return error
+
+            # 3. 计算抛竿结果
+            outcome = self._reserve_rare_quota(user, loadout, self.cast_resolver.resolve(loadout))
+            return self._settle_cast(user, outcome)
+
+    def _prepare_cast(self, user: User,
+                      now: Optional[float] = None) -> Tuple[Optional[CastLoadout], Optional[Dict[str, Any]]]:
+        """
+        扣除成本、处理鱼饵并组装抛竿输入。
+        now 为抛竿时刻（Unix 时间戳），用于判断限时鱼饵是否过期，默认为当前时间。
 
+        Returns:
+            (loadout, error)：无法抛竿时 error 为返回给用户的结果字典。
+        """
         # 1. 检查成本
-        fishing_cost = self.config.get("fishing", {}).get("cost", 10) + (user.fishing_zone_id - 1) * 50
+        fishing_cost = (self.config.get("fishing", {}).get("cost", 10)
+                        + self.zone_quota_service.get_extra_cost(user.fishing_zone_id))
         if not user.can_afford(fishing_cost):
-            return {"success": False, "message": f"金币不足，需要 {fishing_cost} 金币。"}
+            return None, {"success": False, "message": f"金币不足，需要 {fishing_cost} 金币。"}
 
         # 先扣除成本
         user.coins -= fishing_cost
 
-        # 2. 计算各种加成和修正值
-        base_success_rate = 0.7 # 基础成功率70%
-        quality_modifier = 1.0 # 质量加成
-        quantity_modifier = 1.0 # 数量加成
-        rare_chance = 0.0 # 稀有鱼出现几率
-        coins_chance = 0.0 # 增加同稀有度高金币出现几率
-
-        # 获取装备鱼竿并应用加成
-        equipped_rod_instance = self.inventory_repo.get_user_equipped_rod(user.user_id)
-        if equipped_rod_instance:
-            rod_template = self.item_template_repo.get_rod_by_id(equipped_rod_instance.rod_id)
-            if rod_template:
-                quality_modifier *= rod_template.bonus_fish_quality_modifier
-                quantity_modifier *= rod_template.bonus_fish_quantity_modifier
-                rare_chance += rod_template.bonus_rare_fish_chance
-
-        # 获取装备饰品并应用加成
-        equipped_accessory_instance = self.inventory_repo.get_user_equipped_accessory(user.user_id)
-        if equipped_accessory_instance:
-            acc_template = self.item_template_repo.get_accessory_by_id(equipped_accessory_instance.accessory_id)
-            if acc_template:
-                quality_modifier *= acc_template.bonus_fish_quality_modifier
-                quantity_modifier *= acc_template.bonus_fish_quantity_modifier
-                rare_chance += acc_template.bonus_rare_fish_chance
-                coins_chance += acc_template.bonus_coin_modifier
+        # 2. 读取装备快照中合并好的加成和修正值
+        equipment = self.loadout_service.get_loadout(user)
+        # 装备快照已核实鱼竿和饰品是否真实存在，已不存在的装备从用户记录中清除
+        if user.equipped_rod_instance_id and equipment.rod_instance_id is None:
+            user.equipped_rod_instance_id = None
+        if user.equipped_accessory_instance_id and equipment.accessory_instance_id is None:
+            user.equipped_accessory_instance_id = None
 
         # 获取鱼饵并应用加成
         cur_bait_id = user.current_bait_id
-        garbage_reduction_modifier = None
+        modifiers = equipment.modifiers
         if cur_bait_id is None:
             # 随机获取一个库存鱼饵
             random_bait_id = self.inventory_repo.get_random_bait(user.user_id)
             if random_bait_id:
-                bait_template = self.item_template_repo.get_bait_by_id(random_bait_id)
+                random_bait_template = self.item_template_repo.get_bait_by_id(random_bait_id)
                 user.current_bait_id = random_bait_id
-                if bait_template:
-                    quantity_modifier *= bait_template.quantity_modifier
-                    rare_chance += bait_template.rare_chance_modifier
-                    base_success_rate += bait_template.success_rate_modifier
-                    garbage_reduction_modifier = bait_template.garbage_reduction_modifier
-                    coins_chance += bait_template.value_modifier
+                modifiers = equipment.with_bait(random_bait_template)
 
         # 判断鱼饵是否过期
         if user.current_bait_id is not None:
-            bait_template = self.item_template_repo.get_bait_by_id(cur_bait_id)
+            # 快照中的鱼饵即 cur_bait_id 对应的模板，随机鱼饵时为 None
+            bait_template = equipment.bait
             if bait_template and bait_template.duration_minutes > 0:
-                # 检查鱼饵是否过期
-                bait_expiry_time = user.bait_start_time
-                if bait_expiry_time:
-                    now = get_now()
-                    expiry_time = bait_expiry_time + timedelta(minutes=bait_template.duration_minutes)
-                    # 移除两个时间的时区信息
-                    if now.tzinfo is not None:
-                        now = now.replace(tzinfo=None)
-                    if expiry_time.tzinfo is not None:
-                        expiry_time = expiry_time.replace(tzinfo=None)
-                    if now > expiry_time:
-                        # 鱼饵已过期，清除当前鱼饵
-                        user.current_bait_id = None
-                        user.bait_start_time = None
-                        self.user_repo.update(user)
-                        return {"success": False, "message": "❌ 鱼饵已过期，请重新使用鱼饵。"}
+                # 检查鱼饵是否过期，过期时间在使用鱼饵时已算好
+                if user.bait_expires_at is None and user.bait_start_time:
+                    # 模板在使用后才改为限时鱼饵时只有开始时间，补算一次
+                    user.bait_expires_at = (int(user.bait_start_time.timestamp())
+                                            + bait_template.duration_minutes * 60)
+                if user.bait_expires_at is not None and (time.time() if now is None else now) > user.bait_expires_at:
+                    # 鱼饵已过期，清除当前鱼饵
+                    self._clear_bait(user)
+                    self.user_repo.update(user)
+                    return None, {"success": False, "message": "❌ 鱼饵已过期，请重新使用鱼饵。"}
             else:
                 if bait_template:
                     # 如果鱼饵没有设置持续时间, 是一次性鱼饵，消耗一个鱼饵
-                    self.inventory_repo.update_bait_quantity(user_id, user.current_bait_id, -1)
+                    if self.inventory_repo.consume_bait(user.user_id, user.current_bait_id) is None:
+                        # 鱼饵已经用完，本次不再使用鱼饵
+                        self._clear_bait(user)
                 else:
                     # 如果鱼饵模板不存在，清除当前鱼饵
-                    user.current_bait_id = None
-                    user.bait_start_time = None
+                    self._clear_bait(user)
                     self.user_repo.update(user)
-                    logger.warning(f"用户 {user_id} 的当前鱼饵已被清除，因为鱼饵模板不存在。")
-
-
-        # 3. 判断是否成功钓到
-        if random.random() >= base_success_rate:
+                    logger.warning(f"用户 {user.user_id} 的当前鱼饵已被清除，因为鱼饵模板不存在。")
+
+        # 区域未配置掉落表时沿用区域一的分布
+        loot_table = (self.item_template_repo.get_zone_loot_table(user.fishing_zone_id)
+                      or self.item_template_repo.get_zone_loot_table(1))
+        if loot_table is None:
+            return None, {"success": False, "message": "错误：钓鱼区域的掉落表未配置！"}
+        loadout = CastLoadout(
+            modifiers=modifiers,
+            loot_table=loot_table,
+            fish_catalog=self.item_template_repo.get_fish_catalog(),
+            is_rare_fish_available=self.zone_quota_service.is_available(user.fishing_zone_id),
+        )
+        return loadout, None
+
+    @staticmethod
+    def _clear_bait(user: User) -> None:
+        user.current_bait_id = None
+        user.bait_start_time = None
+        user.bait_expires_at = None
+
+    def _reserve_rare_quota(self, user: User, loadout: CastLoadout, outcome: CastOutcome) -> CastOutcome:
+        """钓到稀有鱼时占用区域配额；配额已被其他抛竿用完则按配额用尽的分布重新结算。"""
+        if outcome.is_rare and not self.zone_quota_service.try_reserve(user.fishing_zone_id):
+            return self.cast_resolver.resolve(replace(loadout, is_rare_fish_available=False))
+        return outcome
+
+    def _settle_cast(self, user: User, outcome: CastOutcome, batch: Optional["_CatchBatch"] = None,
+                     cast_time: Optional[datetime] = None) -> Dict[str, Any]:
+        """根据抛竿结果更新用户与渔获，返回给用户的结果字典。cast_time 默认为当前时间。"""
+        if outcome.error:
+            return {"success": False, "message": outcome.error}
+        if not outcome.success:
             # 失败逻辑
-            user.last_fishing_time = get_now()
+            user.last_fishing_time = cast_time or get_now()
             self.user_repo.update(user)
+            self._record_cast(user)
+            if batch is not None:
+                batch.add_cast(user.user_id, user.last_fishing_time)
             return {"success": False, "message": "💨 什么都没钓到..."}
 
-        # 4. 成功，生成渔获
-        # 设置稀有度分布
-        rarity_weights = {
-            1: [0.5, 0.35, 0.14, 0.01, 0, 0],  # 区域一：4星概率极低，5星为0
-            2: [0.5, 0.3, 0.16, 0.038, 0.001, 0.001],  # 区域二：提升4星，引入极低概率5星
-            3: [0.5, 0.3, 0.15, 0.044, 0.003, 0.003]  # 区域三：大幅提升4星和5星
+        # 4. 成功，写入渔获
+        self._persist_catch(user, outcome, batch, cast_time)
+
+        # 5. 构建成功返回结果
+        return {
+            "success": True,
+            "fish": {
+                "name": outcome.fish.name,
+                "rarity": outcome.fish.rarity,
+                "weight": outcome.weight,
+                "value": outcome.value
+            }
         }
-        current_weights = rarity_weights.get(user.fishing_zone_id, rarity_weights[1])
-        # 根据权重生成稀有度
-        rarity_distribution = current_weights.copy()
-        # 应用稀有度加成
-        if rare_chance > 0.0:
-            # 增加稀有鱼出现的几率
-            rarity_distribution = [x + rare_chance for x in rarity_distribution]
-            # 归一化概率分布
-            total = sum(rarity_distribution)
-            rarity_distribution = [x / total for x in rarity_distribution]
-        zone = self.inventory_repo.get_zone_by_id(user.fishing_zone_id)
-        is_rare_fish_available = zone.rare_fish_caught_today < zone.daily_rare_fish_quota
-        if not is_rare_fish_available:
-            # 如果稀有鱼已达上限，则将5星鱼的权重设为0
-            rarity_distribution[4] = 0.0
-            rarity_distribution[5] = 0.0
-            # 重新归一化概率分布
-            total = sum(rarity_distribution)
-            if total > 0:
-                rarity_distribution = [x / total for x in rarity_distribution]
-        rarity = random.choices(
-            [1, 2, 3, 4, 5, 6],
-            weights=rarity_distribution,
-            k=1
-        )[0]
-        fish_list = self.item_template_repo.get_fishes_by_rarity(rarity)
-        # 从指定稀有度的鱼类中随机选择一条，并同时应用金币加成 -> 优先选取金币值高的
-        fish_template = None
-        if fish_list:
-            fish_template = get_fish_template(fish_list, coins_chance)
-        else:
-            # 鱼列表为空的备选方案
-            fish_template = self.item_template_repo.get_random_fish()
-
-        if not fish_template:
-             return {"success": False, "message": "错误：鱼类模板库为空！"}
-
-        # 如果有垃圾鱼减少修正，则应用，价值 < 5则被视为垃圾鱼
-        if garbage_reduction_modifier is not None and fish_template.base_value < 5:
-            # 根据垃圾鱼减少修正值决定是否重新选择一次
-            if random.random() < garbage_reduction_modifier:
-                # 重新选择一条鱼
-                new_rarity = random.choices(
-                    [1, 2, 3, 4, 5, 6],
-                    weights=rarity_distribution,
-                    k=1
-                )[0]
-                new_fish_list = self.item_template_repo.get_fishes_by_rarity(new_rarity)
-
-                if new_fish_list:
-                    fish_template = get_fish_template(new_fish_list, coins_chance)
-
-        # 计算最终属性
-        weight = random.randint(fish_template.min_weight, fish_template.max_weight)
-        value = int(fish_template.base_value * quality_modifier)
+
+    def _record_cast(self, user: User) -> None:
+        """抛竿写入 last_fishing_time 后同步内存中的冷却，已在自动钓鱼队列中的用户随之改期。"""
+        user_id = user.user_id
+        auto_fishing_enabled = user.auto_fishing_enabled
+        self.cooldown_service.record_cast(user_id, user.last_fishing_time)
+
+        def reschedule():
+            # 分片模式下改期要发给子进程，未开启自动钓鱼的用户不必发送
+            if auto_fishing_enabled and user_id in self.auto_fishing_scheduler:
+                next_eligible = self.cooldown_service.get_next_eligible(user_id)
+                if next_eligible is not None:
+                    self.auto_fishing_scheduler.reschedule(user_id, next_eligible)
+
+        self.unit_of_work.after_commit(reschedule)
+
+    def _persist_catch(self, user: User, outcome: CastOutcome, batch: Optional["_CatchBatch"] = None,
+                       cast_time: Optional[datetime] = None) -> None:
+        """
+        把一次成功的抛竿结果写入数据库，需在调用方的事务中执行。
+        传入 batch 时为自动钓鱼：不写钓鱼记录，只累加到每小时汇总，
+        batch.pond_counts 不为 None 时渔获也先收集起来，由 _flush_catch_batch 批量写入。
+        稀有鱼配额已在 _reserve_rare_quota 中占用。
+        """
+        fish_template = outcome.fish
+        weight = outcome.weight
+        value = outcome.value
+        bulk = batch is not None and batch.pond_counts is not None
 
         # 计算一下是否超过用户鱼塘容量
-        user_fish_inventory = self.inventory_repo.get_fish_inventory(user.user_id)
-        if user.fish_pond_capacity == sum(item.quantity for item in user_fish_inventory):
-            # 随机删除用户的一条鱼
-            random_fish = random.choice(user_fish_inventory)
-            self.inventory_repo.update_fish_quantity(
-                user.user_id,
-                random_fish.fish_id,
-                -1
-            )
-
-        if fish_template.rarity >= 5:
-            # 如果是5星鱼，增加用户的稀有鱼捕获计数
-            zone = self.inventory_repo.get_zone_by_id(user.fishing_zone_id)
-            if zone:
-                zone.rare_fish_caught_today += 1
-                self.inventory_repo.update_fishing_zone(zone)
-        # 5. 更新数据库
-        self.inventory_repo.add_fish_to_inventory(user.user_id, fish_template.fish_id)
+        if bulk:
+            pond_count = batch.pond_counts.get(user.user_id, 0)
+        else:
+            pond_count = self.inventory_repo.get_fish_pond_count(user.user_id)
+        if pond_count >= user.fish_pond_capacity:
+            # 鱼塘已满，按数量加权随机删除用户的一条鱼
+            self.inventory_repo.remove_random_fish(user.user_id)
+
+        if bulk:
+            batch.fish_items.append((user.user_id, fish_template.fish_id, 1))
+        else:
+            self.inventory_repo.add_fish_to_inventory(user.user_id, fish_template.fish_id)
 
         # 更新用户统计数据
         user.total_fishing_count += 1
         user.total_weight_caught += weight
         user.total_coins_earned += value
-        user.last_fishing_time = get_now()
+        user.last_fishing_time = cast_time or get_now()
         self.user_repo.update(user)
+        self._record_cast(user)
 
-        # 判断用户的鱼竿和饰品是否真实存在
-        if user.equipped_rod_instance_id:
-            rod_instance = self.inventory_repo.get_user_rod_instance_by_id(user.user_id, user.equipped_rod_instance_id)
-            if not rod_instance:
-                user.equipped_rod_instance_id = None
-        if user.equipped_accessory_instance_id:
-            accessory_instance = self.inventory_repo.get_user_accessory_instance_by_id(user.user_id, user.equipped_accessory_instance_id)
-            if not accessory_instance:
-                user.equipped_accessory_instance_id = None
-
-        # 更新用户信息
-        self.user_repo.update(user)
+        if batch is not None:
+            batch.add_cast(user.user_id, user.last_fishing_time, fish_template.fish_id, weight, value)
+            return
 
         # 记录日志
         record = FishingRecord(
@@ -280,16 +328,121 @@ class FishingService:
         )
         self.log_repo.add_fishing_record(record)
 
-        # 6. 构建成功返回结果
-        return {
-            "success": True,
-            "fish": {
-                "name": fish_template.name,
-                "rarity": fish_template.rarity,
-                "weight": weight,
-                "value": value
-            }
-        }
+    def _flush_catch_batch(self, batch: "_CatchBatch") -> None:
+        """批量写入 _persist_catch 收集的渔获与自动钓鱼汇总。"""
+        if batch.fish_items:
+            self.inventory_repo.add_fish_to_inventory_bulk(batch.fish_items)
+        if batch.digests:
+            self.log_repo.add_auto_fishing_digests(list(batch.digests.values()))
+
+    def resolve_casts(self, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        批量结算多名用户各一次抛竿。
+
+        逐个用户扣费并组装抛竿输入后，用 CastResolver.resolve_batch 一次算出全部结果
+        （安装了 numpy 时为向量化计算），再在同一个事务中批量写回。
+        这是自动钓鱼的结算路径，不写逐条钓鱼记录，只累加到每小时汇总。
+        冷却与自动钓鱼开关由调用方判断。
+
+        Returns:
+            以用户ID为键、与 go_fish 相同格式的结果字典。
+        """
+        results: Dict[str, Dict[str, Any]] = {}
+        with self.unit_of_work.transaction():
+            casts = []
+            for user_id in dict.fromkeys(user_ids):
+                user = self.user_repo.get_by_id(user_id)
+                if not user:
+                    results[user_id] = {"success": False, "message": "用户不存在，无法钓鱼。"}
+                    continue
+                loadout, error = self._prepare_cast(user)
+                if error:
+                    results[user_id] = error
+                    continue
+                casts.append((user, loadout))
+            if not casts:
+                return results
+
+            outcomes = self.cast_resolver.resolve_batch([loadout for _, loadout in casts])
+            batch = _CatchBatch(pond_counts=self.inventory_repo.get_fish_pond_counts(
+                [user.user_id for (user, _), outcome in zip(casts, outcomes) if outcome.success]
+            ))
+            for (user, loadout), outcome in zip(casts, outcomes):
+                # 同一批次中前面的抛竿可能已用完配额
+                outcome = self._reserve_rare_quota(user, loadout, outcome)
+                results[user.user_id] = self._settle_cast(user, outcome, batch)
+            self._flush_catch_batch(batch)
+        return results
+
+    def settle_accrued_casts(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        离线结算模式下，补算用户自上次抛竿（或开启自动钓鱼）以来错过的自动抛竿。
+
+        按冷却时间推出每次抛竿的时刻，逐次扣费、消耗鱼饵后用 CastResolver.resolve_batch
+        一次抽样全部结果，再逐条写入，鱼塘容量与区域稀有鱼配额与逐次抛竿时相同。
+        全部写入在一个事务中完成，单次最多结算 AUTO_FISHING_BATCH_SIZE 次，余下的留到下次。
+        未开启离线结算、用户未开启自动钓鱼或还在冷却中时返回 None，不访问数据库。
+
+        Returns:
+            {"casts": 抛竿次数, "fish_count": 钓到的鱼数, "coins_earned": 渔获价值}
+        """
+        if not self.accrual_mode:
+            return None
+        # 冷却中的用户在内存中跳过
+        remaining = self.cooldown_service.get_remaining(user_id)
+        if remaining is None or remaining > 0:
+            return None
+
+        cost = self.config.get("fishing", {}).get("cost", 10)
+        with self.unit_of_work.transaction():
+            user = self.user_repo.get_by_id(user_id)
+            if not user or not user.auto_fishing_enabled:
+                return None
+            schedule = self.cooldown_service.get_schedule(user_id, user)
+            if schedule is None:
+                return None
+            last_cast, cooldown = schedule
+            now_ts = time.time()
+            first_cast = max(last_cast + cooldown, user.auto_fishing_since or 0)
+            if first_cast > now_ts:
+                return None
+            count = min(int((now_ts - first_cast) // cooldown) + 1, AUTO_FISHING_BATCH_SIZE)
+
+            casts = []
+            for i in range(count):
+                cast_ts = first_cast + i * cooldown
+                if not user.can_afford(cost):
+                    # 金币不足，关闭其自动钓鱼
+                    user.auto_fishing_enabled = False
+                    user.auto_fishing_since = None
+                    self.user_repo.update(user)
+                    logger.warning(f"用户 {user_id} 金币不足，已关闭自动钓鱼")
+                    break
+                coins_before = user.coins
+                loadout, error = self._prepare_cast(user, now=cast_ts)
+                if error:
+                    if user.coins == coins_before:
+                        # 没有扣费说明金币不够区域费用，之后的抛竿同样无法进行
+                        break
+                    # 鱼饵过期等情况，本次抛竿作废
+                    continue
+                casts.append((loadout, cast_ts))
+            if not casts:
+                return None
+
+            outcomes = self.cast_resolver.resolve_batch([loadout for loadout, _ in casts])
+            # 渔获逐条入库：鱼塘满时淘汰的鱼需要能选中本次结算中刚入塘的鱼
+            batch = _CatchBatch(pond_counts=None)
+            fish_count = 0
+            coins_earned = 0
+            for (loadout, cast_ts), outcome in zip(casts, outcomes):
+                outcome = self._reserve_rare_quota(user, loadout, outcome)
+                result = self._settle_cast(user, outcome, batch, datetime.fromtimestamp(cast_ts, _BEIJING_TZ))
+                if result["success"]:
+                    fish_count += 1
+                    coins_earned += result["fish"]["value"]
+            self._flush_catch_batch(batch)
+        return {"casts": len(casts), "fish_count": fish_count, "coins_earned": coins_earned}
 
     # def get_user_pokedex(self, user_id: str) -> Dict[str, Any]:
     #     """获取用户的图鉴信息。"""
@@ -380,10 +533,10 @@ class FishingService:
 
         Args:
             user_id: 用户ID。
-            limit: 返回记录的数量限制。
+            limit: 返回记录的数量限制，手动钓鱼记录与自动钓鱼的每小时汇总各取 limit 条。
 
         Returns:
-            包含钓鱼记录的字典。
+            包含钓鱼记录（records）与自动钓鱼汇总（digests）的字典。
         """
         records = self.log_repo.get_fishing_records(user_id, limit)
         # 根据records中的 fish_id 获取鱼类名称 rod_instance_id 和 accessory_instance_id 以及 bait_id 获取鱼竿、饰品、鱼饵信息
@@ -407,9 +560,32 @@ class FishingService:
                 "accessory": accessory_instance.name if accessory_instance else "未装备饰品",
                 "bait": bait_template.name if bait_template else "未使用鱼饵",
             })
+
+        digest_details = []
+        for digest in self.log_repo.get_auto_fishing_digests(user_id, limit):
+            best_fish = self.item_template_repo.get_fish_by_id(digest.best_fish_id) if digest.best_fish_id else None
+            fish_counts = []
+            for fish_id, quantity in sorted(digest.fish_counts.items(), key=lambda item: -item[1]):
+                fish_template = self.item_template_repo.get_fish_by_id(fish_id)
+                fish_counts.append({
+                    "fish_name": fish_template.name if fish_template else "未知鱼类",
+                    "quantity": quantity,
+                })
+            digest_details.append({
+                "hour_start": digest.hour_start,
+                "casts": digest.casts,
+                "successes": digest.successes,
+                "total_weight": digest.total_weight,
+                "total_value": digest.total_value,
+                "best_fish_name": best_fish.name if best_fish else None,
+                "best_fish_weight": digest.best_fish_weight,
+                "best_fish_value": digest.best_fish_value,
+                "fish": fish_counts,
+            })
         return {
             "success": True,
-            "records": fish_details
+            "records": fish_details,
+            "digests": digest_details
         }
 
     def get_user_fishing_zones(self, user_id: str) -> Dict[str, Any]:
@@ -434,7 +610,8 @@ class FishingService:
                 "name": zone.name,
                 "description": zone.description,
                 "daily_rare_fish_quota": zone.daily_rare_fish_quota,
-                "rare_fish_caught_today": zone.rare_fish_caught_today,
+                "rare_fish_caught_today": self.zone_quota_service.get_caught(zone.id),
+                "extra_fishing_cost": zone.extra_fishing_cost,
                 "whether_in_use": zone.id == user.fishing_zone_id,
             })
 
@@ -458,7 +635,10 @@ class FishingService:
         if not user:
             return {"success": False, "message": "用户不存在"}
 
-        zone = self.inventory_repo.get_zone_by_id(zone_id)
+        try:
+            zone = self.inventory_repo.get_zone_by_id(zone_id)
+        except ValueError:
+            zone = None
         if not zone:
             return {"success": False, "message": "钓鱼区域不存在"}
 
@@ -468,12 +648,9 @@ class FishingService:
         return {"success": True, "message": f"✅已将钓鱼区域设置为 {zone.name}"}
 
     def on_load(self, area2num: int, area3num: int):
-        zone2 = self.inventory_repo.get_zone_by_id(2)
-        zone3 = self.inventory_repo.get_zone_by_id(3)
-        zone2.rare_fish_caught_today = area2num
-        zone3.rare_fish_caught_today = area3num
-        self.inventory_repo.update_fishing_zone(zone2)
-        self.inventory_repo.update_fishing_zone(zone3)
+        self.zone_quota_service.set_caught(2, area2num)
+        self.zone_quota_service.set_caught(3, area3num)
+        self.zone_quota_service.flush()
         logger.info(f"钓鱼区域2和3的今日稀有鱼捕获数量已加载: {area2num}, {area3num}")
 
     def apply_daily_taxes(self) -> None:
@@ -517,88 +694,116 @@ class FishingService:
                 )
                 self.log_repo.add_tax_record(tax_log)
 
-    def start_auto_fishing_task(self):
-        """启动自动钓鱼的后台线程。"""
-        if self.auto_fishing_thread and self.auto_fishing_thread.is_alive():
-            logger.info("自动钓鱼线程已在运行中")
-            return
-
-        self.auto_fishing_running = True
-        self.auto_fishing_thread = threading.Thread(target=self._auto_fishing_loop, daemon=True)
-        self.auto_fishing_thread.start()
-        logger.info("自动钓鱼线程已启动")
-
-    def stop_auto_fishing_task(self):
-        """停止自动钓鱼的后台线程。"""
-        self.auto_fishing_running = False
-        if self.auto_fishing_thread:
-            self.auto_fishing_thread.join(timeout=1.0)
-            logger.info("自动钓鱼线程已停止")
-
-    def _auto_fishing_loop(self):
-        """自动钓鱼循环任务，由后台线程执行。"""
-        fishing_config = self.config.get("fishing", {})
-        cooldown = fishing_config.get("cooldown_seconds", 180)
-        cost = fishing_config.get("cost", 10)
-
-        while self.auto_fishing_running:
+    def register_jobs(self, job_scheduler: JobScheduler) -> None:
+        """
+        登记钓鱼相关的后台任务：北京时间零点重置区域稀有鱼配额并征收每日税收，以及自动钓鱼。
+        自动钓鱼启动时把所有开启的用户放入调度队列，任务每次只处理冷却已结束的用户，
+        并在下一个用户到期时再次执行；离线结算模式下改为按 accrual_sweep_interval 定期巡检结算；
+        交给分片进程抛竿时不登记自动钓鱼任务。
+        """
+        job_scheduler.add_daily_job("zone_quota_reset", self.zone_quota_service.reset_all)
+        job_scheduler.add_daily_job("daily_taxes", self.apply_daily_taxes)
+        if self.accrual_mode:
+            job_scheduler.add_interval_job("auto_fishing_accrual_sweep", self._sweep_accrued_casts,
+                                           self.accrual_sweep_interval, jitter=60, persist=True)
+        elif not self.auto_fishing_sharded:
+            self.seed_auto_fishing()
+            # 登记了比当前最早到期更早的用户（开启自动钓鱼、重试）时提前唤醒任务
+            self.auto_fishing_scheduler.set_listener(lambda due: job_scheduler.trigger("auto_fishing", due))
+            job_scheduler.add_interval_job("auto_fishing", self._run_auto_fishing_job, AUTO_FISHING_IDLE_SECONDS,
+                                           run_immediately=True, adaptive=True)
+
+    def _sweep_accrued_casts(self) -> None:
+        """离线结算模式的定期巡检：结算所有自动钓鱼用户错过的抛竿，每个用户一个事务。"""
+        users = 0
+        casts = 0
+        for user_id in self.user_repo.get_all_user_ids(auto_fishing_only=True):
             try:
-                today = get_today()
-                if today != self.today:
-                    # 如果今天日期变了，重置今日稀有鱼捕获数量
-                    self.today = today
-                    zone2 = self.inventory_repo.get_zone_by_id(2)
-                    zone3 = self.inventory_repo.get_zone_by_id(3)
-                    zone2.rare_fish_caught_today = 0
-                    zone3.rare_fish_caught_today = 0
-                    self.inventory_repo.update_fishing_zone(zone2)
-                    self.inventory_repo.update_fishing_zone(zone3)
-                    # 每次循环开始时检查是否需要应用每日税收
-                    self.apply_daily_taxes()
-                # 获取所有开启自动钓鱼的用户
-                auto_users_ids = self.user_repo.get_all_user_ids(auto_fishing_only=True)
-
-                for user_id in auto_users_ids:
-                    user = self.user_repo.get_by_id(user_id)
-                    if not user:
-                        continue
-
-                    # 检查CD
-                    now_ts = get_now().timestamp()
-                    last_ts = user.last_fishing_time.timestamp() if user.last_fishing_time else 0
-                    # 检查用户是否装备了海洋之心
-                    _cooldown = cooldown
-                    equipped_accessory = self.inventory_repo.get_user_equipped_accessory(user_id)
-                    if equipped_accessory:
-                        accessory_template = self.item_template_repo.get_accessory_by_id(equipped_accessory.accessory_id)
-                        if accessory_template and accessory_template.name == "海洋之心":
-                            # 海洋之心装备时，CD时间减半
-                            _cooldown /= 2
-                    if now_ts - last_ts < _cooldown:
-                        continue # CD中，跳过
-
-                    # 检查成本
-                    if not user.can_afford(cost):
-                        # 金币不足，关闭其自动钓鱼
-                        user.auto_fishing_enabled = False
-                        self.user_repo.update(user)
-                        logger.warning(f"用户 {user_id} 金币不足，已关闭自动钓鱼")
-                        continue
-
-                    # 执行钓鱼
-                    self.go_fish(user_id)
-                    # if result['success']:
-                    #     fish = result["fish"]
-                    #     logger.info(f"用户 {user_id} 自动钓鱼成功: {fish['name']}")
-                    # else:
-                    #      logger.info(f"用户 {user_id} 自动钓鱼失败: {result['message']}")
-
-                # 每轮检查间隔
-                time.sleep(40)
-
+                result = self.settle_accrued_casts(user_id)
             except Exception as e:
-                logger.error(f"自动钓鱼任务出错: {e}")
-                # 打印堆栈信息
-                import traceback
-                logger.error(traceback.format_exc())
-                time.sleep(60)
+                logger.error(f"结算用户 {user_id} 的离线自动钓鱼失败: {e}")
+                continue
+            if result:
+                users += 1
+                casts += result["casts"]
+        if users:
+            logger.info(f"离线自动钓鱼巡检：为 {users} 名用户结算了 {casts} 次抛竿")
+
+    def seed_auto_fishing(self, user_filter: Optional[Callable[[str], bool]] = None) -> int:
+        """
+        把开启自动钓鱼的用户放入调度队列，立即到期，冷却中的用户在第一次处理时按剩余时间重新排队。
+        user_filter 用于分片进程只登记属于自己的用户。返回登记的用户数。
+        """
+        scheduler = self.auto_fishing_scheduler
+        scheduler.clear()
+        now_ts = time.time()
+        count = 0
+        for user_id in self.user_repo.get_all_user_ids(auto_fishing_only=True):
+            if user_filter is None or user_filter(user_id):
+                scheduler.add(user_id, now_ts)
+                count += 1
+        return count
+
+    def run_due_auto_casts(self) -> List[str]:
+        """
+        为调度队列中冷却已结束的用户各抛竿一次（单次最多 AUTO_FISHING_BATCH_SIZE 人，一个事务），
+        抛竿后按冷却时间重新排队。返回本次抛竿的用户ID。
+        """
+        cost = self.config.get("fishing", {}).get("cost", 10)
+        scheduler = self.auto_fishing_scheduler
+        due_user_ids = []
+        now_ts = time.time()
+        for user_id in scheduler.pop_due(now_ts, AUTO_FISHING_BATCH_SIZE):
+            # 检查CD：手动钓鱼或更换装备后可能还在冷却中，按剩余时间重新排队
+            remaining = self.cooldown_service.get_remaining(user_id)
+            if remaining is None:
+                continue
+            if remaining > 0:
+                scheduler.add(user_id, now_ts + remaining)
+                continue
+
+            with self.unit_of_work.session():
+                user = self.user_repo.get_by_id(user_id)
+                if not user or not user.auto_fishing_enabled:
+                    continue
+
+                # 检查成本
+                if not user.can_afford(cost):
+                    # 金币不足，关闭其自动钓鱼
+                    user.auto_fishing_enabled = False
+                    user.auto_fishing_since = None
+                    self.user_repo.update(user)
+                    logger.warning(f"用户 {user_id} 金币不足，已关闭自动钓鱼")
+                    continue
+
+                due_user_ids.append(user_id)
+
+        if not due_user_ids:
+            return []
+        # 执行钓鱼：冷却结束的用户一起结算，一个事务
+        try:
+            self.resolve_casts(due_user_ids)
+        except Exception:
+            # 本轮未结算的用户稍后重试
+            retry_ts = time.time() + 60
+            for user_id in due_user_ids:
+                scheduler.add(user_id, retry_ts)
+            raise
+        now_ts = time.time()
+        for user_id in due_user_ids:
+            next_eligible = self.cooldown_service.get_next_eligible(user_id)
+            if next_eligible is None:
+                continue
+            if next_eligible <= now_ts:
+                # 本次没有抛竿成功（如金币不够区域费用），稍后重试
+                next_eligible = now_ts + AUTO_FISHING_RETRY_SECONDS
+            scheduler.add(user_id, next_eligible)
+        return due_user_ids
+
+    def _run_auto_fishing_job(self) -> float:
+        """自动钓鱼后台任务：为冷却已结束的用户抛竿，返回距离下一个用户到期的秒数。"""
+        self.run_due_auto_casts()
+        next_due = self.auto_fishing_scheduler.next_due()
+        if next_due is None:
+            return AUTO_FISHING_IDLE_SECONDS
+        return next_due - time.time()
@@ -1,4 +1,3 @@
-import random
 from typing import Dict, Any
 
 from astrbot.core.utils.pip_installer import logger
@@ -9,23 +8,22 @@ from ..repositories.abstract_repository import (
     AbstractInventoryRepository,
     AbstractItemTemplateRepository,
     AbstractLogRepository,
-    AbstractAchievementRepository
+    AbstractAchievementRepository,
+    AbstractUnitOfWork
 )
 from ..domain.models import GachaPool, GachaPoolItem, GachaRecord
 from ..utils import get_now
+from ..sampling import AliasTable, AliasTableCache
 
 
-def _perform_single_weighted_draw(pool: GachaPool) -> GachaPoolItem:
-    """执行一次加权随机抽奖。"""
-    total_weight = sum(item.weight for item in pool.items)
-    rand_val = random.uniform(0, total_weight)
+# 已编译的奖池别名表，键包含奖品及其权重，奖池配置修改后自动使用新表
+_pool_samplers = AliasTableCache()
 
-    current_weight = 0
-    for item in pool.items:
-        current_weight += item.weight
-        if rand_val <= current_weight:
-            return item
-    return None # 理论上不会发生
+
+def _get_pool_sampler(pool: GachaPool) -> AliasTable:
+    """获取奖池的加权抽样表，每次抽奖为 O(1)。"""
+    key = (pool.gacha_pool_id, tuple((item.gacha_pool_item_id, item.weight) for item in pool.items))
+    return _pool_samplers.get(key, lambda: (pool.items, [item.weight for item in pool.items]))
 
 
 class GachaService:
@@ -38,7 +36,8 @@ class GachaService:
         inventory_repo: AbstractInventoryRepository,
         item_template_repo: AbstractItemTemplateRepository,
         log_repo: AbstractLogRepository,
-        achievement_repo: AbstractAchievementRepository
+        achievement_repo: AbstractAchievementRepository,
+        unit_of_work: AbstractUnitOfWork
     ):
         self.gacha_repo = gacha_repo
         self.user_repo = user_repo
@@ -46,6 +45,7 @@ class GachaService:
         self.item_template_repo = item_template_repo
         self.achievement_repo = achievement_repo
         self.log_repo = log_repo
+        self.unit_of_work = unit_of_work
 
     def get_all_pools(self) -> Dict[str, Any]:
         """提供查看所有卡池信息的功能。"""
@@ -110,75 +110,78 @@ class GachaService:
         Returns:
             一个包含成功状态和抽卡结果的字典。
         """
-        user = self.user_repo.get_by_id(user_id)
-        if not user:
-            return {"success": False, "message": "用户不存在"}
-
-        pool = self.gacha_repo.get_pool_by_id(pool_id)
-        if not pool or not pool.items:
-            return {"success": False, "message": "卡池不存在或卡池为空"}
-
-        total_cost = pool.cost_coins * num_draws
-        if not user.can_afford(total_cost):
-            return {"success": False, "message": f"金币不足，需要 {total_cost} 金币"}
-
-        # 1. 执行抽卡
-        draw_results = []
-        for _ in range(num_draws):
-            drawn_item = _perform_single_weighted_draw(pool)
-            if drawn_item:
-                draw_results.append(drawn_item)
-
-        if not draw_results:
-            return {"success": False, "message": "抽卡失败，请检查卡池配置"}
-
-        # 2. 扣除费用
-        user.coins -= total_cost
-        self.user_repo.update(user)
-
-        # 3. 发放奖励并记录日志
-        granted_rewards = []
-        for item in draw_results:
-            self._grant_reward(user_id, item)
-            # 将抽奖结果 => 转换为用户可见的奖励格式
-            if item.item_type == "rod":
-                get_rod = self.item_template_repo.get_rod_by_id(item.item_id)
-                granted_rewards.append({
-                    "type": "rod",
-                    "id": item.item_id,
-                    "name": get_rod.name,
-                    "rarity": get_rod.rarity
-                })
-            elif item.item_type == "accessory":
-                get_accessory = self.item_template_repo.get_accessory_by_id(item.item_id)
-                granted_rewards.append({
-                    "type": "accessory",
-                    "id": item.item_id,
-                    "name": get_accessory.name,
-                    "rarity": get_accessory.rarity
-                })
-            elif item.item_type == "bait":
-                get_bait = self.item_template_repo.get_bait_by_id(item.item_id)
-                granted_rewards.append({
-                    "type": "bait",
-                    "id": item.item_id,
-                    "name": get_bait.name,
-                    "rarity": get_bait.rarity,
-                    "quantity": item.quantity
-                })
-            elif item.item_type == "coins":
-                granted_rewards.append({
-                    "type": "coins",
-                    "quantity": item.quantity
-                })
-            elif item.item_type == "titles":
-                granted_rewards.append({
-                    "type": "title",
-                    "id": item.item_id,
-                    "name": self.item_template_repo.get_title_by_id(item.item_id).name
-                })
+        # 扣费、发奖与抽卡日志在同一个事务中提交
+        with self.unit_of_work.transaction():
+            user = self.user_repo.get_by_id(user_id)
+            if not user:
+                return {"success": False, "message": "用户不存在"}
+
+            pool = self.gacha_repo.get_pool_by_id(pool_id)
+            if not pool or not pool.items:
+                return {"success": False, "message": "卡池不存在或卡池为空"}
+
+            total_cost = pool.cost_coins * num_draws
+            if not user.can_afford(total_cost):
+                return {"success": False, "message": f"金币不足，需要 {total_cost} 金币"}
+
+            # 1. 执行抽卡
+            try:
+                draw_results = _get_pool_sampler(pool).sample(num_draws)
+            except ValueError as e:
+                # 权重全为 0 或出现负数时无法建立抽样表
+                logger.warning(f"奖池 {pool_id} 的权重配置无效: {e}")
+                draw_results = []
+
+            if not draw_results:
+                return {"success": False, "message": "抽卡失败，请检查卡池配置"}
+
+            # 2. 扣除费用
+            user.coins -= total_cost
+            self.user_repo.update(user)
 
-        return {"success": True, "results": granted_rewards}
+            # 3. 发放奖励并记录日志
+            granted_rewards = []
+            for item in draw_results:
+                self._grant_reward(user_id, item)
+                # 将抽奖结果 => 转换为用户可见的奖励格式
+                if item.item_type == "rod":
+                    get_rod = self.item_template_repo.get_rod_by_id(item.item_id)
+                    granted_rewards.append({
+                        "type": "rod",
+                        "id": item.item_id,
+                        "name": get_rod.name,
+                        "rarity": get_rod.rarity
+                    })
+                elif item.item_type == "accessory":
+                    get_accessory = self.item_template_repo.get_accessory_by_id(item.item_id)
+                    granted_rewards.append({
+                        "type": "accessory",
+                        "id": item.item_id,
+                        "name": get_accessory.name,
+                        "rarity": get_accessory.rarity
+                    })
+                elif item.item_type == "bait":
+                    get_bait = self.item_template_repo.get_bait_by_id(item.item_id)
+                    granted_rewards.append({
+                        "type": "bait",
+                        "id": item.item_id,
+                        "name": get_bait.name,
+                        "rarity": get_bait.rarity,
+                        "quantity": item.quantity
+                    })
+                elif item.item_type == "coins":
+                    granted_rewards.append({
+                        "type": "coins",
+                        "quantity": item.quantity
+                    })
+                elif item.item_type == "titles":
+                    granted_rewards.append({
+                        "type": "title",
+                        "id": item.item_id,
+                        "name": self.item_template_repo.get_title_by_id(item.item_id).name
+                    })
+
+            return {"success": True, "results": granted_rewards}
 
     def _grant_reward(self, user_id: str, item: GachaPoolItem):
         """根据抽到的物品，为用户发放具体奖励并记录日志。"""
@@ -1,7 +1,6 @@
 import requests
 import random
 from typing import Dict, Any
-from concurrent.futures import ThreadPoolExecutor
 from astrbot.api import logger
 
 # 导入仓储接口和领域模型
@@ -13,6 +12,8 @@ from ..repositories.abstract_repository import (
 )
 from ..domain.models import WipeBombLog
 from ..utils import get_now
+from ..sampling import AliasTableCache
+from .job_scheduler import JobScheduler
 
 class GameMechanicsService:
     """封装特殊或独立的游戏机制"""
@@ -23,14 +24,18 @@ class GameMechanicsService:
         log_repo: AbstractLogRepository,
         inventory_repo: AbstractInventoryRepository,
         item_template_repo: AbstractItemTemplateRepository,
-        config: Dict[str, Any]
+        config: Dict[str, Any],
+        job_scheduler: JobScheduler
     ):
         self.user_repo = user_repo
         self.log_repo = log_repo
         self.inventory_repo = inventory_repo
         self.item_template_repo = item_template_repo
         self.config = config
-        self.thread_pool = ThreadPoolExecutor(max_workers=5)
+        # 数据上传在后台任务线程池中执行
+        self.job_scheduler = job_scheduler
+        # 擦弹奖励区间的别名表，以区间配置本身为键
+        self._reward_samplers = AliasTableCache(max_size=8)
 
     def perform_wipe_bomb(self, user_id: str, contribution_amount: int) -> Dict[str, Any]:
         """
@@ -54,17 +59,12 @@ class GameMechanicsService:
             return {"success": False, "message": f"你今天已经使用了{max_attempts}次擦弹，明天再来吧！"}
 
         # 3. 计算随机奖励倍数 (使用加权随机)
-        ranges = wipe_bomb_config.get("reward_ranges", [])
-        total_weight = sum(w for _, _, w in ranges)
-        rand_val = random.uniform(0, total_weight)
-
+        ranges = tuple(tuple(r) for r in wipe_bomb_config.get("reward_ranges", []))
         reward_multiplier = 0.0
-        current_weight = 0
-        for r_min, r_max, weight in ranges:
-            current_weight += weight
-            if rand_val <= current_weight:
-                reward_multiplier = round(random.uniform(r_min, r_max), 1)
-                break
+        if any(weight > 0 for _, _, weight in ranges):
+            sampler = self._reward_samplers.get(ranges, lambda: (ranges, [w for _, _, w in ranges]))
+            r_min, r_max, _ = sampler.draw()
+            reward_multiplier = round(random.uniform(r_min, r_max), 1)
 
         # 4. 计算最终金额并执行事务
         reward_amount = int(contribution_amount * reward_multiplier)
@@ -97,14 +97,15 @@ class GameMechanicsService:
             }
             api_url = "http://veyu.me/api/record"
             try:
-                response = requests.post(api_url, json=upload_data)
+                # 上传占用后台任务线程，设置超时以免长时间阻塞其他任务
+                response = requests.post(api_url, json=upload_data, timeout=10)
                 if response.status_code != 200:
                     logger.info(f"上传数据失败: {response.text}")
             except Exception as e:
                 logger.error(f"上传数据时发生错误: {e}")
 
-        # 启动异步线程进行数据上传，不阻塞主流程
-        self.thread_pool.submit(upload_data_async)
+        # 在后台任务线程池中上传数据，不阻塞主流程
+        self.job_scheduler.submit("wipe_bomb_upload", upload_data_async)
 
 
         return {
@@ -1,3 +1,4 @@
+import time
 from datetime import datetime
 from typing import Dict, Any
 
@@ -5,8 +6,10 @@ from typing import Dict, Any
 from ..repositories.abstract_repository import (
     AbstractInventoryRepository,
     AbstractUserRepository,
-    AbstractItemTemplateRepository
+    AbstractItemTemplateRepository,
+    AbstractUnitOfWork
 )
+from .loadout_service import LoadoutService
 
 class InventoryService:
     """封装与用户库存相关的业务逻辑"""
@@ -16,12 +19,16 @@ class InventoryService:
         inventory_repo: AbstractInventoryRepository,
         user_repo: AbstractUserRepository,
         item_template_repo: AbstractItemTemplateRepository,
-        config: Dict[str, Any]
+        config: Dict[str, Any],
+        unit_of_work: AbstractUnitOfWork,
+        loadout_service: LoadoutService
     ):
         self.inventory_repo = inventory_repo
         self.user_repo = user_repo
         self.item_template_repo = item_template_repo
         self.config = config
+        self.unit_of_work = unit_of_work
+        self.loadout_service = loadout_service
 
     def get_user_fish_pond(self, user_id: str) -> Dict[str, Any]:
         """
@@ -31,9 +38,10 @@ class InventoryService:
         total_value = self.inventory_repo.get_fish_inventory_value(user_id)
 
         # 为了丰富信息，可以从模板仓储获取鱼的详细信息
+        fish_templates = self.item_template_repo.get_fishes_by_ids([item.fish_id for item in inventory_items])
         enriched_items = []
         for item in inventory_items:
-            fish_template = self.item_template_repo.get_fish_by_id(item.fish_id)
+            fish_template = fish_templates.get(item.fish_id)
             if fish_template:
                 enriched_items.append({
                     "name": fish_template.name,
@@ -56,10 +64,11 @@ class InventoryService:
         获取用户的鱼竿库存。
         """
         rod_instances = self.inventory_repo.get_user_rod_instances(user_id)
+        rod_templates = self.item_template_repo.get_rods_by_ids([instance.rod_id for instance in rod_instances])
         enriched_rods = []
 
         for rod_instance in rod_instances:
-            rod_template = self.item_template_repo.get_rod_by_id(rod_instance.rod_id)
+            rod_template = rod_templates.get(rod_instance.rod_id)
             if rod_template:
                 enriched_rods.append({
                     "name": rod_template.name,
@@ -81,10 +90,11 @@ class InventoryService:
         获取用户的鱼饵库存。
         """
         bait_inventory = self.inventory_repo.get_user_bait_inventory(user_id)
+        bait_templates = self.item_template_repo.get_baits_by_ids(list(bait_inventory.keys()))
         enriched_baits = []
 
         for bait_id, quantity in bait_inventory.items():
-            bait_template = self.item_template_repo.get_bait_by_id(bait_id)
+            bait_template = bait_templates.get(bait_id)
             if bait_template:
                 enriched_baits.append({
                     "bait_id": bait_id,
@@ -105,10 +115,12 @@ class InventoryService:
         获取用户的饰品库存。
         """
         accessory_instances = self.inventory_repo.get_user_accessory_instances(user_id)
+        accessory_templates = self.item_template_repo.get_accessories_by_ids(
+            [instance.accessory_id for instance in accessory_instances])
         enriched_accessories = []
 
         for accessory_instance in accessory_instances:
-            accessory_template = self.item_template_repo.get_accessory_by_id(accessory_instance.accessory_id)
+            accessory_template = accessory_templates.get(accessory_instance.accessory_id)
             if accessory_template:
                 enriched_accessories.append({
                     "name": accessory_template.name,
@@ -135,26 +147,27 @@ class InventoryService:
             user_id: 用户ID
             keep_one: 是否每种鱼保留一条
         """
-        user = self.user_repo.get_by_id(user_id)
-        if not user:
-            return {"success": False, "message": "用户不存在"}
-
-        if keep_one:
-            # 调用仓储方法执行“保留一条”的数据库操作
-            sold_value = self.inventory_repo.sell_fish_keep_one(user_id)
-            if sold_value == 0:
-                return {"success": False, "message": "❌ 没有可卖出的鱼（每种至少保留一条）"}
-        else:
-            sold_value = self.inventory_repo.get_fish_inventory_value(user_id)
-            if sold_value == 0:
-                return {"success": False, "message": "❌ 你没有可以卖出的鱼"}
-            self.inventory_repo.clear_fish_inventory(user_id)
-
-        # 更新用户金币
-        user.coins += sold_value
-        self.user_repo.update(user)
-
-        return {"success": True, "message": f"💰 成功卖出鱼，获得 {sold_value} 金币"}
+        with self.unit_of_work.transaction():
+            user = self.user_repo.get_by_id(user_id)
+            if not user:
+                return {"success": False, "message": "用户不存在"}
+
+            if keep_one:
+                # 调用仓储方法执行“保留一条”的数据库操作
+                sold_value = self.inventory_repo.sell_fish_keep_one(user_id)
+                if sold_value == 0:
+                    return {"success": False, "message": "❌ 没有可卖出的鱼（每种至少保留一条）"}
+            else:
+                sold_value = self.inventory_repo.get_fish_inventory_value(user_id)
+                if sold_value == 0:
+                    return {"success": False, "message": "❌ 你没有可以卖出的鱼"}
+                self.inventory_repo.clear_fish_inventory(user_id)
+
+            # 更新用户金币
+            user.coins += sold_value
+            self.user_repo.update(user)
+
+            return {"success": True, "message": f"💰 成功卖出鱼，获得 {sold_value} 金币"}
 
     def sell_fish_by_rarity(self, user_id: str, rarity: int) -> Dict[str, Any]:
         """
@@ -164,163 +177,172 @@ class InventoryService:
             user_id: 用户ID
             rarity: 鱼的稀有度
         """
-        user = self.user_repo.get_by_id(user_id)
-        if not user:
-            return {"success": False, "message": "用户不存在"}
-
-        # 获取用户的鱼库存
-        fish_inventory = self.inventory_repo.get_fish_inventory(user_id)
-        total_value = 0
-
-        for item in fish_inventory:
-            fish_id = item.fish_id
-            fish_info = self.item_template_repo.get_fish_by_id(fish_id)
-            if fish_info and fish_info.rarity == rarity:
-                # 计算鱼的总价值
-                total_value += fish_info.base_value * item.quantity
-                # 删除该鱼的库存记录
-                self.inventory_repo.clear_fish_inventory(user_id, rarity=rarity)
-        # 如果没有可卖出的鱼，返回提示
-        if total_value == 0:
-            return {"success": False, "message": "❌ 没有可卖出的鱼"}
-        # 更新用户金币
-        user.coins += total_value
-        self.user_repo.update(user)
-
-        return {"success": True, "message": f"💰 成功卖出稀有度 {rarity} 的鱼，获得 {total_value} 金币"}
+        with self.unit_of_work.transaction():
+            user = self.user_repo.get_by_id(user_id)
+            if not user:
+                return {"success": False, "message": "用户不存在"}
+
+            # 获取用户的鱼库存
+            fish_inventory = self.inventory_repo.get_fish_inventory(user_id)
+            total_value = 0
+
+            for item in fish_inventory:
+                fish_id = item.fish_id
+                fish_info = self.item_template_repo.get_fish_by_id(fish_id)
+                if fish_info and fish_info.rarity == rarity:
+                    # 计算鱼的总价值
+                    total_value += fish_info.base_value * item.quantity
+                    # 删除该鱼的库存记录
+                    self.inventory_repo.clear_fish_inventory(user_id, rarity=rarity)
+            # 如果没有可卖出的鱼，返回提示
+            if total_value == 0:
+                return {"success": False, "message": "❌ 没有可卖出的鱼"}
+            # 更新用户金币
+            user.coins += total_value
+            self.user_repo.update(user)
+
+            return {"success": True, "message": f"💰 成功卖出稀有度 {rarity} 的鱼，获得 {total_value} 金币"}
 
     def sell_rod(self, user_id: str, rod_instance_id: int) -> Dict[str, Any]:
         """
         向系统出售指定的鱼竿。
         """
-        user = self.user_repo.get_by_id(user_id)
-        if not user:
-            return {"success": False, "message": "用户不存在"}
+        with self.unit_of_work.transaction():
+            user = self.user_repo.get_by_id(user_id)
+            if not user:
+                return {"success": False, "message": "用户不存在"}
 
-        # 1. 验证鱼竿是否属于该用户
-        user_rods = self.inventory_repo.get_user_rod_instances(user_id)
-        rod_to_sell = next((r for r in user_rods if r.rod_instance_id == rod_instance_id), None)
+            # 1. 验证鱼竿是否属于该用户
+            user_rods = self.inventory_repo.get_user_rod_instances(user_id)
+            rod_to_sell = next((r for r in user_rods if r.rod_instance_id == rod_instance_id), None)
 
-        if not rod_to_sell:
-            return {"success": False, "message": "鱼竿不存在或不属于你"}
+            if not rod_to_sell:
+                return {"success": False, "message": "鱼竿不存在或不属于你"}
 
-        # 2. 获取鱼竿模板以计算售价
-        rod_template = self.item_template_repo.get_rod_by_id(rod_to_sell.rod_id)
-        if not rod_template:
-             return {"success": False, "message": "找不到鱼竿的基础信息"}
+            # 2. 获取鱼竿模板以计算售价
+            rod_template = self.item_template_repo.get_rod_by_id(rod_to_sell.rod_id)
+            if not rod_template:
+                 return {"success": False, "message": "找不到鱼竿的基础信息"}
 
-        # 3. 计算售价
-        sell_prices = self.config.get("sell_prices", {}).get("by_rarity", {})
-        sell_price = sell_prices.get(str(rod_template.rarity), 30) # 默认价格30
+            # 3. 计算售价
+            sell_prices = self.config.get("sell_prices", {}).get("by_rarity", {})
+            sell_price = sell_prices.get(str(rod_template.rarity), 30) # 默认价格30
 
-        # 4. 执行操作
-        # 如果卖出的是当前装备的鱼竿，需要先卸下
-        if rod_to_sell.is_equipped:
-            user.equipped_rod_instance_id = None
+            # 4. 执行操作
+            # 如果卖出的是当前装备的鱼竿，需要先卸下
+            if rod_to_sell.is_equipped:
+                user.equipped_rod_instance_id = None
 
-        self.inventory_repo.delete_rod_instance(rod_instance_id)
-        user.coins += sell_price
-        self.user_repo.update(user)
+            self.inventory_repo.delete_rod_instance(rod_instance_id)
+            user.coins += sell_price
+            self.user_repo.update(user)
+            self.loadout_service.invalidate(user_id)
 
-        return {"success": True, "message": f"成功出售鱼竿【{rod_template.name}】，获得 {sell_price} 金币"}
+            return {"success": True, "message": f"成功出售鱼竿【{rod_template.name}】，获得 {sell_price} 金币"}
 
     def sell_all_rods(self, user_id: str) -> Dict[str, Any]:
         """
         向系统出售所有鱼竿。
         """
-        user = self.user_repo.get_by_id(user_id)
-        if not user:
-            return {"success": False, "message": "用户不存在"}
-
-        # 获取用户的鱼竿库存
-        user_rods = self.inventory_repo.get_user_rod_instances(user_id)
-        if not user_rods:
-            return {"success": False, "message": "❌ 你没有可以卖出的鱼竿"}
-
-        total_value = 0
-        for rod_instance in user_rods:
-            if rod_instance.is_equipped:
-                continue
-            rod_template = self.item_template_repo.get_rod_by_id(rod_instance.rod_id)
-            if rod_template:
-                sell_prices = self.config.get("sell_prices", {}).get("by_rarity", {})
-                sell_price = sell_prices.get(str(rod_template.rarity), 30)
-                total_value += sell_price
-        if total_value == 0:
-            return {"success": False, "message": "❌ 没有可以卖出的鱼竿"}
-        # 清空鱼竿库存
-        self.inventory_repo.clear_user_rod_instances(user_id)
-        # 更新用户金币
-        user.coins += total_value
-        self.user_repo.update(user)
-        return {"success": True, "message": f"💰 成功卖出所有鱼竿，获得 {total_value} 金币"}
+        with self.unit_of_work.transaction():
+            user = self.user_repo.get_by_id(user_id)
+            if not user:
+                return {"success": False, "message": "用户不存在"}
+
+            # 获取用户的鱼竿库存
+            user_rods = self.inventory_repo.get_user_rod_instances(user_id)
+            if not user_rods:
+                return {"success": False, "message": "❌ 你没有可以卖出的鱼竿"}
+
+            total_value = 0
+            for rod_instance in user_rods:
+                if rod_instance.is_equipped:
+                    continue
+                rod_template = self.item_template_repo.get_rod_by_id(rod_instance.rod_id)
+                if rod_template:
+                    sell_prices = self.config.get("sell_prices", {}).get("by_rarity", {})
+                    sell_price = sell_prices.get(str(rod_template.rarity), 30)
+                    total_value += sell_price
+            if total_value == 0:
+                return {"success": False, "message": "❌ 没有可以卖出的鱼竿"}
+            # 清空鱼竿库存
+            self.inventory_repo.clear_user_rod_instances(user_id)
+            # 更新用户金币
+            user.coins += total_value
+            self.user_repo.update(user)
+            self.loadout_service.invalidate(user_id)
+            return {"success": True, "message": f"💰 成功卖出所有鱼竿，获得 {total_value} 金币"}
 
     def sell_accessory(self, user_id: str, accessory_instance_id: int) -> Dict[str, Any]:
         """
         向系统出售指定的饰品。
         """
-        user = self.user_repo.get_by_id(user_id)
-        if not user:
-            return {"success": False, "message": "用户不存在"}
-
-        # 1. 验证饰品是否属于该用户
-        user_accessories = self.inventory_repo.get_user_accessory_instances(user_id)
-        accessory_to_sell = next((a for a in user_accessories if a.accessory_instance_id == accessory_instance_id), None)
-
-        if not accessory_to_sell:
-            return {"success": False, "message": "饰品不存在或不属于你"}
-
-        # 2. 获取饰品模板以计算售价
-        accessory_template = self.item_template_repo.get_accessory_by_id(accessory_to_sell.accessory_id)
-        if not accessory_template:
-            return {"success": False, "message": "找不到饰品的基础信息"}
-
-        # 3. 计算售价
-        sell_prices = self.config.get("sell_prices", {}).get("by_rarity", {})
-        sell_price = sell_prices.get(str(accessory_template.rarity), 30)
-
-        # 4. 执行操作
-        # 如果卖出的是当前装备的饰品，需要先卸下
-        if accessory_to_sell.is_equipped:
-            user.equipped_accessory_instance_id = None
-        self.inventory_repo.delete_accessory_instance(accessory_instance_id)
-        user.coins += sell_price
-        self.user_repo.update(user)
-        return {"success": True, "message": f"成功出售饰品【{accessory_template.name}】，获得 {sell_price} 金币"}
+        with self.unit_of_work.transaction():
+            user = self.user_repo.get_by_id(user_id)
+            if not user:
+                return {"success": False, "message": "用户不存在"}
+
+            # 1. 验证饰品是否属于该用户
+            user_accessories = self.inventory_repo.get_user_accessory_instances(user_id)
+            accessory_to_sell = next((a for a in user_accessories if a.accessory_instance_id == accessory_instance_id), None)
+
+            if not accessory_to_sell:
+                return {"success": False, "message": "饰品不存在或不属于你"}
+
+            # 2. 获取饰品模板以计算售价
+            accessory_template = self.item_template_repo.get_accessory_by_id(accessory_to_sell.accessory_id)
+            if not accessory_template:
+                return {"success": False, "message": "找不到饰品的基础信息"}
+
+            # 3. 计算售价
+            sell_prices = self.config.get("sell_prices", {}).get("by_rarity", {})
+            sell_price = sell_prices.get(str(accessory_template.rarity), 30)
+
+            # 4. 执行操作
+            # 如果卖出的是当前装备的饰品，需要先卸下
+            if accessory_to_sell.is_equipped:
+                user.equipped_accessory_instance_id = None
+            self.inventory_repo.delete_accessory_instance(accessory_instance_id)
+            user.coins += sell_price
+            self.user_repo.update(user)
+            self.loadout_service.invalidate(user_id)
+            return {"success": True, "message": f"成功出售饰品【{accessory_template.name}】，获得 {sell_price} 金币"}
 
     def sell_all_accessories(self, user_id: str) -> Dict[str, Any]:
         """
         向系统出售所有饰品。
         """
-        user = self.user_repo.get_by_id(user_id)
-        if not user:
-            return {"success": False, "message": "用户不存在"}
-
-        # 获取用户的饰品库存
-        user_accessories = self.inventory_repo.get_user_accessory_instances(user_id)
-        if not user_accessories:
-            return {"success": False, "message": "❌ 你没有可以卖出的饰品"}
-
-        total_value = 0
-        for accessory_instance in user_accessories:
-            if accessory_instance.is_equipped:
-                continue
-            accessory_template = self.item_template_repo.get_accessory_by_id(accessory_instance.accessory_id)
-            if accessory_template:
-                sell_prices = self.config.get("sell_prices", {}).get("by_rarity", {})
-                sell_price = sell_prices.get(str(accessory_template.rarity), 30)
-                total_value += sell_price
-
-        if total_value == 0:
-            return {"success": False, "message": "❌ 没有可以卖出的饰品"}
-
-        # 清空饰品库存
-        self.inventory_repo.clear_user_accessory_instances(user_id)
-        # 更新用户金币
-        user.coins += total_value
-        self.user_repo.update(user)
-
-        return {"success": True, "message": f"💰 成功卖出所有饰品，获得 {total_value} 金币"}
+        with self.unit_of_work.transaction():
+            user = self.user_repo.get_by_id(user_id)
+            if not user:
+                return {"success": False, "message": "用户不存在"}
+
+            # 获取用户的饰品库存
+            user_accessories = self.inventory_repo.get_user_accessory_instances(user_id)
+            if not user_accessories:
+                return {"success": False, "message": "❌ 你没有可以卖出的饰品"}
+
+            total_value = 0
+            for accessory_instance in user_accessories:
+                if accessory_instance.is_equipped:
+                    continue
+                accessory_template = self.item_template_repo.get_accessory_by_id(accessory_instance.accessory_id)
+                if accessory_template:
+                    sell_prices = self.config.get("sell_prices", {}).get("by_rarity", {})
+                    sell_price = sell_prices.get(str(accessory_template.rarity), 30)
+                    total_value += sell_price
+
+            if total_value == 0:
+                return {"success": False, "message": "❌ 没有可以卖出的饰品"}
+
+            # 清空饰品库存
+            self.inventory_repo.clear_user_accessory_instances(user_id)
+            # 更新用户金币
+            user.coins += total_value
+            self.user_repo.update(user)
+            self.loadout_service.invalidate(user_id)
+
+            return {"success": True, "message": f"💰 成功卖出所有饰品，获得 {total_value} 金币"}
 
     def equip_item(self, user_id: str, instance_id: int, item_type: str) -> Dict[str, Any]:
         """
@@ -364,6 +386,7 @@ class InventoryService:
         )
         # 更新用户表
         self.user_repo.update(user)
+        self.loadout_service.invalidate(user_id)
 
         return {"success": True, "message": f"💫 装备 【{equip_item_name}】 成功！"}
 
@@ -387,8 +410,14 @@ class InventoryService:
         # 更新用户当前鱼饵状态
         user.current_bait_id = bait_id
         user.bait_start_time = datetime.now()
+        # 限时鱼饵的过期时间在这里算好，钓鱼时只比较时间戳
+        if bait_template.duration_minutes > 0:
+            user.bait_expires_at = int(time.time()) + bait_template.duration_minutes * 60
+        else:
+            user.bait_expires_at = None
 
         self.user_repo.update(user)
+        self.loadout_service.invalidate(user_id)
 
         return {"success": True, "message": f"💫 成功使用鱼饵【{bait_template.name}】"}
 
@@ -399,11 +428,10 @@ class InventoryService:
         user = self.user_repo.get_by_id(user_id)
         if not user:
             return {"success": False, "message": "用户不存在"}
-        fish_inventory = self.inventory_repo.get_fish_inventory(user_id)
         return {
             "success": True,
             "fish_pond_capacity": user.fish_pond_capacity,
-            "current_fish_count": sum(item.quantity for item in fish_inventory),
+            "current_fish_count": self.inventory_repo.get_fish_pond_count(user_id),
         }
 
     def upgrade_fish_pond(self, user_id: str) -> Dict[str, Any]:
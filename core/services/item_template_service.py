@@ -1,6 +1,11 @@
-from typing import Dict, Any, List
-from ..repositories.abstract_repository import AbstractItemTemplateRepository, AbstractGachaRepository
-from ..domain.models import Fish, Rod, Bait, Accessory, GachaPool
+import math
+from typing import Dict, Any, List, Optional
+from ..repositories.abstract_repository import (
+    AbstractItemTemplateRepository, AbstractGachaRepository, AbstractInventoryRepository, AbstractUnitOfWork
+)
+from ..domain.models import Fish, Rod, Bait, Accessory, GachaPool, FishingZone
+from ..domain.zone_loot import ZoneLootTable, RARITY_LEVELS
+from .zone_quota_service import ZoneQuotaService
 
 
 class ItemTemplateService:
@@ -9,10 +14,23 @@ class ItemTemplateService:
     def __init__(
             self,
             item_template_repo: AbstractItemTemplateRepository,
-            gacha_repo: AbstractGachaRepository
+            gacha_repo: AbstractGachaRepository,
+            inventory_repo: AbstractInventoryRepository,
+            unit_of_work: AbstractUnitOfWork,
+            zone_quota_service: Optional[ZoneQuotaService] = None
     ):
         self.item_template_repo = item_template_repo
         self.gacha_repo = gacha_repo
+        self.inventory_repo = inventory_repo
+        self.unit_of_work = unit_of_work
+        # 提供时后台展示内存中的实时计数，而不是尚未写回的数据库计数
+        self.zone_quota_service = zone_quota_service
+
+    def _ensure_template_unreferenced(self, item_type: str, item_id: int, label: str):
+        """模板仍被玩家数据引用时拒绝删除，避免外键级联删掉玩家的物品。"""
+        count = self.item_template_repo.count_template_references(item_type, item_id)
+        if count:
+            raise ValueError(f"{label}ID {item_id} 仍被 {count} 条玩家数据引用，无法删除。")
 
     # --- Fish Methods ---
     def get_all_fish(self) -> List[Fish]:
@@ -26,6 +44,7 @@ class ItemTemplateService:
         self.item_template_repo.update_fish_template(fish_id, data)
 
     def delete_fish_template(self, fish_id: int):
+        self._ensure_template_unreferenced("fish", fish_id, "鱼类")
         self.item_template_repo.delete_fish_template(fish_id)
 
     # --- Rod Methods ---
@@ -39,6 +58,7 @@ class ItemTemplateService:
         self.item_template_repo.update_rod_template(rod_id, data)
 
     def delete_rod_template(self, rod_id: int):
+        self._ensure_template_unreferenced("rod", rod_id, "鱼竿")
         self.item_template_repo.delete_rod_template(rod_id)
 
     # --- Bait Methods ---
@@ -52,6 +72,7 @@ class ItemTemplateService:
         self.item_template_repo.update_bait_template(bait_id, data)
 
     def delete_bait_template(self, bait_id: int):
+        self._ensure_template_unreferenced("bait", bait_id, "鱼饵")
         self.item_template_repo.delete_bait_template(bait_id)
 
     # --- Accessory Methods ---
@@ -65,6 +86,7 @@ class ItemTemplateService:
         self.item_template_repo.update_accessory_template(accessory_id, data)
 
     def delete_accessory_template(self, accessory_id: int):
+        self._ensure_template_unreferenced("accessory", accessory_id, "饰品")
         self.item_template_repo.delete_accessory_template(accessory_id)
 
     # --- Gacha Pool Methods ---
@@ -103,3 +125,75 @@ class ItemTemplateService:
 
     def delete_pool_item(self, item_pool_id: int):
         self.gacha_repo.delete_pool_item(item_pool_id)
+
+    # --- Fishing Zone Loot Table Methods ---
+    def get_zones_for_admin(self) -> List[Dict[str, Any]]:
+        """返回所有钓鱼区域及其 1~6 星权重，供后台展示。"""
+        all_weights = self.item_template_repo.get_zone_rarity_weights()
+        zones = []
+        for zone in self.inventory_repo.get_all_fishing_zones():
+            weights = all_weights.get(zone.id, {})
+            zones.append({
+                "id": zone.id,
+                "name": zone.name,
+                "description": zone.description,
+                "daily_rare_fish_quota": zone.daily_rare_fish_quota,
+                "rare_fish_caught_today": (self.zone_quota_service.get_caught(zone.id)
+                                           if self.zone_quota_service else zone.rare_fish_caught_today),
+                "extra_fishing_cost": zone.extra_fishing_cost,
+                "weights": {rarity: weights.get(rarity, 0.0) for rarity in RARITY_LEVELS},
+            })
+        return zones
+
+    def _parse_rarity_weights(self, zone_id: int, data: Dict[str, Any]) -> Dict[int, float]:
+        """从表单字段 weight_1 ~ weight_6 解析权重，并用掉落表的编译规则做校验。"""
+        weights = {}
+        for rarity in RARITY_LEVELS:
+            raw = data.get(f"weight_{rarity}")
+            weight = float(raw) if raw not in (None, "") else 0.0
+            if not math.isfinite(weight):
+                raise ValueError(f"{rarity}星权重必须是有效数字")
+            if weight < 0:
+                raise ValueError(f"{rarity}星权重不能为负数")
+            weights[rarity] = weight
+        ZoneLootTable(zone_id, weights)
+        return weights
+
+    def update_zone_rarity_weights(self, zone_id: int, data: Dict[str, Any]):
+        # 区域不存在时抛出 ValueError，而不是在写入掉落表时触发外键错误
+        self.inventory_repo.get_zone_by_id(zone_id)
+        weights = self._parse_rarity_weights(zone_id, data)
+        self.item_template_repo.update_zone_rarity_weights(zone_id, weights)
+
+    @staticmethod
+    def _parse_non_negative_int(data: Dict[str, Any], field: str, label: str, default: Optional[int] = None) -> int:
+        """解析表单中的非负整数字段，缺失或格式错误时抛出 ValueError。"""
+        raw = str(data.get(field) or "").strip()
+        if not raw:
+            if default is None:
+                raise ValueError(f"{label}不能为空")
+            return default
+        if not raw.isdigit():
+            raise ValueError(f"{label}必须是非负整数")
+        return int(raw)
+
+    def add_fishing_zone(self, data: Dict[str, Any]):
+        zone_id = self._parse_non_negative_int(data, "id", "区域ID")
+        if zone_id == 0:
+            raise ValueError("区域ID必须大于 0")
+        name = str(data.get("name") or "").strip()
+        if not name:
+            raise ValueError("区域名称不能为空")
+        quota = self._parse_non_negative_int(data, "daily_rare_fish_quota", "每日稀有鱼配额", default=0)
+        extra_cost = self._parse_non_negative_int(data, "extra_fishing_cost", "额外抛竿成本", default=0)
+        weights = self._parse_rarity_weights(zone_id, data)
+        # 区域与掉落表一起写入，任一步失败都不会留下没有掉落表的区域
+        with self.unit_of_work.transaction():
+            self.inventory_repo.add_fishing_zone(FishingZone(
+                id=zone_id,
+                name=name,
+                description=data.get("description", ""),
+                daily_rare_fish_quota=quota,
+                extra_fishing_cost=extra_cost,
+            ))
+            self.item_template_repo.update_zone_rarity_weights(zone_id, weights)
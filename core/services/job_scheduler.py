@@ -0,0 +1,294 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional
+
+from astrbot.api import logger
+
+from ..repositories.abstract_repository import AbstractJobRunRepository
+
+# 每日任务按北京时间零点执行
+_BEIJING_TZ = timezone(timedelta(hours=8))
+
+
+def _last_midnight(ts: float) -> float:
+    """ts 所在北京时间当天零点的时间戳。"""
+    day = datetime.fromtimestamp(ts, _BEIJING_TZ).date()
+    return datetime.combine(day, datetime.min.time(), tzinfo=_BEIJING_TZ).timestamp()
+
+
+@dataclass
+class _Job:
+    name: str
+    func: Callable[[], Any]
+    # 间隔任务的执行间隔（秒）；每日任务为 None，在北京时间零点执行
+    interval: Optional[float]
+    # 每次计划执行时间上随机推迟的最大秒数，避免多个任务同时启动
+    jitter: float
+    # 错过了计划时间（插件停止或上一次执行超时）时是否立即补跑一次
+    catch_up: bool
+    # 是否把成功执行的开始时间写入 scheduled_job_runs，重启后据此补跑或跳过
+    persist: bool
+    # 任务函数的返回值是否为距下一次执行的秒数（不超过 interval）
+    adaptive: bool = False
+    next_run: float = 0.0
+    last_run: Optional[float] = None
+    running: bool = False
+    # 执行期间被 trigger 要求的最早下次执行时间
+    requested: Optional[float] = None
+    runs: int = 0
+    failures: int = 0
+    last_duration: float = 0.0
+    total_duration: float = 0.0
+    max_duration: float = 0.0
+
+
+class JobScheduler:
+    """
+    后台定时任务调度器。
+
+    所有周期性任务（自动钓鱼、每日零点重置与税收、成就检查、配额与日志写回等）登记到这里，
+    由一个调度线程按计划时间把到期任务交给固定大小的线程池执行，同一个任务不会并发执行。
+    adaptive 的间隔任务由函数返回距下一次执行的秒数（不超过 interval），再配合 trigger 提前唤醒，
+    用于下次执行时间取决于数据的任务（如自动钓鱼按最早到期的用户执行）。
+    persist 的任务在成功执行后记录本次开始的时间，重启后错过或失败的执行补跑一次；每日任务因此每天最多成功执行一次。
+    """
+
+    def __init__(self, job_run_repo: AbstractJobRunRepository, max_workers: int = 4):
+        self.job_run_repo = job_run_repo
+        self.max_workers = max(1, int(max_workers))
+
+        self._jobs: Dict[str, _Job] = {}
+        self._cond = threading.Condition()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        # 数据库中记录的各任务上次成功执行的开始时间，start 时加载
+        self._last_runs: Optional[Dict[str, int]] = None
+
+    # --- 登记任务 ---
+
+    def add_interval_job(self, name: str, func: Callable[[], Any], interval: float, jitter: float = 0.0,
+                         catch_up: bool = True, persist: bool = False, run_immediately: bool = False,
+                         adaptive: bool = False) -> None:
+        """
+        登记一个每隔 interval 秒执行一次的任务。
+        run_immediately 为 True 时调度器启动后立即执行第一次，否则等待一个间隔（persist 的任务按上次执行时间计算）。
+        """
+        job = _Job(name, func, max(0.0, float(interval)), max(0.0, float(jitter)), catch_up, persist, adaptive)
+        self._add(job, first_run=time.time() if run_immediately else None)
+
+    def add_daily_job(self, name: str, func: Callable[[], Any], jitter: float = 0.0, catch_up: bool = True) -> None:
+        """
+        登记一个每天北京时间零点执行的任务，执行记录总是持久化。
+        错过零点（插件停止）时，catch_up 为 True 则启动后补跑一次；首次登记的任务从下一个零点开始。
+        """
+        self._add(_Job(name, func, None, max(0.0, float(jitter)), catch_up, True))
+
+    def remove_job(self, name: str) -> None:
+        """移除任务，正在执行的一次不受影响。"""
+        with self._cond:
+            self._jobs.pop(name, None)
+            self._cond.notify_all()
+
+    def trigger(self, name: str, at: Optional[float] = None) -> None:
+        """要求任务最迟在 at 时刻（默认立即）执行，比原计划晚的时间忽略。"""
+        at = time.time() if at is None else at
+        with self._cond:
+            job = self._jobs.get(name)
+            if job is None:
+                return
+            if job.running:
+                job.requested = at if job.requested is None else min(job.requested, at)
+            elif at < job.next_run:
+                job.next_run = at
+                self._cond.notify_all()
+
+    def submit(self, name: str, func: Callable[[], Any]) -> None:
+        """在任务线程池中执行一次性的后台工作（如上传统计数据），不阻塞调用方。"""
+        if self._executor is None:
+            logger.warning(f"后台任务调度器未启动，丢弃一次性任务 {name}")
+            return
+
+        def run():
+            try:
+                func()
+            except Exception as e:
+                logger.error(f"后台任务 {name} 执行出错: {e}")
+
+        self._executor.submit(run)
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """返回每个任务的执行次数、失败次数、最近一次/平均/最长耗时（秒）与下次执行时间。"""
+        with self._cond:
+            return {
+                name: {
+                    "runs": job.runs,
+                    "failures": job.failures,
+                    "running": job.running,
+                    "last_duration": job.last_duration,
+                    "avg_duration": job.total_duration / job.runs if job.runs else 0.0,
+                    "max_duration": job.max_duration,
+                    "last_run": job.last_run,
+                    "next_run": job.next_run,
+                }
+                for name, job in self._jobs.items()
+            }
+
+    # --- 启动与停止 ---
+
+    def start(self) -> None:
+        """加载执行记录，安排各任务的首次执行并启动调度线程。"""
+        if self._running:
+            return
+        self._last_runs = self.job_run_repo.get_last_runs()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="fishing-job")
+        with self._cond:
+            self._running = True
+            for job in self._jobs.values():
+                if not job.next_run:
+                    job.next_run = self._plan_first_run(job)
+        self._thread = threading.Thread(target=self._run, name="fishing-job-scheduler", daemon=True)
+        self._thread.start()
+        logger.info(f"后台任务调度器已启动，共 {len(self._jobs)} 个任务，最多 {self.max_workers} 个并发。")
+
+    def close(self, timeout: float = 30.0) -> None:
+        """停止调度新的执行，等待正在执行的任务结束。"""
+        if not self._running:
+            return
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while any(job.running for job in self._jobs.values()) and time.monotonic() < deadline:
+                self._cond.wait(deadline - time.monotonic())
+        self._executor.shutdown(wait=False)
+        self._executor = None
+        logger.info("后台任务调度器已停止")
+
+    # --- 内部实现 ---
+
+    def _add(self, job: _Job, first_run: Optional[float] = None) -> None:
+        with self._cond:
+            if job.name in self._jobs:
+                raise ValueError(f"后台任务 {job.name} 已登记")
+            if first_run is not None:
+                job.next_run = first_run
+            elif self._running:
+                job.next_run = self._plan_first_run(job)
+            self._jobs[job.name] = job
+            self._cond.notify_all()
+
+    def _plan_first_run(self, job: _Job) -> float:
+        """按持久化的上次执行时间安排首次执行。需在持有锁时调用。"""
+        now = time.time()
+        last_run = self._last_runs.get(job.name) if job.persist else None
+        if job.interval is None:
+            if last_run is None:
+                # 首次登记：记为今天已执行，避免插件升级后立刻补跑税收等每日任务
+                self._seed_marker(job.name, now)
+                return self._next_midnight(now) + self._jitter(job)
+            if last_run < _last_midnight(now) and job.catch_up:
+                logger.info(f"后台任务 {job.name} 错过了今天零点的执行，立即补跑")
+                return now
+            return self._next_midnight(now) + self._jitter(job)
+
+        if last_run is None:
+            return now + job.interval + self._jitter(job)
+        next_run = last_run + job.interval
+        if next_run >= now:
+            return next_run + self._jitter(job)
+        if job.catch_up:
+            return now
+        # 不补跑：跳到上次执行之后的下一个整数倍间隔
+        missed = (now - last_run) // job.interval if job.interval else 0
+        return last_run + (missed + 1) * job.interval + self._jitter(job)
+
+    def _seed_marker(self, name: str, now: float) -> None:
+        try:
+            self.job_run_repo.mark_started(name)
+            self.job_run_repo.mark_finished(name, int(now), 0, "skipped")
+        except Exception as e:
+            logger.error(f"记录后台任务 {name} 的执行时间失败: {e}")
+
+    @staticmethod
+    def _next_midnight(now: float) -> float:
+        return _last_midnight(now) + timedelta(days=1).total_seconds()
+
+    @staticmethod
+    def _jitter(job: _Job) -> float:
+        return random.uniform(0, job.jitter) if job.jitter else 0.0
+
+    def _run(self) -> None:
+        with self._cond:
+            while self._running:
+                now = time.time()
+                next_due = None
+                for job in list(self._jobs.values()):
+                    if job.running:
+                        continue
+                    if job.next_run <= now:
+                        job.running = True
+                        self._executor.submit(self._execute, job)
+                    elif next_due is None or job.next_run < next_due:
+                        next_due = job.next_run
+                # 没有待执行的任务时也定期醒来，防止系统时间跳变后一直睡眠
+                self._cond.wait(60 if next_due is None else min(60, max(0.0, next_due - now)))
+
+    def _execute(self, job: _Job) -> None:
+        started = time.time()
+        if job.persist:
+            try:
+                self.job_run_repo.mark_started(job.name)
+            except Exception as e:
+                logger.error(f"记录后台任务 {job.name} 的执行时间失败: {e}")
+
+        status = "ok"
+        result = None
+        try:
+            result = job.func()
+        except Exception as e:
+            status = "error"
+            logger.error(f"后台任务 {job.name} 执行出错: {e}", exc_info=True)
+        duration = time.time() - started
+
+        if job.persist:
+            try:
+                self.job_run_repo.mark_finished(job.name, int(started), int(duration * 1000), status)
+            except Exception as e:
+                logger.error(f"记录后台任务 {job.name} 的执行结果失败: {e}")
+        if job.interval and duration > job.interval:
+            logger.warning(f"后台任务 {job.name} 本次耗时 {duration:.1f} 秒，超过了 {job.interval:.0f} 秒的执行间隔")
+
+        with self._cond:
+            job.running = False
+            job.last_run = started
+            job.runs += 1
+            if status != "ok":
+                job.failures += 1
+            job.last_duration = duration
+            job.total_duration += duration
+            job.max_duration = max(job.max_duration, duration)
+
+            finished = time.time()
+            if job.interval is None:
+                next_run = self._next_midnight(finished) + self._jitter(job)
+            elif job.adaptive and isinstance(result, (int, float)):
+                next_run = finished + min(max(0.0, float(result)), job.interval)
+            else:
+                next_run = started + job.interval + self._jitter(job)
+                if next_run < finished:
+                    # 执行耗时超过间隔：补跑时立即执行一次，否则从现在起等待一个间隔
+                    next_run = finished if job.catch_up else finished + job.interval
+            if job.requested is not None:
+                next_run = min(next_run, job.requested)
+                job.requested = None
+            job.next_run = next_run
+            self._cond.notify_all()
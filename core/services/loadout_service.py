@@ -0,0 +1,198 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ..repositories.abstract_repository import (
+    AbstractInventoryRepository,
+    AbstractItemTemplateRepository,
+    AbstractUnitOfWork
+)
+from ..domain.models import User, Rod, Accessory, Bait
+from .cast_resolver import CastModifiers
+
+# 装备后钓鱼冷却时间减半的饰品
+COOLDOWN_HALVING_ACCESSORY = "海洋之心"
+
+
+@dataclass(frozen=True)
+class Loadout:
+    """
+    用户当前装备的快照，以及由装备合并出的各项修正值。
+
+    rod_instance_id / accessory_instance_id 是已确认仍然存在的装备实例，
+    用户记录中的装备实例已被删除时为 None。
+    """
+    user_id: str
+    rod_instance_id: Optional[int]
+    accessory_instance_id: Optional[int]
+    rod: Optional[Rod]
+    accessory: Optional[Accessory]
+    # 用户当前使用的鱼饵模板
+    bait: Optional[Bait]
+    # 鱼竿与饰品合并后的质量、数量、稀有、金币加成；当前鱼饵的成功率与垃圾鱼修正不计入抛竿
+    modifiers: CastModifiers
+    # 钓鱼冷却时间倍率
+    cooldown_multiplier: float
+
+    def with_bait(self, bait: Optional[Bait]) -> CastModifiers:
+        """返回叠加指定鱼饵后的修正值（成功率加成、垃圾鱼重抽等）。"""
+        return CastModifiers.combine(self.rod, self.accessory, bait)
+
+
+# (装备的鱼竿实例, 装备的饰品实例, 当前鱼饵)，用户记录与快照不一致时重新构建
+_LoadoutKey = Tuple[Optional[int], Optional[int], Optional[int]]
+
+
+class LoadoutService:
+    """
+    按用户缓存装备快照。
+
+    抛竿和冷却检查只读取一个快照对象，不再逐次查询装备实例与模板。
+    装备、使用鱼饵、出售或上架鱼竿饰品时调用 invalidate，
+    在当前事务提交后（不在事务中则立即）作废该用户的快照。
+    """
+
+    def __init__(
+        self,
+        inventory_repo: AbstractInventoryRepository,
+        item_template_repo: AbstractItemTemplateRepository,
+        unit_of_work: AbstractUnitOfWork,
+        max_size: int = 1000
+    ):
+        self.inventory_repo = inventory_repo
+        self.item_template_repo = item_template_repo
+        self.unit_of_work = unit_of_work
+        self.max_size = max(1, int(max_size))
+
+        self._entries: "OrderedDict[str, Tuple[_LoadoutKey, Loadout]]" = OrderedDict()
+        # 正在构建快照的用户及进行中的构建数
+        self._building: Dict[str, int] = {}
+        # 构建期间用户被作废的次数，若被作废则放弃回填；只记录正在构建的用户
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # 快照作废时通知的回调，参数为用户ID
+        self._listeners: List[Callable[[str], None]] = []
+
+        self.hits = 0
+        self.misses = 0
+
+    def add_listener(self, callback: Callable[[str], None]) -> None:
+        """登记一个在用户快照作废时调用的回调，供依赖装备的其他缓存同步失效。"""
+        self._listeners.append(callback)
+
+    def get_stats(self) -> Dict[str, int]:
+        """返回命中、未命中次数与当前缓存数量。"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+    def get_loadout(self, user: User) -> Loadout:
+        """获取用户的装备快照，缓存未命中或已过期时重新构建。"""
+        key = (user.equipped_rod_instance_id, user.equipped_accessory_instance_id, user.current_bait_id)
+        with self._lock:
+            entry = self._entries.get(user.user_id)
+            if entry is not None and entry[0] == key and self._templates_current(entry[1]):
+                self._entries.move_to_end(user.user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            self._building[user.user_id] = self._building.get(user.user_id, 0) + 1
+            version = self._versions.get(user.user_id, 0)
+
+        loadout = None
+        try:
+            loadout = self._build(user)
+        finally:
+            with self._lock:
+                if loadout is not None and self._versions.get(user.user_id, 0) == version:
+                    self._entries[user.user_id] = (key, loadout)
+                    self._entries.move_to_end(user.user_id)
+                    while len(self._entries) > self.max_size:
+                        self._entries.popitem(last=False)
+                self._finish_build(user.user_id)
+        return loadout
+
+    def _finish_build(self, user_id: str) -> None:
+        """结束一次构建，没有其他进行中的构建时不再记录该用户的作废次数。需在持有 _lock 时调用。"""
+        remaining = self._building.pop(user_id) - 1
+        if remaining:
+            self._building[user_id] = remaining
+        else:
+            self._versions.pop(user_id, None)
+
+    def _record_drop(self, user_id: str) -> None:
+        """记录一次作废，使进行中的构建放弃回填。需在持有 _lock 时调用。"""
+        if user_id in self._building:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def invalidate(self, user_id: str) -> None:
+        """作废用户的装备快照。"""
+        self._drop(user_id)
+        # 事务提交前其他线程仍可能按旧数据重新构建，提交后再作废一次
+        self.unit_of_work.after_commit(lambda: self._drop(user_id))
+
+    def clear(self) -> None:
+        """清空所有快照。"""
+        with self._lock:
+            user_ids = list(self._entries)
+            for user_id in self._building:
+                self._record_drop(user_id)
+            self._entries.clear()
+        for user_id in user_ids:
+            self._notify(user_id)
+
+    def _drop(self, user_id: str) -> None:
+        with self._lock:
+            self._record_drop(user_id)
+            self._entries.pop(user_id, None)
+        self._notify(user_id)
+
+    def _notify(self, user_id: str) -> None:
+        for callback in self._listeners:
+            callback(user_id)
+
+    def _templates_current(self, loadout: Loadout) -> bool:
+        """后台修改了装备模板时快照随之失效；模板读取走内存目录，比较的开销很小。"""
+        repo = self.item_template_repo
+        return ((loadout.rod is None or repo.get_rod_by_id(loadout.rod.rod_id) == loadout.rod)
+                and (loadout.accessory is None
+                     or repo.get_accessory_by_id(loadout.accessory.accessory_id) == loadout.accessory)
+                and (loadout.bait is None or repo.get_bait_by_id(loadout.bait.bait_id) == loadout.bait))
+
+    def _build(self, user: User) -> Loadout:
+        user_id = user.user_id
+        rod = None
+        equipped_rod = self.inventory_repo.get_user_equipped_rod(user_id)
+        if equipped_rod:
+            rod = self.item_template_repo.get_rod_by_id(equipped_rod.rod_id)
+
+        accessory = None
+        equipped_accessory = self.inventory_repo.get_user_equipped_accessory(user_id)
+        if equipped_accessory:
+            accessory = self.item_template_repo.get_accessory_by_id(equipped_accessory.accessory_id)
+
+        # 判断用户记录中的鱼竿和饰品是否真实存在
+        rod_instance_id = user.equipped_rod_instance_id
+        if rod_instance_id and not (equipped_rod and equipped_rod.rod_instance_id == rod_instance_id):
+            if not self.inventory_repo.get_user_rod_instance_by_id(user_id, rod_instance_id):
+                rod_instance_id = None
+        accessory_instance_id = user.equipped_accessory_instance_id
+        if accessory_instance_id and not (equipped_accessory
+                                          and equipped_accessory.accessory_instance_id == accessory_instance_id):
+            if not self.inventory_repo.get_user_accessory_instance_by_id(user_id, accessory_instance_id):
+                accessory_instance_id = None
+
+        bait = None
+        if user.current_bait_id is not None:
+            bait = self.item_template_repo.get_bait_by_id(user.current_bait_id)
+
+        return Loadout(
+            user_id=user_id,
+            rod_instance_id=rod_instance_id,
+            accessory_instance_id=accessory_instance_id,
+            rod=rod,
+            accessory=accessory,
+            bait=bait,
+            modifiers=CastModifiers.combine(rod, accessory, None),
+            cooldown_multiplier=0.5 if accessory and accessory.name == COOLDOWN_HALVING_ACCESSORY else 1.0,
+        )
@@ -7,9 +7,11 @@ from ..repositories.abstract_repository import (
     AbstractInventoryRepository,
     AbstractUserRepository,
     AbstractLogRepository,
-    AbstractItemTemplateRepository
+    AbstractItemTemplateRepository,
+    AbstractUnitOfWork
 )
 from ..domain.models import MarketListing, TaxRecord
+from .loadout_service import LoadoutService
 
 class MarketService:
     """封装与玩家交易市场相关的业务逻辑"""
@@ -21,7 +23,9 @@ class MarketService:
         user_repo: AbstractUserRepository,
         log_repo: AbstractLogRepository,
         item_template_repo: AbstractItemTemplateRepository,
-        config: Dict[str, Any]
+        config: Dict[str, Any],
+        unit_of_work: AbstractUnitOfWork,
+        loadout_service: LoadoutService
     ):
         self.market_repo = market_repo
         self.inventory_repo = inventory_repo
@@ -29,6 +33,8 @@ class MarketService:
         self.log_repo = log_repo
         self.item_template_repo = item_template_repo  # 修正：赋值给实例变量
         self.config = config
+        self.unit_of_work = unit_of_work
+        self.loadout_service = loadout_service
 
     def get_market_listings(self) -> Dict[str, Any]:
         """
@@ -100,6 +106,7 @@ class MarketService:
             self.inventory_repo.delete_rod_instance(item_instance_id)
         elif item_type == "accessory":
             self.inventory_repo.delete_accessory_instance(item_instance_id)
+        self.loadout_service.invalidate(user_id)
 
         # 2. 扣除税费
         seller.coins -= tax_cost
@@ -133,48 +140,50 @@ class MarketService:
         """
         处理从市场购买其他玩家物品的逻辑。
         """
-        buyer = self.user_repo.get_by_id(buyer_id)
-        if not buyer:
-            return {"success": False, "message": "购买者用户不存在"}
-
-        listing = self.market_repo.get_listing_by_id(market_id)
-        if not listing:
-            return {"success": False, "message": "该商品不存在或已被购买"}
-
-        if buyer_id == listing.user_id:
-            return {"success": False, "message": "你不能购买自己上架的物品"}
-
-        seller = self.user_repo.get_by_id(listing.user_id)
-        if not seller:
-            return {"success": False, "message": "卖家信息丢失，交易无法进行"}
-
-        if not buyer.can_afford(listing.price):
-            return {"success": False, "message": f"金币不足，需要 {listing.price} 金币"}
-
-        # 执行交易
-        # 1. 从买家扣款
-        buyer.coins -= listing.price
-        self.user_repo.update(buyer)
-
-        # 2. 给卖家打款
-        seller.coins += listing.price
-        self.user_repo.update(seller)
-
-        # 3. 将物品发给买家
-        if listing.item_type == "rod":
-            rod_template = self.item_template_repo.get_rod_by_id(listing.item_id)
-            self.inventory_repo.add_rod_instance(
-                user_id=buyer_id,
-                rod_id=listing.item_id,
-                durability=rod_template.durability if rod_template else None
-            )
-        elif listing.item_type == "accessory":
-            self.inventory_repo.add_accessory_instance(
-                user_id=buyer_id,
-                accessory_id=listing.item_id
-            )
-
-        # 4. 从市场移除该商品
-        self.market_repo.remove_listing(market_id)
-
-        return {"success": True, "message": f"✅ 购买成功，花费 {listing.price} 金币！"}
+        # 买卖双方的金币、物品发放与下架在同一个事务中完成
+        with self.unit_of_work.transaction():
+            buyer = self.user_repo.get_by_id(buyer_id)
+            if not buyer:
+                return {"success": False, "message": "购买者用户不存在"}
+
+            listing = self.market_repo.get_listing_by_id(market_id)
+            if not listing:
+                return {"success": False, "message": "该商品不存在或已被购买"}
+
+            if buyer_id == listing.user_id:
+                return {"success": False, "message": "你不能购买自己上架的物品"}
+
+            seller = self.user_repo.get_by_id(listing.user_id)
+            if not seller:
+                return {"success": False, "message": "卖家信息丢失，交易无法进行"}
+
+            if not buyer.can_afford(listing.price):
+                return {"success": False, "message": f"金币不足，需要 {listing.price} 金币"}
+
+            # 执行交易
+            # 1. 从买家扣款
+            buyer.coins -= listing.price
+            self.user_repo.update(buyer)
+
+            # 2. 给卖家打款
+            seller.coins += listing.price
+            self.user_repo.update(seller)
+
+            # 3. 将物品发给买家
+            if listing.item_type == "rod":
+                rod_template = self.item_template_repo.get_rod_by_id(listing.item_id)
+                self.inventory_repo.add_rod_instance(
+                    user_id=buyer_id,
+                    rod_id=listing.item_id,
+                    durability=rod_template.durability if rod_template else None
+                )
+            elif listing.item_type == "accessory":
+                self.inventory_repo.add_accessory_instance(
+                    user_id=buyer_id,
+                    accessory_id=listing.item_id
+                )
+
+            # 4. 从市场移除该商品
+            self.market_repo.remove_listing(market_id)
+
+            return {"success": True, "message": f"✅ 购买成功，花费 {listing.price} 金币！"}
@@ -161,9 +161,10 @@ class UserService:
         if not owned_titles:
             return {"success": True, "titles": []}
 
+        title_templates = self.item_template_repo.get_titles_by_ids(owned_titles)
         titles_data = []
         for title in owned_titles:
-            title_template = self.item_template_repo.get_title_by_id(title)
+            title_template = title_templates.get(title)
             if title_template:
                 titles_data.append({
                     "title_id": title,
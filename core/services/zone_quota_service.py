@@ -0,0 +1,215 @@
+import threading
+import time
+from typing import Dict, Optional
+
+from astrbot.api import logger
+
+from ..repositories.abstract_repository import AbstractInventoryRepository, AbstractUnitOfWork
+from .job_scheduler import JobScheduler
+
+
+class _ZoneQuota:
+    """单个区域的配额计数，以及随区域一起缓存的额外抛竿成本。"""
+    __slots__ = ("quota", "caught", "extra_cost", "loaded_at", "loading")
+
+    def __init__(self, quota: int, caught: int, extra_cost: int = 0):
+        self.quota = quota
+        self.caught = caught
+        self.extra_cost = extra_cost
+        self.loaded_at = time.monotonic()
+        # 是否有线程正在从数据库重新加载该区域
+        self.loading = False
+
+
+class ZoneQuotaService:
+    """
+    区域每日稀有鱼配额的内存计数器。
+
+    抛竿时只读取内存中的计数判断配额是否可用，钓到稀有鱼时用 try_reserve 在锁内
+    “未达配额才加一”，并发抛竿不会超出配额。所在事务回滚时预留自动撤销。
+    计数的变化量由后台任务每隔 flush_interval_seconds 秒累加到 fishing_zones，close() 时再写回一次；
+    写回的是增量，不会覆盖后台对区域的修改。内存中的配额和计数每隔 flush_interval_seconds 秒
+    从数据库重新加载一次，数据库读取在锁外进行。
+
+    多个进程同时抛竿（自动钓鱼分片进程）时使用 shared 模式：try_reserve 直接在数据库中
+    “未达配额才加一”，随所在事务一起提交或回滚；内存中的计数只用于 is_available 的判断。
+    """
+
+    def __init__(self, inventory_repo: AbstractInventoryRepository, unit_of_work: AbstractUnitOfWork,
+                 flush_interval_seconds: float = 30, shared: bool = False):
+        """
+        Args:
+            inventory_repo: 读写 fishing_zones 的库存仓储。
+            unit_of_work: 共享的工作单元，用于在事务回滚时撤销预留。
+            flush_interval_seconds: 后台任务写回计数、以及从数据库重新加载计数的间隔（秒）。
+            shared: 配额是否与其他进程共享。
+        """
+        self.inventory_repo = inventory_repo
+        self.unit_of_work = unit_of_work
+        self.flush_interval = max(1.0, float(flush_interval_seconds))
+        self.shared = shared
+
+        self._zones: Dict[int, _ZoneQuota] = {}
+        # 尚未写回数据库的计数变化量 {zone_id: delta}
+        self._pending: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        # 保证同一时刻只有一个写回或重新加载在执行，重新加载时不会漏算正在写回的变化量
+        self._flush_lock = threading.Lock()
+
+        self.reserved = 0
+        self.rejected = 0
+
+    # --- 配额 ---
+
+    def _get(self, zone_id: int) -> Optional[_ZoneQuota]:
+        """
+        返回区域的计数，首次访问或超过 flush_interval 未加载时从数据库重新加载；区域不存在时返回 None。
+        不能在持有 _lock 时调用：数据库读取在锁外进行，慢查询不会阻塞其他抛竿。
+        """
+        with self._lock:
+            entry = self._zones.get(zone_id)
+            if entry is not None:
+                if entry.loading or time.monotonic() - entry.loaded_at <= self.flush_interval:
+                    # 其他线程正在重新加载时先使用旧的计数
+                    return entry
+                entry.loading = True
+        try:
+            with self._flush_lock:
+                try:
+                    zone = self.inventory_repo.get_zone_by_id(zone_id)
+                except ValueError:
+                    with self._lock:
+                        self._zones.pop(zone_id, None)
+                        self._pending.pop(zone_id, None)
+                    return None
+                with self._lock:
+                    # 数据库中的计数加上尚未写回的变化量；期间后台的修改也一并生效
+                    caught = zone.rare_fish_caught_today + self._pending.get(zone_id, 0)
+                    current = self._zones.get(zone_id)
+                    if current is None:
+                        current = self._zones[zone_id] = _ZoneQuota(zone.daily_rare_fish_quota, caught,
+                                                                    zone.extra_fishing_cost)
+                    else:
+                        current.quota = zone.daily_rare_fish_quota
+                        current.caught = caught
+                        current.extra_cost = zone.extra_fishing_cost
+                        current.loaded_at = time.monotonic()
+                    return current
+        finally:
+            if entry is not None:
+                entry.loading = False
+
+    def is_available(self, zone_id: int) -> bool:
+        """区域今天是否还有稀有鱼配额。"""
+        entry = self._get(zone_id)
+        if entry is None:
+            return False
+        with self._lock:
+            return entry.caught < entry.quota
+
+    def try_reserve(self, zone_id: int) -> bool:
+        """配额未用完时占用一个名额并返回 True，否则返回 False。"""
+        if self.shared:
+            return self._try_reserve_shared(zone_id)
+        entry = self._get(zone_id)
+        with self._lock:
+            if entry is None or entry.caught >= entry.quota:
+                self.rejected += 1
+                return False
+            entry.caught += 1
+            self._pending[zone_id] = self._pending.get(zone_id, 0) + 1
+            self.reserved += 1
+        self.unit_of_work.on_rollback(lambda: self._release(zone_id))
+        return True
+
+    def _try_reserve_shared(self, zone_id: int) -> bool:
+        # 数据库中的加一随所在事务回滚，不需要登记撤销
+        caught = self.inventory_repo.try_increment_rare_fish_count(zone_id)
+        with self._lock:
+            entry = self._zones.get(zone_id)
+            if caught is None:
+                self.rejected += 1
+                if entry is not None:
+                    entry.caught = max(entry.caught, entry.quota)
+                return False
+            self.reserved += 1
+            if entry is not None:
+                entry.caught = caught
+        return True
+
+    def _release(self, zone_id: int) -> None:
+        with self._lock:
+            entry = self._zones.get(zone_id)
+            if entry is not None and entry.caught > 0:
+                entry.caught -= 1
+                self._pending[zone_id] = self._pending.get(zone_id, 0) - 1
+
+    def get_caught(self, zone_id: int) -> int:
+        """区域今天已被钓走的稀有鱼数量。"""
+        entry = self._get(zone_id)
+        if entry is None:
+            return 0
+        with self._lock:
+            return entry.caught
+
+    def get_extra_cost(self, zone_id: int) -> int:
+        """在区域每次抛竿时额外收取的金币，与计数一起缓存；区域不存在时为 0。"""
+        entry = self._get(zone_id)
+        return entry.extra_cost if entry is not None else 0
+
+    def set_caught(self, zone_id: int, count: int) -> None:
+        """直接设置区域今天已被钓走的稀有鱼数量并立即写回。"""
+        with self._flush_lock:
+            with self._lock:
+                self._pending.pop(zone_id, None)
+                entry = self._zones.get(zone_id)
+                if entry is not None:
+                    entry.caught = count
+            self.inventory_repo.update_rare_fish_counts({zone_id: count})
+
+    def reset_all(self) -> None:
+        """每日重置：所有区域的稀有鱼计数归零并立即写回。"""
+        with self._flush_lock:
+            zones = self.inventory_repo.get_all_fishing_zones()
+            with self._lock:
+                for zone in zones:
+                    entry = self._zones.get(zone.id)
+                    if entry is None:
+                        self._zones[zone.id] = _ZoneQuota(zone.daily_rare_fish_quota, 0, zone.extra_fishing_cost)
+                    else:
+                        entry.quota = zone.daily_rare_fish_quota
+                        entry.caught = 0
+                        entry.extra_cost = zone.extra_fishing_cost
+                        entry.loaded_at = time.monotonic()
+                    self._pending.pop(zone.id, None)
+            self.inventory_repo.update_rare_fish_counts({zone.id: 0 for zone in zones})
+
+    # --- 写回 ---
+
+    def register_jobs(self, job_scheduler: JobScheduler) -> None:
+        """登记定期写回计数的后台任务；shared 模式下计数直接写入数据库，不需要写回。"""
+        if self.shared:
+            return
+        job_scheduler.add_interval_job("zone_quota_flush", self.flush, self.flush_interval)
+
+    def close(self) -> None:
+        """写回所有计数，在后台任务调度器停止后调用。"""
+        self.flush()
+
+    def flush(self) -> int:
+        """把尚未写回的计数变化量累加到数据库，返回写回的区域数量。"""
+        with self._flush_lock:
+            with self._lock:
+                deltas = {zone_id: delta for zone_id, delta in self._pending.items() if delta}
+                self._pending = {}
+            if not deltas:
+                return 0
+            try:
+                self.inventory_repo.add_rare_fish_counts(deltas)
+            except Exception:
+                # 写回失败的变化量留到下次重试
+                with self._lock:
+                    for zone_id, delta in deltas.items():
+                        self._pending[zone_id] = self._pending.get(zone_id, 0) + delta
+                raise
+            return len(deltas)
@@ -8,12 +8,15 @@ def get_now() -> datetime:
 def get_today() -> date:
     return get_now().date()
 
-def get_fish_template(new_fish_list, coins_chance):
-    sorted_fish_list = sorted(new_fish_list, key=lambda x: x.base_value, reverse=True)
-    random_index = random.randint(0, len(sorted_fish_list) - 1)
+def get_fish_template(sorted_fish_list, coins_chance, rng=random):
+    """
+    从按基础价值降序排列的鱼列表中随机选一条。
+    触发金币加成时选取下一位的鱼。列表需预先排好序（见 FishCatalog），这里只做下标运算。
+    """
+    random_index = rng.randint(0, len(sorted_fish_list) - 1)
     if coins_chance > 0:
         max_move = random_index
-        move_rate = random.random() <= coins_chance
+        move_rate = rng.random() <= coins_chance
         if move_rate:
             return sorted_fish_list[min(max_move + 1, len(sorted_fish_list) - 1)]
         return sorted_fish_list[max_move]
@@ -20,11 +20,20 @@ from .core.repositories.sqlite_gacha_repo import SqliteGachaRepository
 from .core.repositories.sqlite_market_repo import SqliteMarketRepository
 from .core.repositories.sqlite_log_repo import SqliteLogRepository
 from .core.repositories.sqlite_achievement_repo import SqliteAchievementRepository
+from .core.repositories.cached_item_template_repo import CachedItemTemplateRepository
+from .core.repositories.cached_gacha_repo import CachedGachaRepository
+from .core.repositories.cached_user_repo import CachedUserRepository
+from .core.repositories.sqlite_job_run_repo import SqliteJobRunRepository
 from .core.services.data_setup_service import DataSetupService
 from .core.services.item_template_service import ItemTemplateService
 # 服务
 from .core.services.user_service import UserService
 from .core.services.fishing_service import FishingService
+from .core.services.loadout_service import LoadoutService
+from .core.services.zone_quota_service import ZoneQuotaService
+from .core.services.cooldown_service import CooldownService
+from .core.services.auto_fishing_workers import AutoFishingCoordinator
+from .core.services.job_scheduler import JobScheduler
 from .core.services.inventory_service import InventoryService
 from .core.services.shop_service import ShopService
 from .core.services.market_service import MarketService
@@ -34,7 +43,8 @@ from .core.services.game_mechanics_service import GameMechanicsService
 # 其他
 
 from .core.database.migration import run_migrations
-from .core.utils import get_now
+from .core.database.connection_manager import DatabaseConnectionManager
+from .core.database.write_buffer import WriteBehindBuffer
 from .draw.rank import draw_fishing_ranking
 from .manager.server import create_app
 from .utils import get_public_ip, to_percentage, format_accessory_or_rod, safe_datetime_handler
@@ -59,7 +69,13 @@ class FishingPlugin(Star):
         self.area2num = config.get("area2num", 2000)
         self.area3num = config.get("area3num", 500)
         self.game_config = {
-            "fishing": {"cost": 10, "cooldown_seconds": 180},
+            "fishing": {
+                "cost": 10,
+                "cooldown_seconds": 180,
+                # 离线结算模式：自动钓鱼不再逐次抛竿，用户互动或定期巡检时一次补算
+                "accrual_mode": config.get("auto_fishing_accrual_mode", False),
+                "accrual_sweep_minutes": config.get("auto_fishing_accrual_sweep_minutes", 30),
+            },
             "user": {"initial_coins": 200},
             "market": {"listing_tax_rate": 0.05},
             "consecutive_bonuses": {
@@ -114,41 +130,105 @@ class FishingPlugin(Star):
         migrations_path = os.path.join(plugin_root_dir, "core", "database", "migrations")
         run_migrations(db_path, migrations_path)
 
+        # 所有仓储共享同一个连接管理器（WAL 模式 + 可配置 PRAGMA）
+        self.db_manager = DatabaseConnectionManager(db_path, pragmas={
+            "synchronous": config.get("db_synchronous", "NORMAL"),
+            "cache_size": config.get("db_cache_size", -20000),
+            "mmap_size": config.get("db_mmap_size", 268435456),
+            "temp_store": config.get("db_temp_store", "MEMORY"),
+            "busy_timeout": config.get("db_busy_timeout", 5000),
+        }, writer_mode=config.get("db_writer_mode", False),
+            writer_batch_window_ms=config.get("db_writer_batch_window_ms", 5),
+            read_pool_size=config.get("db_read_pool_size", 4))
+
+        # 钓鱼、抽卡、擦弹与税收日志先写入内存缓冲，再由后台任务批量落盘
+        self.log_write_buffer = None
+        log_buffer_rows = config.get("log_buffer_rows", 100)
+        if log_buffer_rows and log_buffer_rows > 0:
+            self.log_write_buffer = WriteBehindBuffer(self.db_manager, max_rows=log_buffer_rows,
+                                                      flush_interval_ms=config.get("log_buffer_interval_ms", 1000))
+
         # --- 2. 组合根：实例化所有仓储层 ---
-        self.user_repo = SqliteUserRepository(db_path)
-        self.item_template_repo = SqliteItemTemplateRepository(db_path)
-        self.inventory_repo = SqliteInventoryRepository(db_path)
-        self.gacha_repo = SqliteGachaRepository(db_path)
-        self.market_repo = SqliteMarketRepository(db_path)
-        self.log_repo = SqliteLogRepository(db_path)
-        self.achievement_repo = SqliteAchievementRepository(db_path)
+        self.user_repo = SqliteUserRepository(self.db_manager)
+        user_cache_size = config.get("user_cache_size", 1000)
+        if user_cache_size and user_cache_size > 0:
+            # 活跃用户的读取走写穿透 LRU 缓存
+            self.user_repo = CachedUserRepository(self.user_repo, self.db_manager, max_size=user_cache_size)
+        # 物品模板与抽卡池只在后台管理中修改，读取走内存目录
+        self.item_template_repo = CachedItemTemplateRepository(SqliteItemTemplateRepository(self.db_manager))
+        self.inventory_repo = SqliteInventoryRepository(self.db_manager)
+        self.gacha_repo = CachedGachaRepository(SqliteGachaRepository(self.db_manager))
+        self.market_repo = SqliteMarketRepository(self.db_manager)
+        self.log_repo = SqliteLogRepository(self.db_manager, self.log_write_buffer)
+        self.achievement_repo = SqliteAchievementRepository(self.db_manager)
+        self.job_run_repo = SqliteJobRunRepository(self.db_manager)
 
         # --- 3. 组合根：实例化所有服务层，并注入依赖 ---
+        # 所有周期性后台任务共用一个调度器与有限大小的线程池
+        self.job_scheduler = JobScheduler(self.job_run_repo, max_workers=config.get("job_workers", 4))
+        # 用户装备快照，抛竿与冷却检查共用
+        self.loadout_service = LoadoutService(self.inventory_repo, self.item_template_repo, self.db_manager,
+                                              max_size=config.get("loadout_cache_size", 1000))
+        # 自动钓鱼可按用户分片到多个子进程，离线结算模式下不逐次抛竿，不需要子进程
+        self.auto_fishing_coordinator = None
+        auto_fishing_workers = config.get("auto_fishing_workers", 0)
+        zone_quota_interval = config.get("zone_quota_flush_interval_seconds", 30)
+        if auto_fishing_workers and auto_fishing_workers > 0:
+            if self.game_config["fishing"]["accrual_mode"]:
+                logger.warning("已开启自动钓鱼离线结算模式，忽略 auto_fishing_workers 配置")
+            else:
+                self.auto_fishing_coordinator = AutoFishingCoordinator(
+                    auto_fishing_workers, os.path.abspath(db_path), self.db_manager.pragmas, self.game_config,
+                    zone_quota_interval, cache_sizes={
+                        "loadout": config.get("loadout_cache_size", 1000),
+                        "cooldown": config.get("cooldown_cache_size", 1000),
+                    })
+        # 区域稀有鱼配额计数保存在内存中，定期写回数据库；有分片进程时直接在数据库中计数
+        self.zone_quota_service = ZoneQuotaService(self.inventory_repo, self.db_manager, zone_quota_interval,
+                                                   shared=self.auto_fishing_coordinator is not None)
+        # 钓鱼冷却保存在内存中，/钓鱼 与自动钓鱼共用
+        self.cooldown_service = CooldownService(self.user_repo, self.loadout_service, self.db_manager,
+                                                self.game_config, max_size=config.get("cooldown_cache_size", 1000))
         self.user_service = UserService(self.user_repo, self.log_repo, self.inventory_repo, self.item_template_repo, self.game_config)
         self.inventory_service = InventoryService(self.inventory_repo, self.user_repo, self.item_template_repo,
-                                                  self.game_config)
+                                                  self.game_config, self.db_manager, self.loadout_service)
         self.shop_service = ShopService(self.item_template_repo, self.inventory_repo, self.user_repo)
         self.market_service = MarketService(self.market_repo, self.inventory_repo, self.user_repo, self.log_repo,
-                                            self.item_template_repo, self.game_config)
+                                            self.item_template_repo, self.game_config, self.db_manager,
+                                            self.loadout_service)
         self.gacha_service = GachaService(self.gacha_repo, self.user_repo, self.inventory_repo, self.item_template_repo,
-                                          self.log_repo, self.achievement_repo)
+                                          self.log_repo, self.achievement_repo, self.db_manager)
         self.game_mechanics_service = GameMechanicsService(self.user_repo, self.log_repo, self.inventory_repo,
-                                                           self.item_template_repo, self.game_config)
+                                                           self.item_template_repo, self.game_config,
+                                                           self.job_scheduler)
         self.achievement_service = AchievementService(self.achievement_repo, self.user_repo, self.inventory_repo,
                                                       self.item_template_repo, self.log_repo)
         self.fishing_service = FishingService(self.user_repo, self.inventory_repo, self.item_template_repo,
-                                              self.log_repo, self.game_config)
-
-        self.item_template_service = ItemTemplateService(self.item_template_repo, self.gacha_repo)
-
-        # --- 4. 启动后台任务 ---
-        self.fishing_service.start_auto_fishing_task()
-        self.achievement_service.start_achievement_check_task()
+                                              self.log_repo, self.game_config, self.db_manager,
+                                              self.loadout_service, self.zone_quota_service,
+                                              self.cooldown_service, self.auto_fishing_coordinator)
+        if self.auto_fishing_coordinator:
+            # 装备变化转发给子进程；子进程抛竿后丢弃主进程中该用户的缓存
+            self.loadout_service.add_listener(self.auto_fishing_coordinator.forget)
+            self.auto_fishing_coordinator.add_listener(self._on_auto_fishing_casts)
+
+        self.item_template_service = ItemTemplateService(self.item_template_repo, self.gacha_repo, self.inventory_repo,
+                                                         self.db_manager, self.zone_quota_service)
+
+        # --- 4. 登记后台任务 ---
+        if self.log_write_buffer:
+            self.log_write_buffer.register_jobs(self.job_scheduler)
+        self.zone_quota_service.register_jobs(self.job_scheduler)
+        self.fishing_service.register_jobs(self.job_scheduler)
+        self.achievement_service.register_jobs(self.job_scheduler)
 
         # --- 5. 初始化核心游戏数据 ---
         data_setup_service = DataSetupService(self.item_template_repo, self.gacha_repo)
         data_setup_service.setup_initial_data()
         self.fishing_service.on_load(area2num=self.area2num, area3num=self.area3num)
+        self.job_scheduler.start()
+        if self.auto_fishing_coordinator:
+            self.auto_fishing_coordinator.start(self.user_repo.get_all_user_ids(auto_fishing_only=True))
 
         # --- Web后台配置 ---
         self.web_admin_task = None
@@ -183,44 +263,42 @@ class FishingPlugin(Star):
     async def fish(self, event: AstrMessageEvent):
         """钓鱼"""
         user_id = event.get_sender_id()
-        user = self.user_repo.get_by_id(user_id)
-        if not user:
-            yield event.plain_result("❌ 您还没有注册，请先使用 /注册 命令注册。")
-            return
-        # 检查用户钓鱼CD
-        lst_time = user.last_fishing_time
-        # 检查是否装备了海洋之心饰品
-        info = self.user_service.get_user_current_accessory(user_id)
-        if info["success"] is False:
-            yield event.plain_result(f"❌ 获取用户饰品信息失败：{info['message']}")
-            return
-        equipped_accessory = info.get("accessory")
-        cooldown_seconds = self.game_config["fishing"]["cooldown_seconds"]
-        if equipped_accessory and equipped_accessory.get("name") == "海洋之心":
-            # 如果装备了海洋之心，CD时间减半
-            cooldown_seconds = self.game_config["fishing"]["cooldown_seconds"] / 2
-            # logger.info(f"用户 {user_id} 装备了海洋之心，钓鱼CD时间减半。")
-        # 修复时区问题
-        now = get_now()
-        if lst_time and lst_time.tzinfo is None and now.tzinfo is not None:
-            # 如果 lst_time 没有时区而 now 有时区，移除 now 的时区信息
-            now = now.replace(tzinfo=None)
-        elif lst_time and lst_time.tzinfo is not None and now.tzinfo is None:
-            # 如果 lst_time 有时区而 now 没有时区，将 now 转换为有时区
-            now = now.replace(tzinfo=lst_time.tzinfo)
-        if lst_time and (now - lst_time).total_seconds() < cooldown_seconds:
-            wait_time = cooldown_seconds - (now - lst_time).total_seconds()
-            yield event.plain_result(f"⏳ 您还需要等待 {int(wait_time)} 秒才能再次钓鱼。")
-            return
+        # 一次指令内的用户与装备只加载一次，冷却检查与抛竿共享同一份数据
+        with self.db_manager.session():
+            message = self._fish_once(user_id)
+        yield event.plain_result(message)
+
+    def _fish_once(self, user_id: str) -> str:
+        """检查冷却并执行一次钓鱼，返回要回复的消息。"""
+        self._settle_auto_fishing(user_id)
+        # 检查用户钓鱼CD（装备海洋之心时减半），冷却中的请求不访问数据库
+        remaining = self.cooldown_service.get_remaining(user_id)
+        if remaining is None:
+            return "❌ 您还没有注册，请先使用 /注册 命令注册。"
+        if remaining > 0:
+            return f"⏳ 您还需要等待 {int(remaining)} 秒才能再次钓鱼。"
         result = self.fishing_service.go_fish(user_id)
         if result:
             if result["success"]:
-                yield event.plain_result(
-                    f"🎣 恭喜你钓到了：{result['fish']['name']}\n✨品质：{'★' * result['fish']['rarity']} \n⚖️重量：{result['fish']['weight']} 克\n💰价值：{result['fish']['value']} 金币")
+                return f"🎣 恭喜你钓到了：{result['fish']['name']}\n✨品质：{'★' * result['fish']['rarity']} \n⚖️重量：{result['fish']['weight']} 克\n💰价值：{result['fish']['value']} 金币"
             else:
-                yield event.plain_result(result["message"])
+                return result["message"]
         else:
-            yield event.plain_result("❌ 出错啦！请稍后再试。")
+            return "❌ 出错啦！请稍后再试。"
+
+    def _settle_auto_fishing(self, user_id: str) -> None:
+        """离线结算模式下，先结算用户错过的自动抛竿，再处理查看或改动鱼塘、金币、装备的指令。"""
+        try:
+            self.fishing_service.settle_accrued_casts(user_id)
+        except Exception as e:
+            logger.error(f"结算用户 {user_id} 的离线自动钓鱼失败: {e}")
+
+    def _on_auto_fishing_casts(self, user_ids) -> None:
+        """自动钓鱼子进程抛竿后调用：丢弃这些用户在主进程中的缓存，下次读取时从数据库加载。"""
+        for user_id in user_ids:
+            if isinstance(self.user_repo, CachedUserRepository):
+                self.user_repo.invalidate(user_id)
+            self.cooldown_service.forget(user_id)
 
     @filter.command("签到")
     async def sign_in(self, event: AstrMessageEvent):
@@ -246,19 +324,35 @@ class FishingPlugin(Star):
     async def fishing_log(self, event: AstrMessageEvent):
         """查看钓鱼记录"""
         user_id = event.get_sender_id()
+        self._settle_auto_fishing(user_id)
         result = self.fishing_service.get_user_fish_log(user_id)
         if result:
             if result["success"]:
                 records = result["records"]
-                if not records:
+                digests = result.get("digests", [])
+                if not records and not digests:
                     yield event.plain_result("❌ 您还没有钓鱼记录。")
                     return
-                message = "【📜 钓鱼记录】：\n"
+                message = ""
+                if records:
+                    message += "【📜 钓鱼记录】：\n"
                 for record in records:
                     message += (f" - {record['fish_name']} ({'★' * record['fish_rarity']})\n"
                                 f" - ⚖️重量: {record['fish_weight']} 克 - 💰价值: {record['fish_value']} 金币\n"
                                 f" - 🔧装备： {record['accessory']} & {record['rod']} | 🎣鱼饵: {record['bait']}\n"
                                 f" - 钓鱼时间: {safe_datetime_handler(record['timestamp'])}\n")
+                if digests:
+                    message += "【🤖 自动钓鱼汇总（每小时）】：\n"
+                for digest in digests:
+                    message += (f" - {safe_datetime_handler(digest['hour_start'])} 起，"
+                                f"抛竿 {digest['casts']} 次，钓到 {digest['successes']} 条\n"
+                                f" - ⚖️总重量: {digest['total_weight']} 克 - 💰总价值: {digest['total_value']} 金币\n")
+                    if digest["best_fish_name"]:
+                        message += (f" - 🏆最佳渔获: {digest['best_fish_name']} "
+                                    f"({digest['best_fish_weight']} 克, {digest['best_fish_value']} 金币)\n")
+                    if digest["fish"]:
+                        message += " - 🐟" + "、".join(f"{fish['fish_name']}×{fish['quantity']}"
+                                                      for fish in digest["fish"]) + "\n"
                 yield event.plain_result(message)
             else:
                 yield event.plain_result(f"❌ 获取钓鱼记录失败：{result['message']}")
@@ -271,6 +365,7 @@ class FishingPlugin(Star):
     async def pond(self, event: AstrMessageEvent):
         """查看用户鱼塘内的鱼"""
         user_id = event.get_sender_id()
+        self._settle_auto_fishing(user_id)
         pond_fish = self.inventory_service.get_user_fish_pond(user_id)
         if pond_fish:
             fishes = pond_fish["fishes"]
@@ -299,6 +394,7 @@ class FishingPlugin(Star):
     async def pond_capacity(self, event: AstrMessageEvent):
         """查看用户鱼塘容量"""
         user_id = event.get_sender_id()
+        self._settle_auto_fishing(user_id)
         pond_capacity = self.inventory_service.get_user_fish_pond_capacity(user_id)
         if pond_capacity["success"]:
             message = f"🐠 您的鱼塘容量为 {pond_capacity['current_fish_count']} / {pond_capacity['fish_pond_capacity']} 条鱼。"
@@ -310,6 +406,7 @@ class FishingPlugin(Star):
     async def upgrade_pond(self, event: AstrMessageEvent):
         """升级鱼塘容量"""
         user_id = event.get_sender_id()
+        self._settle_auto_fishing(user_id)
         result = self.inventory_service.upgrade_fish_pond(user_id)
         if result["success"]:
             yield event.plain_result(f"🐠 鱼塘升级成功！新容量为 {result['new_capacity']} 条鱼。")
@@ -370,6 +467,7 @@ class FishingPlugin(Star):
     async def use_rod(self, event: AstrMessageEvent):
         """使用鱼竿"""
         user_id = event.get_sender_id()
+        self._settle_auto_fishing(user_id)
         rod_info = self.inventory_service.get_user_rod_inventory(user_id)
         if not rod_info or not rod_info["rods"]:
             yield event.plain_result("❌ 您还没有鱼竿，请先购买或抽奖获得。")
@@ -396,6 +494,7 @@ class FishingPlugin(Star):
     async def use_bait(self, event: AstrMessageEvent):
         """使用鱼饵"""
         user_id = event.get_sender_id()
+        self._settle_auto_fishing(user_id)
         bait_info = self.inventory_service.get_user_bait_inventory(user_id)
         if not bait_info or not bait_info["baits"]:
             yield event.plain_result("❌ 您还没有鱼饵，请先购买或抽奖获得。")
@@ -421,6 +520,7 @@ class FishingPlugin(Star):
     async def use_accessories(self, event: AstrMessageEvent):
         """使用饰品"""
         user_id = event.get_sender_id()
+        self._settle_auto_fishing(user_id)
         accessories_info = self.inventory_service.get_user_accessory_inventory(user_id)
         if not accessories_info or not accessories_info["accessories"]:
             yield event.plain_result("❌ 您还没有饰品，请先购买或抽奖获得。")
@@ -446,6 +546,7 @@ class FishingPlugin(Star):
     async def coins(self, event: AstrMessageEvent):
         """查看用户金币信息"""
         user_id = event.get_sender_id()
+        self._settle_auto_fishing(user_id)
         user = self.user_repo.get_by_id(user_id)
         if user:
             yield event.plain_result(f"💰 您的金币余额：{user.coins} 金币")
@@ -458,6 +559,7 @@ class FishingPlugin(Star):
     async def sell_all(self, event: AstrMessageEvent):
         """卖出用户所有鱼"""
         user_id = event.get_sender_id()
+        self._settle_auto_fishing(user_id)
         result = self.inventory_service.sell_all_fish(user_id)
         if result:
             yield event.plain_result(result["message"])
@@ -468,6 +570,7 @@ class FishingPlugin(Star):
     async def sell_keep(self, event: AstrMessageEvent):
         """卖出用户鱼，但保留每种鱼一条"""
         user_id = event.get_sender_id()
+        self._settle_auto_fishing(user_id)
         result = self.inventory_service.sell_all_fish(user_id, keep_one=True)
         if result:
             yield event.plain_result(result["message"])
@@ -478,6 +581,7 @@ class FishingPlugin(Star):
     async def sell_by_rarity(self, event: AstrMessageEvent):
         """按稀有度出售鱼"""
         user_id = event.get_sender_id()
+        self._settle_auto_fishing(user_id)
         args = event.message_str.split(" ")
         if len(args) < 2:
             yield event.plain_result("❌ 请指定要出售的稀有度，例如：/出售稀有度 3")
@@ -959,6 +1063,8 @@ class FishingPlugin(Star):
         if int(target_id) == int(user_id):
             yield event.plain_result("不能偷自己的鱼哦！")
             return
+        self._settle_auto_fishing(user_id)
+        self._settle_auto_fishing(str(target_id))
         result = self.game_mechanics_service.steal_fish(user_id, target_id)
         if result:
             if result["success"]:
@@ -1048,6 +1154,7 @@ class FishingPlugin(Star):
     async def fishing_area(self, event: AstrMessageEvent):
         """查看当前钓鱼区域"""
         user_id = event.get_sender_id()
+        self._settle_auto_fishing(user_id)
         args = event.message_str.split(" ")
         if len(args) < 2:
             result = self.fishing_service.get_user_fishing_zones(user_id)
@@ -1058,6 +1165,8 @@ class FishingPlugin(Star):
                     for zone in zones:
                         message += f"区域名称: {zone['name']} (ID: {zone['zone_id']}) {'✅' if zone['whether_in_use'] else ''}\n"
                         message += f"描述: {zone['description']}\n"
+                        if zone['extra_fishing_cost'] > 0:
+                            message += f"每次钓鱼额外消耗: {zone['extra_fishing_cost']} 金币\n"
                         if zone['zone_id'] >= 2:
                             message += f"稀有鱼类数量: {zone['daily_rare_fish_quota']}（{zone['rare_fish_caught_today']}）\n"
                     message += "使用「/钓鱼区域 ID」命令切换钓鱼区域。\n"
@@ -1072,9 +1181,6 @@ class FishingPlugin(Star):
             yield event.plain_result("❌ 钓鱼区域 ID 必须是数字，请检查后重试。")
             return
         zone_id = int(zone_id)
-        if zone_id not in [1, 2, 3]:
-            yield event.plain_result("❌ 钓鱼区域 ID 必须是 1、2 或 3，请检查后重试。")
-            return
         # 切换用户的钓鱼区域
         result = self.fishing_service.set_user_fishing_zone(user_id, zone_id)
         yield event.plain_result(result["message"] if result else "❌ 出错啦！请稍后再试。")
@@ -1366,8 +1472,13 @@ class FishingPlugin(Star):
     async def terminate(self):
         """插件被卸载/停用时调用"""
         logger.info("钓鱼插件正在终止...")
-        self.fishing_service.stop_auto_fishing_task()
-        self.achievement_service.stop_achievement_check_task()
+        self.job_scheduler.close()
+        if self.auto_fishing_coordinator:
+            self.auto_fishing_coordinator.close()
         if self.web_admin_task:
             self.web_admin_task.cancel()
+        self.zone_quota_service.close()
+        if self.log_write_buffer:
+            self.log_write_buffer.close()
+        self.db_manager.close_all()
         logger.info("钓鱼插件已成功终止。")
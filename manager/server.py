@@ -106,7 +106,11 @@ async def edit_fish(fish_id):
 @login_required
 async def delete_fish(fish_id):
     item_template_service = current_app.config["ITEM_TEMPLATE_SERVICE"]
-    item_template_service.delete_fish_template(fish_id)
+    try:
+        item_template_service.delete_fish_template(fish_id)
+    except ValueError as e:
+        await flash(f"删除失败：{e}", "danger")
+        return redirect(url_for("admin_bp.manage_fish"))
     await flash(f"鱼类ID {fish_id} 已删除！", "warning")
     return redirect(url_for("admin_bp.manage_fish"))
 
@@ -148,7 +152,11 @@ async def edit_rod(rod_id):
 async def delete_rod(rod_id):
     item_template_service = current_app.config["ITEM_TEMPLATE_SERVICE"]
     # 调用服务层方法删除指定的鱼竿模板
-    item_template_service.delete_rod_template(rod_id)
+    try:
+        item_template_service.delete_rod_template(rod_id)
+    except ValueError as e:
+        await flash(f"删除失败：{e}", "danger")
+        return redirect(url_for("admin_bp.manage_rods"))
     await flash(f"鱼竿ID {rod_id} 已删除！", "warning")
     return redirect(url_for("admin_bp.manage_rods"))
 
@@ -186,7 +194,11 @@ async def edit_bait(bait_id):
 @login_required
 async def delete_bait(bait_id):
     item_template_service = current_app.config["ITEM_TEMPLATE_SERVICE"]
-    item_template_service.delete_bait_template(bait_id)
+    try:
+        item_template_service.delete_bait_template(bait_id)
+    except ValueError as e:
+        await flash(f"删除失败：{e}", "danger")
+        return redirect(url_for("admin_bp.manage_baits"))
     await flash(f"鱼饵ID {bait_id} 已删除！", "warning")
     return redirect(url_for("admin_bp.manage_baits"))
 
@@ -224,11 +236,52 @@ async def edit_accessory(accessory_id):
 @login_required
 async def delete_accessory(accessory_id):
     item_template_service = current_app.config["ITEM_TEMPLATE_SERVICE"]
-    item_template_service.delete_accessory_template(accessory_id)
+    try:
+        item_template_service.delete_accessory_template(accessory_id)
+    except ValueError as e:
+        await flash(f"删除失败：{e}", "danger")
+        return redirect(url_for("admin_bp.manage_accessories"))
     await flash(f"饰品ID {accessory_id} 已删除！", "warning")
     return redirect(url_for("admin_bp.manage_accessories"))
 
 
+# --- 钓鱼区域掉落表管理 ---
+@admin_bp.route("/zones")
+@login_required
+async def manage_zones():
+    item_template_service = current_app.config["ITEM_TEMPLATE_SERVICE"]
+    zones = item_template_service.get_zones_for_admin()
+    return await render_template("zones.html", zones=zones)
+
+
+@admin_bp.route("/zones/add", methods=["POST"])
+@login_required
+async def add_zone():
+    form = await request.form
+    item_template_service = current_app.config["ITEM_TEMPLATE_SERVICE"]
+    try:
+        item_template_service.add_fishing_zone(form.to_dict())
+    except ValueError as e:
+        await flash(f"添加失败：{e}", "danger")
+        return redirect(url_for("admin_bp.manage_zones"))
+    await flash("钓鱼区域添加成功！", "success")
+    return redirect(url_for("admin_bp.manage_zones"))
+
+
+@admin_bp.route("/zones/edit/<int:zone_id>", methods=["POST"])
+@login_required
+async def edit_zone_weights(zone_id):
+    form = await request.form
+    item_template_service = current_app.config["ITEM_TEMPLATE_SERVICE"]
+    try:
+        item_template_service.update_zone_rarity_weights(zone_id, form.to_dict())
+    except ValueError as e:
+        await flash(f"更新失败：{e}", "danger")
+        return redirect(url_for("admin_bp.manage_zones"))
+    await flash(f"区域ID {zone_id} 的掉落表更新成功！", "success")
+    return redirect(url_for("admin_bp.manage_zones"))
+
+
 # --- 抽卡池管理 ---
 @admin_bp.route("/gacha")
 @login_required
@@ -0,0 +1,58 @@
+"""
+测试公共夹具。在插件根目录下运行 pytest，需要 AstrBot 运行环境（astrbot.api）。
+"""
+import importlib.util
+import os
+import sqlite3
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from core.database.connection_manager import DatabaseConnectionManager  # noqa: E402
+
+MIGRATIONS_DIR = os.path.join(ROOT, "core", "database", "migrations")
+
+
+def apply_migrations(db_path: str) -> None:
+    """按顺序执行所有迁移脚本的 up()，与 run_migrations 相同但不依赖插件的包路径。"""
+    filenames = sorted(f for f in os.listdir(MIGRATIONS_DIR) if f[:3].isdigit() and f.endswith(".py"))
+    with sqlite3.connect(db_path) as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        for filename in filenames:
+            spec = importlib.util.spec_from_file_location(f"migration_{filename[:3]}",
+                                                          os.path.join(MIGRATIONS_DIR, filename))
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            module.up(cursor)
+        conn.commit()
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """已执行全部迁移的数据库文件路径。"""
+    path = str(tmp_path / "fish.db")
+    apply_migrations(path)
+    return path
+
+
+@pytest.fixture
+def db_manager(db_path):
+    manager = DatabaseConnectionManager(db_path)
+    yield manager
+    manager.close_all()
+
+
+@pytest.fixture
+def add_user(db_manager):
+    """插入一个测试用户，返回用户ID。"""
+    def add(user_id: str = "u1", coins: int = 1000) -> str:
+        with db_manager.transaction():
+            db_manager.get_connection().execute(
+                "INSERT INTO users (user_id, nickname, coins) VALUES (?, ?, ?)", (user_id, user_id, coins)
+            )
+        return user_id
+    return add
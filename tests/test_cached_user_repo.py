@@ -0,0 +1,40 @@
+import threading
+
+from core.repositories.cached_user_repo import CachedUserRepository
+from core.repositories.sqlite_user_repo import SqliteUserRepository
+
+
+def test_write_during_load_is_not_cached_and_not_tracked_after(db_manager, add_user):
+    for user_id in ("u1", "u2", "u3"):
+        add_user(user_id)
+    loading = threading.Event()
+    resume = threading.Event()
+
+    class SlowRepo(SqliteUserRepository):
+        def get_by_id(self, user_id):
+            user = super().get_by_id(user_id)
+            if user_id == "u1" and not loading.is_set():
+                loading.set()
+                resume.wait(timeout=5)
+            return user
+
+    repo = CachedUserRepository(SlowRepo(db_manager), db_manager, max_size=2)
+    loader = threading.Thread(target=lambda: repo.get_by_id("u1"))
+    loader.start()
+    assert loading.wait(timeout=5)
+
+    # 加载期间写入的用户不能被旧数据回填
+    user = SqliteUserRepository(db_manager).get_by_id("u1")
+    user.coins = 5
+    repo.update(user)
+    resume.set()
+    loader.join(timeout=5)
+    assert repo.get_by_id("u1").coins == 5
+
+    for user_id in ("u2", "u3", "u1"):
+        user = repo.get_by_id(user_id)
+        user.coins += 1
+        repo.update(user)
+    # 写入次数只为正在加载的用户记录，不随用户数量增长
+    assert repo._versions == {} and repo._loading == {}
+    assert repo.get_stats()["size"] == 2
@@ -0,0 +1,48 @@
+import random
+
+import pytest
+
+from core.domain.fish_catalog import FishCatalog
+from core.domain.models import Fish
+from core.domain.zone_loot import ZoneLootTable
+from core.services import cast_resolver
+from core.services.cast_resolver import CastLoadout, CastModifiers, CastResolver
+
+
+def _loadouts(count):
+    catalog = FishCatalog([
+        Fish(fish_id=fish_id, name=f"fish-{fish_id}", description="", rarity=fish_id % 3 + 1,
+             base_value=10 * fish_id, min_weight=1, max_weight=100)
+        for fish_id in range(1, 13)
+    ])
+    loot_table = ZoneLootTable(1, {1: 0.6, 2: 0.3, 3: 0.1})
+    return [CastLoadout(CastModifiers(), loot_table, catalog, True) for _ in range(count)]
+
+
+def _check(loadouts, outcomes):
+    assert len(outcomes) == len(loadouts)
+    for outcome in outcomes:
+        if outcome.success:
+            assert outcome.fish is not None
+            assert outcome.fish.min_weight <= outcome.weight <= outcome.fish.max_weight
+            assert outcome.value == outcome.fish.base_value
+
+
+def test_resolve_batch_without_numpy_falls_back_to_resolve(monkeypatch):
+    monkeypatch.setattr(cast_resolver, "np", None)
+    loadouts = _loadouts(200)
+
+    outcomes = CastResolver(random.Random(7)).resolve_batch(loadouts)
+    _check(loadouts, outcomes)
+    # 未安装 numpy 时逐个调用 resolve，随机数序列与逐次结算相同
+    expected = CastResolver(random.Random(7))
+    assert outcomes == [expected.resolve(loadout) for loadout in loadouts]
+
+
+def test_resolve_batch_with_numpy():
+    np = pytest.importorskip("numpy")
+    loadouts = _loadouts(200)
+
+    outcomes = CastResolver().resolve_batch(loadouts, np.random.default_rng(7))
+    _check(loadouts, outcomes)
+    assert any(outcome.success for outcome in outcomes)
@@ -0,0 +1,54 @@
+import threading
+
+from core.database.connection_manager import DatabaseConnectionManager
+from core.repositories.sqlite_job_run_repo import SqliteJobRunRepository
+
+
+def test_after_commit_write_in_writer_mode_does_not_deadlock(db_path):
+    manager = DatabaseConnectionManager(db_path, writer_mode=True)
+    repo = SqliteJobRunRepository(manager)
+
+    def record(name, started_at):
+        repo.mark_started(name)
+        repo.mark_finished(name, started_at, 0, "ok")
+
+    def work():
+        with manager.transaction():
+            record("outer", 1)
+            # 提交回调中的写操作在持有写锁的线程上直接执行
+            manager.after_commit(lambda: record("after_commit", 2))
+
+    worker = threading.Thread(target=work, daemon=True)
+    worker.start()
+    worker.join(timeout=5)
+    if worker.is_alive():
+        # 死锁时写线程无法停止，不调用 close_all
+        raise AssertionError("after_commit 回调中的写操作与写线程死锁")
+    try:
+        assert repo.get_last_runs() == {"outer": 1, "after_commit": 2}
+        # 回调之外的写操作仍然投递给写线程
+        record("queued", 3)
+        assert manager.get_writer_stats()["jobs"] >= 1
+    finally:
+        manager.close_all()
+
+
+def test_reader_waiting_for_pool_survives_close_all(db_path):
+    manager = DatabaseConnectionManager(db_path, read_pool_size=1)
+    repo = SqliteJobRunRepository(manager)
+    results = []
+
+    with manager.read_scope():
+        # 唯一的只读连接已被借出，另一个读线程只能等待
+        reader = threading.Thread(target=lambda: results.append(repo.get_last_runs()), daemon=True)
+        reader.start()
+        reader.join(timeout=0.2)
+        assert reader.is_alive()
+        manager.close_all()
+
+    reader.join(timeout=5)
+    try:
+        assert not reader.is_alive(), "close_all() 之后等待只读连接的线程没有被唤醒"
+        assert results == [{}]
+    finally:
+        manager.close_all()
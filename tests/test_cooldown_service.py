@@ -0,0 +1,24 @@
+from datetime import datetime, timezone
+
+from core.repositories.sqlite_inventory_repo import SqliteInventoryRepository
+from core.repositories.sqlite_item_template_repo import SqliteItemTemplateRepository
+from core.repositories.sqlite_user_repo import SqliteUserRepository
+from core.services.cooldown_service import CooldownService
+from core.services.loadout_service import LoadoutService
+
+
+def test_entries_are_bounded(db_manager, add_user):
+    loadout_service = LoadoutService(SqliteInventoryRepository(db_manager), SqliteItemTemplateRepository(db_manager),
+                                     db_manager)
+    service = CooldownService(SqliteUserRepository(db_manager), loadout_service, db_manager,
+                              {"fishing": {"cooldown_seconds": 180}}, max_size=2)
+    for user_id in ("u1", "u2", "u3"):
+        add_user(user_id)
+        assert service.get_remaining(user_id) == 0
+        service.record_cast(user_id, datetime.now(timezone.utc))
+
+    # 最久未使用的 u1 被淘汰，变化次数只为正在加载的用户记录
+    assert list(service._entries) == ["u2", "u3"]
+    assert service._versions == {} and service._loading == {}
+    assert service.get_remaining("u3") > 170
+    assert service.get_remaining("missing") is None
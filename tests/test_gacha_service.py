@@ -0,0 +1,42 @@
+from core.repositories.sqlite_achievement_repo import SqliteAchievementRepository
+from core.repositories.sqlite_gacha_repo import SqliteGachaRepository
+from core.repositories.sqlite_inventory_repo import SqliteInventoryRepository
+from core.repositories.sqlite_item_template_repo import SqliteItemTemplateRepository
+from core.repositories.sqlite_log_repo import SqliteLogRepository
+from core.repositories.sqlite_user_repo import SqliteUserRepository
+from core.services.gacha_service import GachaService
+
+
+def test_draw_from_pool_with_zero_weights_fails_cleanly(db_manager, add_user, monkeypatch):
+    user_id = add_user(coins=1000)
+    gacha_repo = SqliteGachaRepository(db_manager)
+    user_repo = SqliteUserRepository(db_manager)
+    service = GachaService(
+        gacha_repo, user_repo, SqliteInventoryRepository(db_manager), SqliteItemTemplateRepository(db_manager),
+        SqliteLogRepository(db_manager), SqliteAchievementRepository(db_manager), db_manager,
+    )
+    with db_manager.transaction():
+        conn = db_manager.get_connection()
+        pool_id = conn.execute(
+            "INSERT INTO gacha_pools (name, description, cost_coins) VALUES ('零权重奖池', '', 10)"
+        ).lastrowid
+        conn.execute("""
+            INSERT INTO gacha_pool_items (gacha_pool_id, item_type, item_id, quantity, weight)
+            VALUES (?, 'coins', 0, 100, 1), (?, 'coins', 0, 200, 1)
+        """, (pool_id, pool_id))
+
+    # 表上的 CHECK 约束拦住了 0 权重，这里模拟绕过约束写入的旧数据
+    get_pool_by_id = gacha_repo.get_pool_by_id
+
+    def zero_weight_pool(requested_pool_id):
+        pool = get_pool_by_id(requested_pool_id)
+        for item in pool.items:
+            item.weight = 0
+        return pool
+
+    monkeypatch.setattr(gacha_repo, "get_pool_by_id", zero_weight_pool)
+    result = service.perform_draw(user_id, pool_id, 10)
+
+    assert result == {"success": False, "message": "抽卡失败，请检查卡池配置"}
+    # 抽卡失败不扣费
+    assert user_repo.get_by_id(user_id).coins == 1000
@@ -0,0 +1,153 @@
+import pytest
+
+from core.repositories.sqlite_item_template_repo import SqliteItemTemplateRepository
+from core.repositories.sqlite_inventory_repo import SqliteInventoryRepository
+from core.repositories.sqlite_gacha_repo import SqliteGachaRepository
+from core.services.item_template_service import ItemTemplateService
+
+
+@pytest.fixture
+def service(db_manager):
+    return ItemTemplateService(
+        SqliteItemTemplateRepository(db_manager),
+        SqliteGachaRepository(db_manager),
+        SqliteInventoryRepository(db_manager),
+        db_manager,
+    )
+
+
+def _insert(db_manager, sql, params=()):
+    with db_manager.transaction():
+        return db_manager.get_connection().execute(sql, params).lastrowid
+
+
+def _count(db_manager, sql, params=()):
+    return db_manager.get_connection().execute(sql, params).fetchone()[0]
+
+
+def _add_rod(db_manager):
+    return _insert(db_manager, "INSERT INTO rods (name, rarity, source) VALUES ('测试鱼竿', 1, 'shop')")
+
+
+def _add_fish(db_manager):
+    return _insert(db_manager, """
+        INSERT INTO fish (name, rarity, base_value, min_weight, max_weight) VALUES ('测试鱼', 1, 10, 1, 100)
+    """)
+
+
+def test_delete_rod_in_use_is_refused(service, db_manager, add_user):
+    user_id = add_user()
+    rod_id = _add_rod(db_manager)
+    _insert(db_manager, "INSERT INTO user_rods (user_id, rod_id, current_durability) VALUES (?, ?, 10)",
+            (user_id, rod_id))
+
+    with pytest.raises(ValueError):
+        service.delete_rod_template(rod_id)
+
+    assert _count(db_manager, "SELECT COUNT(*) FROM rods WHERE rod_id = ?", (rod_id,)) == 1
+    assert _count(db_manager, "SELECT COUNT(*) FROM user_rods WHERE rod_id = ?", (rod_id,)) == 1
+
+
+def test_delete_unused_rod(service, db_manager):
+    rod_id = _add_rod(db_manager)
+    service.delete_rod_template(rod_id)
+    assert _count(db_manager, "SELECT COUNT(*) FROM rods WHERE rod_id = ?", (rod_id,)) == 0
+
+
+def test_delete_bait_held_by_user_is_refused(service, db_manager, add_user):
+    user_id = add_user()
+    bait_id = _insert(db_manager, "INSERT INTO baits (name, rarity) VALUES ('测试鱼饵', 1)")
+    _insert(db_manager, "INSERT INTO user_bait_inventory (user_id, bait_id, quantity) VALUES (?, ?, 3)",
+            (user_id, bait_id))
+
+    with pytest.raises(ValueError):
+        service.delete_bait_template(bait_id)
+    assert _count(db_manager, "SELECT quantity FROM user_bait_inventory WHERE bait_id = ?", (bait_id,)) == 3
+
+
+def test_delete_accessory_in_use_is_refused(service, db_manager, add_user):
+    user_id = add_user()
+    accessory_id = _insert(db_manager, "INSERT INTO accessories (name, rarity) VALUES ('测试饰品', 1)")
+    _insert(db_manager, "INSERT INTO user_accessories (user_id, accessory_id) VALUES (?, ?)",
+            (user_id, accessory_id))
+
+    with pytest.raises(ValueError):
+        service.delete_accessory_template(accessory_id)
+    assert _count(db_manager, "SELECT COUNT(*) FROM user_accessories WHERE accessory_id = ?",
+                  (accessory_id,)) == 1
+
+
+def test_delete_fish_with_records_is_refused(service, db_manager, add_user):
+    user_id = add_user()
+    fish_id = _add_fish(db_manager)
+    _insert(db_manager, "INSERT INTO fishing_records (user_id, fish_id, weight, value) VALUES (?, ?, 50, 10)",
+            (user_id, fish_id))
+
+    with pytest.raises(ValueError):
+        service.delete_fish_template(fish_id)
+    assert _count(db_manager, "SELECT COUNT(*) FROM fish WHERE fish_id = ?", (fish_id,)) == 1
+
+
+def test_delete_fish_restrict_error_becomes_value_error(db_manager, add_user):
+    # 绕过服务层的检查，仓储也会把外键错误转换为 ValueError
+    user_id = add_user()
+    fish_id = _add_fish(db_manager)
+    _insert(db_manager, "INSERT INTO fishing_records (user_id, fish_id, weight, value) VALUES (?, ?, 50, 10)",
+            (user_id, fish_id))
+
+    with pytest.raises(ValueError):
+        SqliteItemTemplateRepository(db_manager).delete_fish_template(fish_id)
+
+
+def _zone_form(zone_id, **weights):
+    form = {"id": str(zone_id), "name": f"测试区域{zone_id}", "description": "", "daily_rare_fish_quota": "5"}
+    form.update({f"weight_{rarity}": "1" for rarity in range(1, 7)})
+    form.update(weights)
+    return form
+
+
+def test_add_fishing_zone(service, db_manager):
+    service.add_fishing_zone(_zone_form(99, extra_fishing_cost="20"))
+    zones = {zone["id"]: zone for zone in service.get_zones_for_admin()}
+    assert zones[99]["weights"] == {rarity: 1.0 for rarity in range(1, 7)}
+    assert zones[99]["extra_fishing_cost"] == 20
+
+
+def test_add_duplicate_zone_raises_value_error(service, db_manager):
+    service.add_fishing_zone(_zone_form(99))
+    with pytest.raises(ValueError):
+        service.add_fishing_zone(_zone_form(99, weight_1="5"))
+    # 已有区域的掉落表不受失败的添加影响
+    zones = {zone["id"]: zone for zone in service.get_zones_for_admin()}
+    assert zones[99]["weights"][1] == 1.0
+
+
+@pytest.mark.parametrize("raw", ["nan", "inf", "-1"])
+def test_add_zone_rejects_invalid_weights(service, db_manager, raw):
+    with pytest.raises(ValueError):
+        service.add_fishing_zone(_zone_form(99, weight_2=raw))
+    assert 99 not in {zone["id"] for zone in service.get_zones_for_admin()}
+
+
+def test_add_zone_is_atomic(service, db_manager, monkeypatch):
+    def fail(zone_id, weights):
+        raise RuntimeError("写入掉落表失败")
+
+    monkeypatch.setattr(service.item_template_repo, "update_zone_rarity_weights", fail)
+    with pytest.raises(RuntimeError):
+        service.add_fishing_zone(_zone_form(99))
+    assert 99 not in {zone["id"] for zone in service.get_zones_for_admin()}
+
+
+@pytest.mark.parametrize("field", ["id", "name"])
+def test_add_zone_missing_field_raises_value_error(service, db_manager, field):
+    form = _zone_form(99)
+    del form[field]
+    with pytest.raises(ValueError):
+        service.add_fishing_zone(form)
+    assert 99 not in {zone["id"] for zone in service.get_zones_for_admin()}
+
+
+def test_update_weights_of_missing_zone_raises_value_error(service, db_manager):
+    with pytest.raises(ValueError):
+        service.update_zone_rarity_weights(99, _zone_form(99))
@@ -0,0 +1,45 @@
+import time
+
+from core.repositories.sqlite_job_run_repo import SqliteJobRunRepository
+from core.services.job_scheduler import JobScheduler
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_failed_daily_job_is_retried_after_restart(db_manager):
+    repo = SqliteJobRunRepository(db_manager)
+    # 上次成功执行在两天前，启动后立即补跑
+    two_days_ago = int(time.time()) - 2 * 86400
+    repo.mark_started("daily_taxes")
+    repo.mark_finished("daily_taxes", two_days_ago, 0, "ok")
+
+    calls = []
+
+    def fail():
+        calls.append(time.time())
+        raise RuntimeError("收税失败")
+
+    scheduler = JobScheduler(repo, max_workers=1)
+    scheduler.add_daily_job("daily_taxes", fail)
+    scheduler.start()
+    try:
+        assert _wait_for(lambda: scheduler.get_stats()["daily_taxes"]["failures"] == 1)
+    finally:
+        scheduler.close()
+
+    # 失败的执行不算数，重启后再次补跑
+    assert repo.get_last_runs()["daily_taxes"] == two_days_ago
+    scheduler = JobScheduler(repo, max_workers=1)
+    scheduler.add_daily_job("daily_taxes", lambda: calls.append(time.time()))
+    scheduler.start()
+    try:
+        assert _wait_for(lambda: scheduler.get_stats()["daily_taxes"]["runs"] == 1)
+    finally:
+        scheduler.close()
+    assert len(calls) == 2
+    assert repo.get_last_runs()["daily_taxes"] > two_days_ago
@@ -0,0 +1,19 @@
+from core.repositories.sqlite_inventory_repo import SqliteInventoryRepository
+from core.repositories.sqlite_item_template_repo import SqliteItemTemplateRepository
+from core.repositories.sqlite_user_repo import SqliteUserRepository
+from core.services.loadout_service import LoadoutService
+
+
+def test_invalidation_versions_do_not_grow_with_users(db_manager, add_user):
+    service = LoadoutService(SqliteInventoryRepository(db_manager), SqliteItemTemplateRepository(db_manager),
+                             db_manager, max_size=2)
+    user_repo = SqliteUserRepository(db_manager)
+    for user_id in ("u1", "u2", "u3"):
+        add_user(user_id)
+        service.get_loadout(user_repo.get_by_id(user_id))
+        service.invalidate(user_id)
+    service.clear()
+
+    # 作废次数只为正在构建快照的用户记录
+    assert service._versions == {} and service._building == {}
+    assert service.get_stats()["size"] == 0
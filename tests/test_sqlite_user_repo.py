@@ -0,0 +1,39 @@
+import pytest
+
+from core.repositories.sqlite_user_repo import SqliteUserRepository
+
+
+def _coins(db_manager, user_id):
+    return db_manager.get_connection().execute("SELECT coins FROM users WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+
+def test_rolled_back_update_is_written_again(db_manager, add_user):
+    user_id = add_user(coins=1000)
+    repo = SqliteUserRepository(db_manager)
+    user = repo.get_by_id(user_id)
+    user.coins += 50
+
+    with pytest.raises(RuntimeError):
+        with db_manager.transaction():
+            repo.update(user)
+            raise RuntimeError("结算失败")
+
+    # 回滚后对象仍记得未写回的变化，重试时再次写回
+    assert user.get_changes() == {"coins": (1000, 1050)}
+    repo.update(user)
+    assert _coins(db_manager, user_id) == 1050
+
+
+def test_repeated_updates_in_transaction_write_each_delta_once(db_manager, add_user):
+    user_id = add_user(coins=1000)
+    repo = SqliteUserRepository(db_manager)
+    user = repo.get_by_id(user_id)
+
+    with db_manager.transaction():
+        user.coins -= 10
+        repo.update(user)
+        user.coins -= 10
+        repo.update(user)
+
+    assert _coins(db_manager, user_id) == 980
+    assert user.get_changes() == {}
@@ -0,0 +1,107 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from core.database.write_buffer import WriteBehindBuffer
+from core.domain.models import AutoFishingDigest, FishingRecord
+from core.repositories.sqlite_job_run_repo import SqliteJobRunRepository
+from core.repositories.sqlite_log_repo import SqliteLogRepository
+from core.services.job_scheduler import JobScheduler
+
+
+@pytest.fixture
+def write_buffer(db_manager):
+    buffer = WriteBehindBuffer(db_manager, max_rows=100)
+    # 只登记刷新任务，不启动调度器，由测试手动 flush
+    buffer.register_jobs(JobScheduler(SqliteJobRunRepository(db_manager)))
+    return buffer
+
+
+@pytest.fixture
+def fish_id(db_manager):
+    with db_manager.transaction():
+        return db_manager.get_connection().execute("""
+            INSERT INTO fish (name, rarity, base_value, min_weight, max_weight) VALUES ('测试鱼', 1, 10, 1, 100)
+        """).lastrowid
+
+
+def _record_count(db_manager, user_id):
+    return db_manager.get_connection().execute(
+        "SELECT COUNT(*) FROM fishing_records WHERE user_id = ?", (user_id,)
+    ).fetchone()[0]
+
+
+def test_rolled_back_cast_leaves_no_fishing_record(db_manager, write_buffer, add_user, fish_id):
+    user_id = add_user()
+    log_repo = SqliteLogRepository(db_manager, write_buffer)
+    flushed_during_transaction = []
+
+    with pytest.raises(RuntimeError):
+        with db_manager.transaction():
+            log_repo.add_fishing_record(FishingRecord(
+                record_id=0, user_id=user_id, fish_id=fish_id, weight=50, value=10, timestamp=None,
+            ))
+            # 模拟事务进行中触发的后台刷新：它会等待写锁，在回滚之后执行
+            flusher = threading.Thread(target=lambda: flushed_during_transaction.append(write_buffer.flush()))
+            flusher.start()
+            raise RuntimeError("抛竿结算失败")
+    flusher.join(timeout=5)
+
+    write_buffer.flush()
+    assert flushed_during_transaction == [0]
+    assert _record_count(db_manager, user_id) == 0
+    assert write_buffer.get_stats()["queued"] == 0
+
+
+def test_committed_cast_is_flushed(db_manager, write_buffer, add_user, fish_id):
+    user_id = add_user()
+    log_repo = SqliteLogRepository(db_manager, write_buffer)
+
+    with db_manager.transaction():
+        log_repo.add_fishing_record(FishingRecord(
+            record_id=0, user_id=user_id, fish_id=fish_id, weight=50, value=10, timestamp=None,
+        ))
+        assert write_buffer.get_stats()["pending"] == 0
+
+    assert write_buffer.get_stats()["pending"] == 1
+    write_buffer.flush()
+    assert _record_count(db_manager, user_id) == 1
+
+
+def _auto_digest(user_id, fish_id):
+    hour_start = datetime(2026, 1, 1, 8, tzinfo=timezone(timedelta(hours=8)))
+    digest = AutoFishingDigest(user_id=user_id, hour_start=hour_start)
+    digest.add_cast(fish_id, weight=50, value=10, caught_at=hour_start)
+    digest.add_cast()
+    return digest
+
+
+def test_rolled_back_auto_casts_leave_no_digest(db_manager, write_buffer, add_user, fish_id):
+    user_id = add_user()
+    log_repo = SqliteLogRepository(db_manager, write_buffer)
+
+    with pytest.raises(RuntimeError):
+        with db_manager.transaction():
+            log_repo.add_auto_fishing_digests([_auto_digest(user_id, fish_id)])
+            raise RuntimeError("批量结算失败")
+
+    write_buffer.flush()
+    assert log_repo.get_auto_fishing_digests(user_id, 10) == []
+    # 回滚的汇总不能解锁图鉴
+    assert log_repo.get_unlocked_fish_ids(user_id) == {}
+
+
+def test_committed_auto_casts_are_flushed_together(db_manager, write_buffer, add_user, fish_id):
+    user_id = add_user()
+    log_repo = SqliteLogRepository(db_manager, write_buffer)
+
+    with db_manager.transaction():
+        log_repo.add_auto_fishing_digests([_auto_digest(user_id, fish_id)])
+        assert write_buffer.get_stats()["pending"] == 0
+
+    # 汇总行与逐鱼统计行在提交后一起入队
+    assert write_buffer.get_stats()["pending"] == 2
+    digests = log_repo.get_auto_fishing_digests(user_id, 10)
+    assert [(d.casts, d.successes, d.fish_counts) for d in digests] == [(2, 1, {fish_id: 1})]
+    assert set(log_repo.get_unlocked_fish_ids(user_id)) == {fish_id}
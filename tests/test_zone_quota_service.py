@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+from core.repositories.sqlite_inventory_repo import SqliteInventoryRepository
+from core.services.zone_quota_service import ZoneQuotaService
+
+
+@pytest.fixture
+def inventory_repo(db_manager):
+    return SqliteInventoryRepository(db_manager)
+
+
+@pytest.fixture
+def quota_service(inventory_repo, db_manager):
+    return ZoneQuotaService(inventory_repo, db_manager, flush_interval_seconds=30)
+
+
+def _expire(service, zone_id):
+    # 模拟距上次加载已超过 flush_interval
+    service._zones[zone_id].loaded_at = time.monotonic() - service.flush_interval - 1
+
+
+def test_flush_adds_delta_on_top_of_admin_edit(quota_service, inventory_repo):
+    assert quota_service.try_reserve(2)
+    assert quota_service.try_reserve(2)
+
+    # 后台在写回之前修改了区域
+    zone = inventory_repo.get_zone_by_id(2)
+    zone.rare_fish_caught_today = 3
+    inventory_repo.update_fishing_zone(zone)
+
+    assert quota_service.flush() == 1
+    assert inventory_repo.get_zone_by_id(2).rare_fish_caught_today == 5
+    assert quota_service.flush() == 0
+
+
+def test_reload_picks_up_admin_edit(quota_service, inventory_repo):
+    quota_service.try_reserve(2)
+    zone = inventory_repo.get_zone_by_id(2)
+    zone.daily_rare_fish_quota = 10
+    zone.rare_fish_caught_today = 5
+    inventory_repo.update_fishing_zone(zone)
+
+    _expire(quota_service, 2)
+    # 数据库中的计数加上尚未写回的一次预留
+    assert quota_service.get_caught(2) == 6
+    assert quota_service._zones[2].quota == 10
+    quota_service.flush()
+    assert inventory_repo.get_zone_by_id(2).rare_fish_caught_today == 6
+
+
+def test_rolled_back_reservation_is_not_written(quota_service, inventory_repo, db_manager):
+    with pytest.raises(RuntimeError):
+        with db_manager.transaction():
+            assert quota_service.try_reserve(2)
+            raise RuntimeError("抛竿结算失败")
+
+    assert quota_service.get_caught(2) == 0
+    assert quota_service.flush() == 0
+    assert inventory_repo.get_zone_by_id(2).rare_fish_caught_today == 0
+
+
+def test_reset_all_clears_pending(quota_service, inventory_repo):
+    quota_service.try_reserve(2)
+    quota_service.reset_all()
+    assert quota_service.get_caught(2) == 0
+    assert quota_service.flush() == 0
+    assert inventory_repo.get_zone_by_id(2).rare_fish_caught_today == 0
+
+
+def test_extra_cost_comes_from_zone(quota_service, inventory_repo):
+    # 迁移为已有区域保留原来的成本
+    assert [quota_service.get_extra_cost(zone_id) for zone_id in (1, 2, 3)] == [0, 50, 100]
+
+    zone = inventory_repo.get_zone_by_id(3)
+    zone.extra_fishing_cost = 30
+    inventory_repo.update_fishing_zone(zone)
+    _expire(quota_service, 3)
+    assert quota_service.get_extra_cost(3) == 30
+    assert quota_service.get_extra_cost(99) == 0